@@ -1,5 +1,6 @@
 """API dependencies for authentication and tenant resolution"""
 
+import hmac
 from typing import Optional
 
 from fastapi import Depends, Header, HTTPException, Request, status
@@ -98,6 +99,25 @@ async def get_current_user(
     return {"user_id": user_id, "tenant_id": tenant_id}
 
 
+async def require_admin(
+    admin_key: Optional[str] = Header(None, alias=settings.ADMIN_KEY_HEADER),
+) -> None:
+    """
+    Require the admin API key header
+
+    Args:
+        admin_key: Admin key from header
+
+    Raises:
+        HTTPException: If admin endpoints are disabled or the key is wrong
+    """
+    if not settings.ADMIN_API_KEY or not admin_key:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+
+    if not hmac.compare_digest(admin_key.encode(), settings.ADMIN_API_KEY.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+
+
 async def get_tenant(
     tenant_id: int = Depends(get_tenant_id), session: AsyncSession = Depends(get_session)
 ) -> Tenant:
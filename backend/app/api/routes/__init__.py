@@ -2,7 +2,7 @@
 
 from fastapi import APIRouter
 
-from app.api.routes import auth, chat, files, health, metrics, usage
+from app.api.routes import admin, auth, chat, files, health, metrics, usage
 
 api_router = APIRouter()
 
@@ -13,3 +13,4 @@ api_router.include_router(files.router, prefix="/v1/files", tags=["files"])
 api_router.include_router(usage.router, prefix="/v1/usage", tags=["usage"])
 api_router.include_router(chat.router, prefix="/v1/chat", tags=["chat"])
 api_router.include_router(metrics.router, prefix="/v1", tags=["metrics"])
+api_router.include_router(admin.router, prefix="/v1/admin", tags=["admin"])
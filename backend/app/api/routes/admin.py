@@ -0,0 +1,59 @@
+"""Admin routes (require the admin API key)"""
+
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from app.api.deps import require_admin
+from app.db.vector_index import ensure_index, get_index_status
+from app.schemas.admin import VectorIndexStatusOut
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+# Rebuild started from this process, if any
+_rebuild_task: Optional[asyncio.Task] = None
+
+
+def _rebuilding() -> bool:
+    return _rebuild_task is not None and not _rebuild_task.done()
+
+
+async def _run_rebuild(force: bool) -> None:
+    try:
+        result = await ensure_index(force=force)
+        print(f"[INDEX] Admin rebuild {result['action']}: {result['rebuild_reason']}")
+    except Exception as e:
+        print(f"[INDEX] Admin rebuild failed: {e}")
+
+
+@router.get("/vector-index", response_model=VectorIndexStatusOut)
+async def get_vector_index():
+    """
+    Get the current and desired vector index and whether a rebuild is due
+    """
+    return VectorIndexStatusOut(**await get_index_status(), building=_rebuilding())
+
+
+@router.post(
+    "/vector-index/rebuild",
+    response_model=VectorIndexStatusOut,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def rebuild_vector_index(force: bool = False):
+    """
+    Start a concurrent rebuild of the vector index
+
+    Without force, only rebuilds if the index is missing or out of date.
+    The index type is VECTOR_INDEX_TYPE; change it there to switch types.
+    The build runs in the background; poll GET /vector-index for progress.
+    """
+    global _rebuild_task
+
+    if _rebuilding():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Rebuild in progress")
+
+    index_status = await get_index_status()
+    _rebuild_task = asyncio.create_task(_run_rebuild(force))
+
+    return VectorIndexStatusOut(**index_status, building=True)
@@ -1,11 +1,13 @@
 """File upload routes"""
 
+import hashlib
+import os
+import tempfile
 import time
-from typing import Optional
+from typing import Optional, Tuple
 
 from fastapi import (
     APIRouter,
-    BackgroundTasks,
     Depends,
     File,
     Form,
@@ -13,66 +15,81 @@ from fastapi import (
     UploadFile,
     status,
 )
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
 from app.api.deps import get_current_user
 from app.core.config import get_settings
 from app.db.session import get_session
-from app.models.chunk import Chunk
 from app.models.document import Document
-from app.schemas.files import UploadOut
-from app.services.chunker import chunk_text
-from app.services.embedder import create_embeddings_batch
-from app.services.pdf_ingest import extract_text_from_pdf
+from app.models.job import IngestionJob
+from app.schemas.files import FileStatusOut, UploadOut
+from app.services.fingerprint import find_duplicate
+from app.services.ingest_queue import enqueue_ingestion
+from app.services.pdf_ingest import count_pdf_pages
 
 settings = get_settings()
 router = APIRouter()
 
 
-async def process_pdf_file(file_bytes: bytes, title: str, tenant_id: int, document_id: int):
-    """
-    Background task to process PDF file
-
-    Args:
-        file_bytes: PDF file content
-        title: Document title
-        tenant_id: Tenant ID
-        document_id: Document ID to update
-    """
-    from app.db.session import async_session_maker
+def _write_chunk(spool, digest, chunk: bytes) -> None:
+    spool.write(chunk)
+    digest.update(chunk)
 
-    async with async_session_maker() as session:
-        try:
-            # Extract text from PDF
-            pages_text = await extract_text_from_pdf(file_bytes)
 
-            # Chunk all pages
-            all_chunks = []
-            for page_num, text in pages_text:
-                chunks = chunk_text(text, page_num)
-                all_chunks.extend(chunks)
+async def spool_upload(file: UploadFile) -> Tuple[str, str]:
+    """
+    Stream an upload to a temporary file in bounded chunks, hashing as it goes
 
-            # Create embeddings in batch
-            chunk_texts = [chunk[1] for chunk in all_chunks]
-            embeddings = await create_embeddings_batch(chunk_texts)
+    Args:
+        file: Uploaded file
 
-            # Save chunks to database
-            for (page_num, text_content), embedding in zip(all_chunks, embeddings):
-                chunk = Chunk(
-                    document_id=document_id, page=page_num, text=text_content, embedding=embedding
-                )
-                session.add(chunk)
+    Returns:
+        Tuple of (spooled file path, SHA-256 hex digest of the file); the
+        caller is responsible for removing the file
 
-            await session.commit()
+    Raises:
+        HTTPException: If the file exceeds MAX_FILE_SIZE_MB
+    """
+    max_bytes = settings.MAX_FILE_SIZE_MB * 1024 * 1024
+    fd, path = tempfile.mkstemp(suffix=".pdf", dir=settings.UPLOAD_SPOOL_DIR or None)
+    digest = hashlib.sha256()
+    size = 0
 
-        except Exception as e:
-            print(f"[ERROR] Failed to process PDF {document_id}: {str(e)}")
-            # In production, update document status to 'failed'
+    try:
+        with os.fdopen(fd, "wb") as spool:
+            while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE_BYTES):
+                size += len(chunk)
+                # Enforce the limit while streaming instead of after buffering
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"File size exceeds maximum {settings.MAX_FILE_SIZE_MB}MB",
+                    )
+                await run_in_threadpool(_write_chunk, spool, digest, chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+
+    return path, digest.hexdigest()
+
+
+def _duplicate_upload(existing: Document, file_path: str, start_time: float) -> UploadOut:
+    """Drop a spooled upload that duplicates an existing document and point at that one"""
+    os.unlink(file_path)
+    return UploadOut(
+        document_id=existing.id,
+        chunks=existing.chunks,
+        elapsed_ms=(time.time() - start_time) * 1000,
+        status=existing.status,
+        duplicate=True,
+    )
 
 
 @router.post("", response_model=UploadOut)
 async def upload_file(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     title: Optional[str] = Form(None),
     current_user: dict = Depends(get_current_user),
@@ -81,7 +98,9 @@ async def upload_file(
     """
     Upload a PDF file and process it for RAG
 
-    Extracts text, chunks it, creates embeddings, and stores in database
+    Spools the upload to disk, reads the page count and queues an ingestion
+    job; text extraction, chunking and embedding run in the ingestion workers.
+    Re-uploading a file the tenant already has returns the existing document
     """
     start_time = time.time()
 
@@ -91,16 +110,8 @@ async def upload_file(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Only PDF files are allowed"
         )
 
-    # Read file content
-    file_bytes = await file.read()
-
-    # Check file size
-    file_size_mb = len(file_bytes) / (1024 * 1024)
-    if file_size_mb > settings.MAX_FILE_SIZE_MB:
-        raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail=f"File size {file_size_mb:.2f}MB exceeds maximum {settings.MAX_FILE_SIZE_MB}MB",
-        )
+    # Spool to disk in bounded chunks, enforcing the size limit as we go
+    file_path, file_sha256 = await spool_upload(file)
 
     # Use filename as title if not provided
     if not title:
@@ -109,33 +120,83 @@ async def upload_file(
     tenant_id = current_user["tenant_id"]
 
     try:
-        # Quick validation - extract page count
-        pages_text = await extract_text_from_pdf(file_bytes)
-        num_pages = len(pages_text)
+        # Exact duplicate of an existing document: skip ingestion entirely
+        existing = await find_duplicate(session, tenant_id, file_sha256=file_sha256)
+        if existing is not None:
+            return _duplicate_upload(existing, file_path, start_time)
+
+        # Quick validation - read the page count only, text is extracted later
+        num_pages = await count_pdf_pages(file_path)
 
         # Create document record
-        document = Document(tenant_id=tenant_id, title=title, pages=num_pages)
+        document = Document(
+            tenant_id=tenant_id, title=title, pages=num_pages, file_sha256=file_sha256
+        )
         session.add(document)
+        try:
+            await session.flush()
+        except IntegrityError:
+            # A concurrent upload of the same file became the original first
+            await session.rollback()
+            existing = await find_duplicate(session, tenant_id, file_sha256=file_sha256)
+            if existing is None:
+                raise
+            return _duplicate_upload(existing, file_path, start_time)
+
+        # Queue for the ingestion workers; the job takes ownership of the spooled file
+        enqueue_ingestion(session, document, file_path, num_pages)
         await session.commit()
         await session.refresh(document)
 
-        # Process in background
-        background_tasks.add_task(process_pdf_file, file_bytes, title, tenant_id, document.id)
-
         elapsed_ms = (time.time() - start_time) * 1000
 
         # Return preliminary response
-        # Actual chunk count will be available after background processing
+        # Actual chunk count is available from the status endpoint once ingested
         return UploadOut(
             document_id=document.id,
-            chunks=0,  # Will be updated in background
+            chunks=0,  # Will be updated by the ingestion worker
             elapsed_ms=elapsed_ms,
+            status=document.status,
         )
 
     except ValueError as e:
+        os.unlink(file_path)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
+        os.unlink(file_path)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to process file: {str(e)}",
         )
+
+
+@router.get("/{document_id}/status", response_model=FileStatusOut)
+async def get_file_status(
+    document_id: int,
+    current_user: dict = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Get ingestion status and progress for an uploaded file
+    """
+    document = await session.get(Document, document_id)
+    if not document or document.tenant_id != current_user["tenant_id"]:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
+
+    result = await session.execute(
+        select(IngestionJob)
+        .where(IngestionJob.document_id == document_id)
+        .order_by(IngestionJob.id.desc())
+        .limit(1)
+    )
+    job = result.scalar_one_or_none()
+
+    return FileStatusOut(
+        document_id=document.id,
+        status=document.status,
+        pages=document.pages,
+        chunks=document.chunks,
+        attempts=job.attempts if job else 0,
+        error=document.error or (job.error if job else None),
+        duplicate_of=document.duplicate_of,
+    )
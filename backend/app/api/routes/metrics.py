@@ -6,12 +6,13 @@ from fastapi import APIRouter, Depends
 from prometheus_client import (
     CONTENT_TYPE_LATEST,
     Counter,
+    Gauge,
     Histogram,
     generate_latest,
 )
 from starlette.responses import Response
 
-from app.db.session import AsyncSession, get_db
+from app.db.session import AsyncSession, get_session
 
 router = APIRouter()
 
@@ -58,6 +59,35 @@ document_chunks_total = Counter(
     ["tenant"],
 )
 
+embedding_cache_hits_total = Counter(
+    "embedding_cache_hits_total",
+    "Total embedding cache hits",
+    ["cache", "tier"],
+)
+
+embedding_cache_misses_total = Counter(
+    "embedding_cache_misses_total",
+    "Total embedding cache misses",
+    ["cache"],
+)
+
+ws_outbound_queued_bytes = Gauge(
+    "ws_outbound_queued_bytes",
+    "Bytes queued for WebSocket clients in this worker",
+)
+
+ws_connection_queued_bytes = Histogram(
+    "ws_connection_queued_bytes",
+    "Peak bytes queued on one WebSocket connection before its queue drained",
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576),
+)
+
+ws_slow_consumer_total = Counter(
+    "ws_slow_consumer_total",
+    "Total WebSocket sends blocked longer than WS_SEND_TIMEOUT_SECONDS",
+    ["policy"],
+)
+
 
 @router.get("/metrics")
 async def metrics_endpoint():
@@ -70,7 +100,7 @@ async def metrics_endpoint():
 
 
 @router.get("/metrics/health")
-async def metrics_health(db: AsyncSession = Depends(get_db)) -> Dict[str, str]:
+async def metrics_health(db: AsyncSession = Depends(get_session)) -> Dict[str, str]:
     """
     Health check for metrics endpoint.
 
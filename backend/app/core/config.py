@@ -20,6 +20,7 @@ class Settings(BaseSettings):
     OPENAI_BASE_URL: str = ""
     OPENAI_MODEL: str = "gpt-4o-mini"
     EMBEDDING_MODEL: str = "text-embedding-3-small"
+    EMBEDDING_DIMENSIONS: int = 1536  # text-embedding-3 models can return fewer
 
     # Allowed OpenAI models
     ALLOWED_MODELS: List[str] = [
@@ -42,15 +43,99 @@ class Settings(BaseSettings):
     # Multi-tenancy
     TENANT_HEADER: str = "X-Tenant-ID"
 
+    # Admin endpoints (disabled while empty)
+    ADMIN_API_KEY: str = ""
+    ADMIN_KEY_HEADER: str = "X-Admin-Key"
+
     # RAG Configuration
     CHUNK_TOKEN_SIZE: int = 400
     CHUNK_OVERLAP: int = 40
     MAX_CONTEXT_TOKENS: int = 8000
     TOP_K: int = 6
 
+    # Tokenizer
+    TOKEN_COUNT_CACHE_SIZE: int = 4096  # memoized counts of short strings
+    TOKENIZER_OFFLOAD_CHARS: int = 20000  # count larger inputs in a worker thread
+
+    # Chat WebSocket
+    OPENAI_STREAM_USAGE: bool = True  # ask for token usage in the stream (stream_options)
+    WS_DELTA_FLUSH_MS: float = 20.0  # longest a streamed delta is held back for coalescing
+    WS_DELTA_FLUSH_BYTES: int = 64  # send coalesced deltas once this many bytes are buffered
+    WS_MAX_INFLIGHT_TURNS: int = 4  # concurrent answers streaming per connection
+    WS_OUTBOUND_BUFFER_BYTES: int = 262144  # bytes queued per connection before a client is slow
+    WS_SEND_TIMEOUT_SECONDS: float = 10.0  # a send blocked this long marks the client slow
+    WS_SLOW_CONSUMER_POLICY: str = "coalesce"  # coalesce | summary | disconnect
+    WS_SEND_STALL_LIMIT_SECONDS: float = 60.0  # a send blocked this long disconnects the client
+
+    # Packing retrieved chunks into the prompt (0 = off)
+    RAG_MAX_DISTANCE: float = 0.8  # drop chunks at a larger cosine distance
+    RAG_RELATIVE_GAP: float = 0.2  # drop chunks this fraction less similar than the best
+    RAG_DUPLICATE_SIMILARITY: float = 0.95  # drop chunks this similar to one already packed
+
+    # Vector index (chunks.embedding)
+    VECTOR_INDEX_TYPE: str = "hnsw"  # hnsw | ivfflat
+    VECTOR_INDEX_HNSW_M: int = 16
+    VECTOR_INDEX_HNSW_EF_CONSTRUCTION: int = 64
+    VECTOR_INDEX_HNSW_EF_SEARCH: int = 40  # per query
+    VECTOR_INDEX_IVFFLAT_PROBES: int = 10  # per query
+    VECTOR_INDEX_IVFFLAT_MIN_ROWS: int = 1000  # exact scan below this
+    VECTOR_INDEX_REBUILD_GROWTH: float = 2.0  # rebuild IVFFlat when ideal lists grows this much
+    VECTOR_INDEX_CHECK_INTERVAL_SECONDS: float = 900.0  # ingest worker check, 0 = off
+    VECTOR_INDEX_TENANT_MIN_ROWS: int = 100000  # own partial index from here, 0 = off
+
+    # Vector store behind retrieval
+    VECTOR_STORE: str = "auto"  # auto (numpy on SQLite, else pgvector) | pgvector | numpy
+    VECTOR_STORE_PATH: str = "./data/vectors"  # numpy: one memory-mapped file per tenant
+    VECTOR_STORE_BLOCK_ROWS: int = 65536  # numpy: rows scored per matrix product
+    # Coarse search on a compact copy, exact rerank on the full vectors
+    VECTOR_QUANTIZATION: str = "none"  # none | halfvec | binary | int8 (numpy store only)
+    VECTOR_RERANK_FACTOR: int = 4  # candidates = top_k * factor (keep <= HNSW ef_search)
+    VECTOR_SEARCH_PREFIX_DIMENSIONS: int = 0  # >0: coarse search on this Matryoshka prefix
+
+    # Embedding batching
+    EMBEDDING_BATCH_SIZE: int = 256  # max inputs per request
+    EMBEDDING_BATCH_MAX_TOKENS: int = 100000  # max total tokens per request
+    EMBEDDING_MAX_CONCURRENCY: int = 4
+    EMBEDDING_MAX_RETRIES: int = 3
+    EMBEDDING_RETRY_BACKOFF_SECONDS: float = 0.5
+
+    # Embedding cache (local LRU + Redis)
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_LOCAL_SIZE: int = 4096  # entries per process
+    EMBEDDING_CACHE_SHARED: bool = True  # use the Redis tier
+    EMBEDDING_CACHE_TTL_SECONDS: int = 30 * 24 * 3600  # 0 = never expire
+
+    # Query embedding cache (retrieval; local LRU + Redis)
+    QUERY_EMBEDDING_CACHE_ENABLED: bool = True
+    QUERY_EMBEDDING_CACHE_LOCAL_SIZE: int = 2048  # entries per process
+    QUERY_EMBEDDING_CACHE_SHARED: bool = True  # use the Redis tier
+    QUERY_EMBEDDING_CACHE_TTL_SECONDS: int = 24 * 3600  # 0 = never expire
+
     # File upload limits
     MAX_FILE_SIZE_MB: int = 25
     MAX_PDF_PAGES: int = 500
+    UPLOAD_CHUNK_SIZE_BYTES: int = 1024 * 1024
+    UPLOAD_SPOOL_DIR: str = ""  # empty = system temp directory
+
+    # PDF extraction (process pool)
+    PDF_EXTRACT_WORKERS: int = 0  # 0 = os.cpu_count()
+    PDF_EXTRACT_PAGES_PER_TASK: int = 25
+    PDF_PAGE_TIMEOUT_SECONDS: float = 10.0
+
+    # Ingestion job queue
+    INGEST_WORKER_PROCESSES: int = 2
+    INGEST_MAX_ATTEMPTS: int = 3
+    INGEST_RETRY_BACKOFF_SECONDS: float = 30.0
+    INGEST_JOB_LEASE_SECONDS: int = 600  # reclaim running jobs without a heartbeat
+    INGEST_POLL_INTERVAL_SECONDS: float = 2.0
+
+    # Ingestion pipeline queue depths (page ranges / embed batches / embedded batches)
+    INGEST_PAGE_QUEUE_SIZE: int = 4
+    INGEST_EMBED_QUEUE_SIZE: int = 4
+    INGEST_STORE_QUEUE_SIZE: int = 4
+
+    # Chunk storage
+    CHUNK_INSERT_BATCH_SIZE: int = 500  # rows per commit during ingestion
 
     # Email verification code
     VERIFICATION_CODE_LENGTH: int = 6
@@ -1,31 +1,240 @@
 """Database initialization with pgvector extension and indexes"""
 
+from typing import Dict
+
 from sqlalchemy import text
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
 
+from app.core.config import get_settings
 from app.db.session import engine
+from app.db.vector_index import ensure_index, get_index_status
+
+settings = get_settings()
+
+
+async def _missing_columns(
+    conn: AsyncConnection, table: str, columns: Dict[str, str]
+) -> Dict[str, str]:
+    """
+    Columns of a table that do not exist yet
+
+    Checked in the catalog first so that an applied migration issues no
+    ALTER TABLE (which takes an ACCESS EXCLUSIVE lock even when it is a no-op).
+
+    Args:
+        conn: Database connection
+        table: Table name
+        columns: Column name -> definition
+
+    Returns:
+        The entries of columns that are missing
+    """
+    result = await conn.execute(
+        text(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = :table"
+        ),
+        {"table": table},
+    )
+    existing = {row[0] for row in result}
+    return {name: ddl for name, ddl in columns.items() if name not in existing}
+
+
+async def _missing_indexes(conn: AsyncConnection, names: Dict[str, str]) -> Dict[str, str]:
+    """
+    Indexes that do not exist yet (see _missing_columns)
+
+    Args:
+        conn: Database connection
+        names: Index name -> CREATE INDEX statement
+
+    Returns:
+        The entries of names that are missing
+    """
+    result = await conn.execute(
+        text("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema()")
+    )
+    existing = {row[0] for row in result}
+    return {name: ddl for name, ddl in names.items() if name not in existing}
+
+
+async def migrate_document_status() -> None:
+    """
+    Add the ingestion status columns to documents created before they existed
+
+    Documents ingested before then are complete, so they start as 'ready'.
+    """
+    async with engine.begin() as conn:
+        missing = await _missing_columns(
+            conn,
+            "documents",
+            {
+                "status": "VARCHAR(20) NOT NULL DEFAULT 'ready'",
+                "chunks": "INTEGER NOT NULL DEFAULT 0",
+                "error": "VARCHAR(2000)",
+            },
+        )
+        for column, ddl in missing.items():
+            await conn.execute(
+                text(f"ALTER TABLE documents ADD COLUMN IF NOT EXISTS {column} {ddl}")
+            )
+
+    if missing:
+        print(f"[STARTUP] Added documents columns: {', '.join(missing)}")
+
+
+async def migrate_document_fingerprints() -> None:
+    """Add the fingerprint columns and indexes to documents created before they existed"""
+    async with engine.begin() as conn:
+        missing = await _missing_columns(
+            conn,
+            "documents",
+            {
+                "file_sha256": "VARCHAR(64)",
+                "text_sha256": "VARCHAR(64)",
+                "duplicate_of": "INTEGER REFERENCES documents(id)",
+            },
+        )
+        for column, ddl in missing.items():
+            await conn.execute(
+                text(f"ALTER TABLE documents ADD COLUMN IF NOT EXISTS {column} {ddl}")
+            )
+
+        indexes = await _missing_indexes(
+            conn,
+            {
+                "ix_documents_file_sha256": (
+                    "CREATE INDEX IF NOT EXISTS ix_documents_file_sha256 "
+                    "ON documents (file_sha256)"
+                ),
+                "ix_documents_text_sha256": (
+                    "CREATE INDEX IF NOT EXISTS ix_documents_text_sha256 "
+                    "ON documents (text_sha256)"
+                ),
+                "uq_documents_tenant_file_sha256": (
+                    "CREATE UNIQUE INDEX IF NOT EXISTS uq_documents_tenant_file_sha256 "
+                    "ON documents (tenant_id, file_sha256) "
+                    "WHERE status <> 'failed' AND duplicate_of IS NULL"
+                ),
+                "uq_documents_tenant_text_sha256": (
+                    "CREATE UNIQUE INDEX IF NOT EXISTS uq_documents_tenant_text_sha256 "
+                    "ON documents (tenant_id, text_sha256) "
+                    "WHERE status <> 'failed' AND duplicate_of IS NULL"
+                ),
+            },
+        )
+        for ddl in indexes.values():
+            await conn.execute(text(ddl))
+
+    if missing or indexes:
+        print(f"[STARTUP] Added documents fingerprints: {', '.join([*missing, *indexes])}")
+
+
+async def migrate_chunk_tenants() -> None:
+    """
+    Add and backfill chunks.tenant_id on databases created before it existed
+
+    create_all does not alter existing tables. A one-off: the DDL and the
+    full-table backfill lock chunks, so they run only while the catalog
+    shows the column missing or still nullable, or its index missing.
+    """
+    async with engine.begin() as conn:
+        result = await conn.execute(
+            text(
+                "SELECT is_nullable FROM information_schema.columns "
+                "WHERE table_schema = current_schema() "
+                "AND table_name = 'chunks' AND column_name = 'tenant_id'"
+            )
+        )
+        nullable = result.scalar()  # None while the column is missing
+        indexes = await _missing_indexes(
+            conn,
+            {
+                "ix_chunks_tenant_id": (
+                    "CREATE INDEX IF NOT EXISTS ix_chunks_tenant_id ON chunks (tenant_id)"
+                )
+            },
+        )
+        if nullable == "NO" and not indexes:
+            return
+
+        if nullable is None:
+            await conn.execute(
+                text(
+                    "ALTER TABLE chunks ADD COLUMN IF NOT EXISTS tenant_id INTEGER "
+                    "REFERENCES tenants(id)"
+                )
+            )
+        if nullable != "NO":
+            result = await conn.execute(
+                text(
+                    "UPDATE chunks c SET tenant_id = d.tenant_id FROM documents d "
+                    "WHERE c.document_id = d.id AND c.tenant_id IS NULL"
+                )
+            )
+            print(f"[STARTUP] Backfilled tenant_id on {result.rowcount} chunks")
+        for ddl in indexes.values():
+            await conn.execute(text(ddl))
+        if nullable != "NO":
+            await conn.execute(text("ALTER TABLE chunks ALTER COLUMN tenant_id SET NOT NULL"))
+
+
+async def migrate_chunk_tokens() -> None:
+    """
+    Add chunks.tokens on databases created before it existed
+
+    Existing rows keep 0 and are counted when they are packed into a prompt;
+    re-ingesting a document stores their counts.
+    """
+    async with engine.begin() as conn:
+        missing = await _missing_columns(conn, "chunks", {"tokens": "INTEGER NOT NULL DEFAULT 0"})
+        for column, ddl in missing.items():
+            await conn.execute(text(f"ALTER TABLE chunks ADD COLUMN IF NOT EXISTS {column} {ddl}"))
+
+
+async def check_embedding_dimensions() -> None:
+    """Warn if chunks.embedding was created for a different EMBEDDING_DIMENSIONS"""
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            text(
+                "SELECT atttypmod FROM pg_attribute "
+                "WHERE attrelid = 'chunks'::regclass AND attname = 'embedding'"
+            )
+        )
+        dimensions = result.scalar()
+
+    if dimensions and dimensions != settings.EMBEDDING_DIMENSIONS:
+        print(
+            f"[STARTUP] chunks.embedding is vector({dimensions}) but EMBEDDING_DIMENSIONS="
+            f"{settings.EMBEDDING_DIMENSIONS}; recreate the column and re-ingest documents"
+        )
 
 
 async def setup_pgvector() -> None:
-    """Setup pgvector extension and create indexes"""
+    """Setup pgvector extension and create the vector index if it is missing"""
     async with engine.begin() as conn:
         # Enable pgvector extension
         await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
 
-        # Create ivfflat index on chunks.embedding for faster similarity search
-        # Note: Index is created after tables exist
-        try:
-            await conn.execute(
-                text("""
-                CREATE INDEX IF NOT EXISTS chunks_embedding_idx
-                ON chunks
-                USING ivfflat (embedding vector_cosine_ops)
-                WITH (lists = 100)
-            """)
-            )
-        except Exception as e:
-            # Index might already exist or table might not exist yet
-            print(f"Index creation skipped: {e}")
+    try:
+        await migrate_document_status()
+        await migrate_document_fingerprints()
+        await migrate_chunk_tenants()
+        await migrate_chunk_tokens()
+        await check_embedding_dimensions()
+    except Exception as e:
+        # Table might not exist yet
+        print(f"Schema migration skipped: {e}")
+
+    # Only build a missing index here; resizing an existing one is left to the
+    # ingest workers / CLI so a large rebuild never blocks startup
+    try:
+        status = await get_index_status()
+        if status["current"] is None and status["desired"] is not None:
+            await ensure_index()
+    except Exception as e:
+        # Table might not exist yet
+        print(f"Index creation skipped: {e}")
 
 
 async def create_default_tenant(session: AsyncSession) -> int:
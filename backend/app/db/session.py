@@ -10,12 +10,22 @@ from app.core.config import get_settings
 
 settings = get_settings()
 
+connect_args = {}
+if settings.DATABASE_URL.startswith("postgresql+asyncpg"):
+    # ANN search parameters for every query; startup parameters are not
+    # transactional, so a rolled-back request cannot undo them
+    connect_args["server_settings"] = {
+        "hnsw.ef_search": str(settings.VECTOR_INDEX_HNSW_EF_SEARCH),
+        "ivfflat.probes": str(settings.VECTOR_INDEX_IVFFLAT_PROBES),
+    }
+
 # Create async engine
 engine = create_async_engine(
     settings.DATABASE_URL,
     echo=False,
     future=True,
     pool_pre_ping=True,
+    connect_args=connect_args,
 )
 
 # Create async session maker
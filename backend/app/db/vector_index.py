@@ -0,0 +1,388 @@
+"""Vector index lifecycle for chunks.embedding
+
+Builds either an HNSW index (m / ef_construction from Settings) or an
+IVFFlat index whose lists are sized to the current row count, and rebuilds
+it with CREATE INDEX CONCURRENTLY plus a rename swap when the configuration
+changes or, for IVFFlat, when the corpus has grown enough that the index
+is undersized. HNSW indexes grow incrementally and are only rebuilt when
+their parameters change. Tenants with many chunks additionally get a
+partial index over their own rows. With VECTOR_QUANTIZATION or
+VECTOR_SEARCH_PREFIX_DIMENSIONS the index is built on a coarse expression
+of the embedding (halfvec, binary and/or a leading subvector; the column
+keeps full vectors for reranking), so switching modes needs only a
+rebuild, not a rewrite of existing rows. Search-time parameters
+(hnsw.ef_search, ivfflat.probes) are set on every pooled connection, see
+app.db.session.
+
+Usage:
+    python -m app.db.vector_index status
+    python -m app.db.vector_index ensure
+    python -m app.db.vector_index rebuild
+
+The index type always comes from VECTOR_INDEX_TYPE: the ingest workers'
+periodic check rebuilds any other type back to it.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import re
+from typing import Any, Dict, NamedTuple, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.core.config import get_settings
+from app.db.session import engine
+from app.models.chunk import Chunk
+from app.services.vector_store import coarse_expression
+
+settings = get_settings()
+
+INDEX_NAME = "chunks_embedding_idx"
+# Advisory lock key so only one process builds at a time
+_BUILD_LOCK_ID = 7_301_842_116
+
+INDEX_TYPES = ("hnsw", "ivfflat")
+
+
+class IndexSpec(NamedTuple):
+    """Index method, its build parameters and the coarse expression it covers"""
+
+    type: str
+    params: Dict[str, int]
+    quantization: str = "none"
+    prefix_dimensions: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "type": self.type,
+            "params": self.params,
+            "quantization": self.quantization,
+            "prefix_dimensions": self.prefix_dimensions,
+        }
+
+
+def ivfflat_lists(rows: int) -> int:
+    """
+    IVFFlat lists for a row count (pgvector guidance)
+
+    rows / 1000 up to 1M rows, sqrt(rows) beyond that.
+    """
+    if rows <= 1_000_000:
+        return max(rows // 1000, 1)
+    return int(math.sqrt(rows))
+
+
+def desired_spec(
+    rows: int,
+    index_type: Optional[str] = None,
+    quantization: Optional[str] = None,
+    prefix_dimensions: Optional[int] = None,
+) -> Optional[IndexSpec]:
+    """
+    Index that should exist for a row count
+
+    Args:
+        rows: Current number of chunks
+        index_type: 'hnsw' or 'ivfflat' (VECTOR_INDEX_TYPE if not provided)
+        quantization: 'none', 'halfvec' or 'binary' (VECTOR_QUANTIZATION if not provided)
+        prefix_dimensions: Indexed leading dimensions, 0 = all
+            (VECTOR_SEARCH_PREFIX_DIMENSIONS if not provided)
+
+    Returns:
+        The spec, or None if no index is wanted yet (IVFFlat below
+        VECTOR_INDEX_IVFFLAT_MIN_ROWS, where an exact scan is fine and
+        clustering would train on too few rows)
+    """
+    index_type = index_type or settings.VECTOR_INDEX_TYPE
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown vector index type: {index_type}")
+    quantization = quantization or settings.VECTOR_QUANTIZATION
+    if prefix_dimensions is None:
+        prefix_dimensions = settings.VECTOR_SEARCH_PREFIX_DIMENSIONS
+    # Raises for modes pgvector cannot index
+    coarse_expression("embedding", quantization, 1, prefix_dimensions)
+
+    if index_type == "hnsw":
+        return IndexSpec(
+            "hnsw",
+            {
+                "m": settings.VECTOR_INDEX_HNSW_M,
+                "ef_construction": settings.VECTOR_INDEX_HNSW_EF_CONSTRUCTION,
+            },
+            quantization,
+            prefix_dimensions,
+        )
+
+    if rows < settings.VECTOR_INDEX_IVFFLAT_MIN_ROWS:
+        return None
+    return IndexSpec("ivfflat", {"lists": ivfflat_lists(rows)}, quantization, prefix_dimensions)
+
+
+def parse_index_definition(indexdef: str) -> IndexSpec:
+    """Read method, coarse expression and WITH (...) parameters from a pg_indexes definition"""
+    method = re.search(r"USING (\w+)", indexdef)
+    options = re.search(r"WITH \((.*)\)", indexdef)
+    params = {}
+    if options:
+        for option in options.group(1).split(","):
+            key, _, value = option.partition("=")
+            params[key.strip()] = int(value.strip().strip("'"))
+    if "bit_hamming_ops" in indexdef:
+        quantization = "binary"
+    elif "halfvec" in indexdef:
+        quantization = "halfvec"
+    else:
+        quantization = "none"
+    prefix = re.search(r"subvector\(embedding, 1, (\d+)\)", indexdef)
+    return IndexSpec(
+        method.group(1) if method else "unknown",
+        params,
+        quantization,
+        int(prefix.group(1)) if prefix else 0,
+    )
+
+
+def rebuild_reason(current: Optional[IndexSpec], desired: Optional[IndexSpec]) -> Optional[str]:
+    """
+    Why the current index should be rebuilt, if it should
+
+    Args:
+        current: Existing index (None if missing)
+        desired: Index that should exist (None if none is wanted)
+
+    Returns:
+        Reason string, or None if the current index is fine
+    """
+    if desired is None:
+        return None
+    if current is None:
+        return "missing"
+    if current.type != desired.type:
+        return f"type {current.type} -> {desired.type}"
+    if current.quantization != desired.quantization:
+        return f"quantization {current.quantization} -> {desired.quantization}"
+    if current.prefix_dimensions != desired.prefix_dimensions:
+        return f"prefix dimensions {current.prefix_dimensions} -> {desired.prefix_dimensions}"
+    if desired.type == "hnsw":
+        if current.params != desired.params:
+            return f"params {current.params} -> {desired.params}"
+        return None
+
+    lists = current.params.get("lists", 1)
+    if desired.params["lists"] >= lists * settings.VECTOR_INDEX_REBUILD_GROWTH:
+        return f"corpus grew: lists {lists} -> {desired.params['lists']}"
+    return None
+
+
+async def _row_estimate(conn: AsyncConnection) -> int:
+    """Planner row estimate for chunks, counting if it was never analyzed"""
+    result = await conn.execute(
+        text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'chunks'::regclass")
+    )
+    rows = result.scalar()
+    if rows is None or rows < 0:
+        rows = (await conn.execute(text("SELECT count(*) FROM chunks"))).scalar()
+    return int(rows)
+
+
+def tenant_index_name(tenant_id: int) -> str:
+    """Name of a tenant's partial vector index"""
+    return f"chunks_embedding_t{int(tenant_id)}_idx"
+
+
+async def _current_specs(conn: AsyncConnection) -> Dict[str, IndexSpec]:
+    """Existing vector indexes on chunks by name (global and per tenant)"""
+    result = await conn.execute(
+        text(
+            "SELECT indexname, indexdef FROM pg_indexes "
+            "WHERE tablename = 'chunks' AND indexname LIKE 'chunks\\_embedding%\\_idx'"
+        )
+    )
+    return {name: parse_index_definition(indexdef) for name, indexdef in result.all()}
+
+
+async def _large_tenants(conn: AsyncConnection) -> Dict[int, int]:
+    """Chunk counts of tenants big enough for their own partial index"""
+    if settings.VECTOR_INDEX_TENANT_MIN_ROWS <= 0:
+        return {}
+    result = await conn.execute(
+        text(
+            "SELECT tenant_id, count(*) FROM chunks GROUP BY tenant_id "
+            "HAVING count(*) >= :min_rows ORDER BY tenant_id"
+        ),
+        {"min_rows": settings.VECTOR_INDEX_TENANT_MIN_ROWS},
+    )
+    return dict(result.all())
+
+
+def _target_status(
+    rows: int, current: Optional[IndexSpec], desired: Optional[IndexSpec]
+) -> Dict[str, Any]:
+    return {
+        "rows": rows,
+        "current": current.as_dict() if current else None,
+        "desired": desired.as_dict() if desired else None,
+        "rebuild_reason": rebuild_reason(current, desired),
+    }
+
+
+async def get_index_status() -> Dict[str, Any]:
+    """
+    Describe the current and desired vector indexes
+
+    Besides the global index, every tenant with at least
+    VECTOR_INDEX_TENANT_MIN_ROWS chunks gets a partial index restricted to
+    its rows, so its searches never scan (or filter out) other tenants'.
+
+    Returns:
+        Dict with rows, current, desired and rebuild_reason for the global
+        index, and the same per large tenant under 'tenants'
+    """
+    async with engine.connect() as conn:
+        rows = await _row_estimate(conn)
+        current = await _current_specs(conn)
+        tenants = await _large_tenants(conn)
+
+    status = _target_status(rows, current.get(INDEX_NAME), desired_spec(rows))
+    status["tenants"] = [
+        {
+            "tenant_id": tenant_id,
+            **_target_status(
+                tenant_rows,
+                current.get(tenant_index_name(tenant_id)),
+                desired_spec(tenant_rows),
+            ),
+        }
+        for tenant_id, tenant_rows in tenants.items()
+    ]
+    return status
+
+
+async def build_index(spec: IndexSpec, tenant_id: Optional[int] = None) -> bool:
+    """
+    Build spec concurrently and swap it in for the current index
+
+    Reads and writes on chunks continue during the build; only the final
+    drop-and-rename takes a brief exclusive lock.
+
+    Args:
+        spec: Index to build
+        tenant_id: Build the partial index for this tenant instead of the global one
+
+    Returns:
+        True if built, False if another process holds the build lock
+    """
+    name = INDEX_NAME if tenant_id is None else tenant_index_name(tenant_id)
+    build_name = f"{name}_new"
+    where = "" if tenant_id is None else f" WHERE tenant_id = {int(tenant_id)}"
+
+    async with engine.connect() as conn:
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+
+        locked = await conn.execute(
+            text("SELECT pg_try_advisory_lock(:id)"), {"id": _BUILD_LOCK_ID}
+        )
+        if not locked.scalar():
+            return False
+
+        try:
+            version = await conn.execute(
+                text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+            )
+            major, minor = (int(part) for part in version.scalar().split(".")[:2])
+            if spec.type == "hnsw" and (major, minor) < (0, 5):
+                raise ValueError("HNSW indexes need pgvector 0.5.0 or newer on the server")
+            if (spec.quantization != "none" or spec.prefix_dimensions) and (major, minor) < (0, 7):
+                raise ValueError(
+                    "Quantized and prefix indexes need pgvector 0.7.0 or newer on the server"
+                )
+
+            options = ", ".join(f"{key} = {int(value)}" for key, value in spec.params.items())
+            expression, _, opclass = coarse_expression(
+                "embedding",
+                spec.quantization,
+                Chunk.__table__.c.embedding.type.dim,
+                spec.prefix_dimensions,
+            )
+            if expression != "embedding":
+                expression = f"({expression})"
+            column = f"{expression} {opclass}"
+            print(
+                f"[INDEX] Building {name} ({spec.type}, {spec.quantization}, "
+                f"prefix {spec.prefix_dimensions}, {options})"
+            )
+
+            # Leftover (possibly invalid) index from an interrupted build
+            await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {build_name}"))
+            await conn.execute(
+                text(
+                    f"CREATE INDEX CONCURRENTLY {build_name} ON chunks "
+                    f"USING {spec.type} ({column}) WITH ({options}){where}"
+                )
+            )
+
+            async with engine.begin() as swap:
+                await swap.execute(text(f"DROP INDEX IF EXISTS {name}"))
+                await swap.execute(text(f"ALTER INDEX {build_name} RENAME TO {name}"))
+
+            print(f"[INDEX] {name} ready")
+            return True
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": _BUILD_LOCK_ID})
+
+
+async def _ensure_target(
+    target: Dict[str, Any], force: bool, tenant_id: Optional[int] = None
+) -> Dict[str, Any]:
+    desired = target["desired"]
+    reason = "forced" if force and desired else target["rebuild_reason"]
+    if reason is None:
+        return {**target, "action": "none"}
+
+    built = await build_index(IndexSpec(**desired), tenant_id)
+    return {**target, "rebuild_reason": reason, "action": "built" if built else "locked"}
+
+
+async def ensure_index(force: bool = False) -> Dict[str, Any]:
+    """
+    Build or rebuild vector indexes that are missing or out of date
+
+    Args:
+        force: Rebuild even if the current indexes are fine
+
+    Returns:
+        Index status plus the action taken ('none', 'built' or 'locked'),
+        for the global index and each large tenant
+    """
+    status = await get_index_status()
+    tenants = status.pop("tenants")
+
+    result = await _ensure_target(status, force)
+    result["tenants"] = [
+        await _ensure_target(tenant, force, tenant["tenant_id"]) for tenant in tenants
+    ]
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage the chunks vector index")
+    parser.add_argument("command", choices=["status", "ensure", "rebuild"])
+    args = parser.parse_args()
+
+    async def run() -> Dict[str, Any]:
+        try:
+            if args.command == "status":
+                return await get_index_status()
+            return await ensure_index(force=args.command == "rebuild")
+        finally:
+            await engine.dispose()
+
+    print(json.dumps(asyncio.run(run()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
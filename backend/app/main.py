@@ -1,5 +1,6 @@
 """FastAPI application main entry point"""
 
+import asyncio
 import os
 from contextlib import asynccontextmanager
 
@@ -14,8 +15,10 @@ from app.core.config import get_settings
 from app.db.init import setup_pgvector
 from app.db.session import init_db
 from app.middleware.metrics import MetricsMiddleware
+from app.services.pdf_ingest import shutdown_pdf_executor
 from app.services.ratelimit import limiter
-from app.ws.chat import websocket_chat_handler
+from app.services.tokenizer import warm_up
+from app.ws.chat import drain_pending_writes, websocket_chat_handler
 
 settings = get_settings()
 
@@ -40,12 +43,20 @@ async def lifespan(app: FastAPI):
             # During tests/CI without Postgres, continue without startup DB init
             print(f"[STARTUP] DB init skipped due to error: {exc}")
 
+        try:
+            # Load tokenizer vocabularies before the first chat turn needs them
+            await asyncio.to_thread(warm_up, [settings.OPENAI_MODEL])
+        except Exception as exc:
+            print(f"[STARTUP] Tokenizer warm-up skipped due to error: {exc}")
+
     print("[STARTUP] Application ready!")
 
     yield
 
     # Shutdown
     print("[SHUTDOWN] Cleaning up...")
+    await drain_pending_writes()
+    shutdown_pdf_executor()
 
 
 # Create FastAPI app
@@ -3,6 +3,7 @@
 from app.models.chat import ChatSession, Message
 from app.models.chunk import Chunk
 from app.models.document import Document
+from app.models.job import IngestionJob
 from app.models.quota import Quota
 from app.models.tenant import Tenant
 from app.models.user import User
@@ -12,6 +13,7 @@ __all__ = [
     "User",
     "Document",
     "Chunk",
+    "IngestionJob",
     "ChatSession",
     "Message",
     "Quota",
@@ -5,6 +5,10 @@ from typing import List, Optional
 from pgvector.sqlalchemy import Vector
 from sqlmodel import Column, Field, SQLModel
 
+from app.core.config import get_settings
+
+settings = get_settings()
+
 
 class Chunk(SQLModel, table=True):
     """Chunk model - represents a text chunk with embedding vector"""
@@ -13,9 +17,15 @@ class Chunk(SQLModel, table=True):
 
     id: Optional[int] = Field(default=None, primary_key=True)
     document_id: int = Field(foreign_key="documents.id", index=True)
+    # Denormalized from the document so retrieval filters without a join
+    tenant_id: int = Field(foreign_key="tenants.id", index=True)
     page: int
     text: str = Field(max_length=5000)
-    embedding: Optional[List[float]] = Field(default=None, sa_column=Column(Vector(1536)))
+    # Prompt tokens of the text with its source header (0 = not counted yet)
+    tokens: int = Field(default=0)
+    embedding: Optional[List[float]] = Field(
+        default=None, sa_column=Column(Vector(settings.EMBEDDING_DIMENSIONS))
+    )
 
     class Config:
         arbitrary_types_allowed = True
@@ -3,16 +3,48 @@
 from datetime import datetime
 from typing import Optional
 
+from sqlalchemy import Index, text
 from sqlmodel import Field, SQLModel
 
+# Rows find_duplicate can resolve to
+_ORIGINAL = "status <> 'failed' AND duplicate_of IS NULL"
+
 
 class Document(SQLModel, table=True):
     """Document model - represents an uploaded PDF file"""
 
     __tablename__ = "documents"
+    __table_args__ = (
+        # At most one original per tenant and file, so concurrent uploads of
+        # the same file cannot both become originals
+        Index(
+            "uq_documents_tenant_file_sha256",
+            "tenant_id",
+            "file_sha256",
+            unique=True,
+            postgresql_where=text(_ORIGINAL),
+            sqlite_where=text(_ORIGINAL),
+        ),
+        # Likewise for extracted text, so concurrent ingestions of the same
+        # text cannot both become originals
+        Index(
+            "uq_documents_tenant_text_sha256",
+            "tenant_id",
+            "text_sha256",
+            unique=True,
+            postgresql_where=text(_ORIGINAL),
+            sqlite_where=text(_ORIGINAL),
+        ),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     tenant_id: int = Field(foreign_key="tenants.id", index=True)
     title: str = Field(max_length=500)
     pages: int
+    status: str = Field(default="pending", max_length=20)  # pending/processing/ready/failed
+    chunks: int = Field(default=0)
+    error: Optional[str] = Field(default=None, max_length=2000)
+    file_sha256: Optional[str] = Field(default=None, max_length=64, index=True)
+    text_sha256: Optional[str] = Field(default=None, max_length=64, index=True)
+    duplicate_of: Optional[int] = Field(default=None, foreign_key="documents.id")
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,26 @@
+"""Ingestion job model for the durable ingestion queue"""
+
+from datetime import datetime
+from typing import Optional
+
+from sqlmodel import Field, SQLModel
+
+
+class IngestionJob(SQLModel, table=True):
+    """IngestionJob model - a queued PDF ingestion picked up by worker processes"""
+
+    __tablename__ = "ingestion_jobs"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    document_id: int = Field(foreign_key="documents.id", index=True)
+    tenant_id: int = Field(foreign_key="tenants.id", index=True)
+    file_path: str = Field(max_length=1000)
+    num_pages: int
+    status: str = Field(default="queued", max_length=20, index=True)  # queued/running/done/failed
+    attempts: int = Field(default=0)
+    error: Optional[str] = Field(default=None, max_length=2000)
+    run_after: datetime = Field(default_factory=datetime.utcnow, index=True)
+    locked_at: Optional[datetime] = Field(default=None)
+    locked_by: Optional[str] = Field(default=None, max_length=255)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,35 @@
+"""Admin schemas"""
+
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+class VectorIndexSpecOut(BaseModel):
+    """Vector index method and build parameters"""
+
+    type: str
+    params: Dict[str, int]
+    quantization: str = "none"
+    prefix_dimensions: int = 0
+
+
+class TenantVectorIndexOut(BaseModel):
+    """Partial vector index of a large tenant"""
+
+    tenant_id: int
+    rows: int
+    current: Optional[VectorIndexSpecOut] = None
+    desired: Optional[VectorIndexSpecOut] = None
+    rebuild_reason: Optional[str] = None
+
+
+class VectorIndexStatusOut(BaseModel):
+    """Response schema for the vector index status"""
+
+    rows: int
+    current: Optional[VectorIndexSpecOut] = None
+    desired: Optional[VectorIndexSpecOut] = None
+    rebuild_reason: Optional[str] = None
+    tenants: List[TenantVectorIndexOut] = []
+    building: bool = False
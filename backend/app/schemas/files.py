@@ -1,5 +1,7 @@
 """File upload schemas"""
 
+from typing import Optional
+
 from pydantic import BaseModel
 
 
@@ -9,3 +11,17 @@ class UploadOut(BaseModel):
     document_id: int
     chunks: int
     elapsed_ms: float
+    status: str = "pending"
+    duplicate: bool = False
+
+
+class FileStatusOut(BaseModel):
+    """Response schema for file ingestion status"""
+
+    document_id: int
+    status: str
+    pages: int
+    chunks: int
+    attempts: int
+    error: Optional[str] = None
+    duplicate_of: Optional[int] = None
@@ -0,0 +1,160 @@
+"""Bulk persistence for document chunks
+
+On PostgreSQL chunks are streamed with the asyncpg binary COPY protocol
+(vectors in pgvector's binary format); other databases such as the SQLite
+test setup fall back to a single executemany INSERT per slice. Each row
+carries its prompt token count (chunk tokens plus source header), so prompt
+assembly never tokenizes chunks again.
+"""
+
+import struct
+from io import BytesIO
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from pgvector.utils import to_db_binary
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.models.chunk import Chunk
+from app.models.document import Document
+from app.services.chunker import TextChunk
+from app.services.rag import header_tokens
+from app.services.retriever import get_vector_store
+
+settings = get_settings()
+
+CHUNK_COLUMNS = ["document_id", "tenant_id", "page", "text", "tokens", "embedding"]
+
+_COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+_COPY_TRAILER = struct.pack(">h", -1)
+
+
+def _chunk_rows(
+    document_id: int,
+    tenant_id: int,
+    chunks: Sequence[TextChunk],
+    embeddings: Sequence[Sequence[float]],
+    page_header_tokens: Dict[int, int],
+) -> List[Dict[str, Any]]:
+    """Build column dicts for chunk rows"""
+    return [
+        {
+            "document_id": document_id,
+            "tenant_id": tenant_id,
+            "page": chunk.page,
+            "text": chunk.text,
+            "tokens": chunk.tokens + page_header_tokens[chunk.page],
+            "embedding": embedding,
+        }
+        for chunk, embedding in zip(chunks, embeddings)
+    ]
+
+
+def encode_copy_binary(rows: Iterable[Dict[str, Any]]) -> bytes:
+    """
+    Encode chunk rows as a PostgreSQL binary COPY stream
+
+    Args:
+        rows: Row dicts with CHUNK_COLUMNS keys
+
+    Returns:
+        COPY payload (header, tuples and trailer)
+    """
+    out = BytesIO()
+    out.write(_COPY_HEADER)
+
+    for row in rows:
+        text = row["text"].encode("utf-8")
+        vector = to_db_binary(row["embedding"])
+        out.write(struct.pack(">hii", len(CHUNK_COLUMNS), 4, row["document_id"]))
+        out.write(struct.pack(">ii", 4, row["tenant_id"]))
+        out.write(struct.pack(">ii", 4, row["page"]))
+        out.write(struct.pack(">i", len(text)))
+        out.write(text)
+        out.write(struct.pack(">ii", 4, row["tokens"]))
+        out.write(struct.pack(">i", len(vector)))
+        out.write(vector)
+
+    out.write(_COPY_TRAILER)
+    return out.getvalue()
+
+
+async def _copy_rows(session: AsyncSession, rows: List[Dict[str, Any]]) -> None:
+    """COPY rows into chunks on the session's asyncpg connection"""
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+
+    await raw_connection.driver_connection.copy_to_table(
+        Chunk.__tablename__,
+        source=BytesIO(encode_copy_binary(rows)),
+        columns=CHUNK_COLUMNS,
+        format="binary",
+    )
+
+
+async def store_chunks(
+    session: AsyncSession,
+    document_id: int,
+    tenant_id: int,
+    chunks: Sequence[TextChunk],
+    embeddings: Sequence[Sequence[float]],
+    batch_size: Optional[int] = None,
+) -> int:
+    """
+    Insert chunks with their embeddings, committing every batch_size rows
+
+    Committed slices are searchable straight away (and handed to the vector
+    store), so a large document becomes partially available while the rest
+    is still being written.
+    Document.chunks is advanced in the same transaction as each slice, so it
+    doubles as ingestion progress.
+
+    Args:
+        session: Database session
+        document_id: Owning document ID
+        tenant_id: Owning tenant ID (the document's)
+        chunks: Chunks to store
+        embeddings: Embedding per chunk, in the same order
+        batch_size: Rows per commit (CHUNK_INSERT_BATCH_SIZE if not provided)
+
+    Returns:
+        Number of rows inserted
+    """
+    if batch_size is None:
+        batch_size = settings.CHUNK_INSERT_BATCH_SIZE
+
+    connection = await session.connection()
+    use_copy = connection.dialect.name == "postgresql"
+    vector_store = get_vector_store()
+
+    title = (
+        await session.execute(select(Document.title).where(Document.id == document_id))
+    ).scalar()
+    page_header_tokens = {
+        page: header_tokens(page, title or "") for page in {chunk.page for chunk in chunks}
+    }
+
+    for start in range(0, len(chunks), batch_size):
+        rows = _chunk_rows(
+            document_id,
+            tenant_id,
+            chunks[start : start + batch_size],
+            embeddings[start : start + batch_size],
+            page_header_tokens,
+        )
+
+        if use_copy:
+            await _copy_rows(session, rows)
+        else:
+            await session.execute(insert(Chunk.__table__), rows)
+
+        await session.execute(
+            update(Document)
+            .where(Document.id == document_id)
+            .values(chunks=Document.chunks + len(rows))
+        )
+        await session.commit()
+        await vector_store.add(session, document_id, tenant_id, [row["embedding"] for row in rows])
+
+    return len(chunks)
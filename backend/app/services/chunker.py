@@ -1,77 +1,162 @@
-"""Text chunking service using tiktoken"""
+"""Text chunking service using tiktoken
 
-from typing import List, Tuple
+Chunks are computed from token boundaries but returned as slices of the
+original page text: token byte lengths are summed to find window edges, so
+no window is ever decoded back from tokens.
+"""
 
+from functools import lru_cache
+from typing import List, NamedTuple, Tuple
+
+import numpy as np
 import tiktoken
 
 from app.core.config import get_settings
+from app.services import tokenizer
 
 settings = get_settings()
 
+CHUNK_ENCODING = tokenizer.DEFAULT_ENCODING
 
-def chunk_text(
-    text: str, page_num: int, chunk_size: int = None, overlap: int = None
-) -> List[Tuple[int, str]]:
+
+class TextChunk(NamedTuple):
+    """A chunk of page text with its token count and character span"""
+
+    page: int
+    text: str
+    tokens: int
+    start: int  # char offset into the page text (inclusive)
+    end: int  # char offset into the page text (exclusive)
+
+
+def get_encoding() -> tiktoken.Encoding:
+    """Get the shared chunking encoder (loaded once per process)"""
+    return tokenizer.get_encoding(CHUNK_ENCODING)
+
+
+@lru_cache()
+def _token_byte_lengths() -> np.ndarray:
+    """UTF-8 byte length of every token id in the chunking vocabulary"""
+    encoding = get_encoding()
+    lengths = np.zeros(encoding.n_vocab, dtype=np.int64)
+    for token in range(encoding.n_vocab):
+        try:
+            lengths[token] = len(encoding.decode_single_token_bytes(token))
+        except KeyError:
+            pass  # unused id between regular and special tokens
+    return lengths
+
+
+def _window_token_bounds(n_tokens: int, chunk_size: int, overlap: int) -> List[Tuple[int, int]]:
+    """Token [start, end) windows of chunk_size stepping by chunk_size - overlap"""
+    step = max(chunk_size - overlap, 1)
+    bounds = []
+    start = 0
+    while start < n_tokens:
+        end = min(start + chunk_size, n_tokens)
+        bounds.append((start, end))
+        if end == n_tokens:
+            break
+        start += step
+    return bounds
+
+
+def _slice_chunks(
+    text: str, tokens: List[int], page_num: int, chunk_size: int, overlap: int
+) -> List[TextChunk]:
+    """Turn one page's tokens into TextChunks sliced from text"""
+    if len(tokens) <= chunk_size:
+        return [TextChunk(page_num, text, len(tokens), 0, len(text))]
+
+    windows = _window_token_bounds(len(tokens), chunk_size, overlap)
+
+    # Byte offset of every window edge from a vectorised prefix sum of token lengths
+    offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+    np.cumsum(_token_byte_lengths()[np.asarray(tokens)], out=offsets[1:])
+    edge_offsets = offsets[[edge for window in windows for edge in window]].tolist()
+    data = text.encode("utf-8")
+
+    # A token may end mid-character; widen each window to whole characters
+    def snap_back(offset: int) -> int:
+        while 0 < offset < len(data) and data[offset] & 0xC0 == 0x80:
+            offset -= 1
+        return offset
+
+    def snap_forward(offset: int) -> int:
+        while offset < len(data) and data[offset] & 0xC0 == 0x80:
+            offset += 1
+        return offset
+
+    byte_bounds = [
+        (snap_back(edge_offsets[2 * i]), snap_forward(edge_offsets[2 * i + 1]))
+        for i in range(len(windows))
+    ]
+
+    # Convert byte offsets to char offsets in one forward pass over the page
+    char_at = {}
+    byte_pos = char_pos = 0
+    for offset in sorted({offset for bounds in byte_bounds for offset in bounds}):
+        char_pos += len(data[byte_pos:offset].decode("utf-8"))
+        byte_pos = offset
+        char_at[offset] = char_pos
+
+    return [
+        TextChunk(page_num, text[char_at[b0] : char_at[b1]], end - start, char_at[b0], char_at[b1])
+        for (start, end), (b0, b1) in zip(windows, byte_bounds)
+    ]
+
+
+def _encodable(text: str) -> str:
+    """Replace lone surrogates (seen in some PDF extractions) so offsets line up"""
+    try:
+        text.encode("utf-8")
+        return text
+    except UnicodeEncodeError:
+        return text.encode("utf-16", "surrogatepass").decode("utf-16", "replace")
+
+
+def chunk_pages(
+    pages: List[Tuple[int, str]], chunk_size: int = None, overlap: int = None
+) -> List[TextChunk]:
     """
-    Chunk text into smaller pieces based on token count
+    Chunk all pages of a document, encoding them in a single batch call
 
     Args:
-        text: Text to chunk
-        page_num: Page number for this text
+        pages: List of (page_number, text) tuples
         chunk_size: Maximum tokens per chunk (from settings if not provided)
         overlap: Token overlap between chunks (from settings if not provided)
 
     Returns:
-        List of tuples (page_number, chunk_text)
+        List of TextChunks in page order
     """
     if chunk_size is None:
         chunk_size = settings.CHUNK_TOKEN_SIZE
     if overlap is None:
         overlap = settings.CHUNK_OVERLAP
 
-    # Use cl100k_base encoding (used by GPT-4, GPT-3.5-turbo)
-    encoding = tiktoken.get_encoding("cl100k_base")
-
-    # Encode text to tokens
-    tokens = encoding.encode(text)
-
-    # If text is smaller than chunk size, return as is
-    if len(tokens) <= chunk_size:
-        return [(page_num, text)]
+    texts = [_encodable(text) for _, text in pages]
+    all_tokens = get_encoding().encode_ordinary_batch(texts)
 
     chunks = []
-    start = 0
-
-    while start < len(tokens):
-        # Get chunk tokens
-        end = start + chunk_size
-        chunk_tokens = tokens[start:end]
-
-        # Decode back to text
-        chunk_text = encoding.decode(chunk_tokens)
-        chunks.append((page_num, chunk_text))
-
-        # Move start position with overlap
-        start = end - overlap
+    for (page_num, _), text, tokens in zip(pages, texts, all_tokens):
+        chunks.extend(_slice_chunks(text, tokens, page_num, chunk_size, overlap))
 
     return chunks
 
 
-def count_tokens(text: str, model: str = "gpt-4") -> int:
+def chunk_text(
+    text: str, page_num: int, chunk_size: int = None, overlap: int = None
+) -> List[TextChunk]:
     """
-    Count tokens in text for a specific model
+    Chunk text into smaller pieces based on token count
 
     Args:
-        text: Text to count tokens for
-        model: Model name (for encoding selection)
+        text: Text to chunk
+        page_num: Page number for this text
+        chunk_size: Maximum tokens per chunk (from settings if not provided)
+        overlap: Token overlap between chunks (from settings if not provided)
 
     Returns:
-        Number of tokens
+        List of TextChunks (page, text, tokens, start, end)
     """
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        # Default to cl100k_base if model not found
-        encoding = tiktoken.get_encoding("cl100k_base")
-
-    return len(encoding.encode(text))
+    return chunk_pages([(page_num, text)], chunk_size, overlap)
@@ -1,10 +1,19 @@
 """Embedding service using OpenAI"""
 
-from typing import List
+import asyncio
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
 
-from openai import AsyncOpenAI
+from openai import APIConnectionError, APIStatusError, AsyncOpenAI, RateLimitError
 
 from app.core.config import get_settings
+from app.services.embedding_cache import (
+    EmbeddingCache,
+    chunk_embedding_cache,
+    query_embedding_cache,
+)
+from app.services.tokenizer import count_tokens_batch
 
 settings = get_settings()
 
@@ -15,6 +24,18 @@ client = AsyncOpenAI(
 )
 
 
+def _embedding_options() -> Dict[str, int]:
+    """Extra embeddings.create arguments; only text-embedding-3 models accept dimensions"""
+    if settings.EMBEDDING_MODEL.startswith("text-embedding-3"):
+        return {"dimensions": settings.EMBEDDING_DIMENSIONS}
+    return {}
+
+
+def _cache_model() -> str:
+    """Model label in cache keys; vectors of different lengths must not collide"""
+    return f"{settings.EMBEDDING_MODEL}@{settings.EMBEDDING_DIMENSIONS}"
+
+
 async def create_embedding(text: str) -> List[float]:
     """
     Create embedding vector for text using OpenAI
@@ -25,32 +46,244 @@ async def create_embedding(text: str) -> List[float]:
     Returns:
         Embedding vector (list of floats)
     """
+    cache = chunk_embedding_cache if settings.EMBEDDING_CACHE_ENABLED else None
+    return await _create_single_embedding(text, cache)
+
+
+async def create_query_embedding(query: str) -> List[float]:
+    """
+    Create embedding vector for a retrieval query
+
+    Queries have their own cache (smaller, shorter TTL) so repeated
+    questions skip the upstream round trip without evicting chunk entries.
+
+    Args:
+        query: User query
+
+    Returns:
+        Embedding vector (list of floats)
+    """
+    cache = query_embedding_cache if settings.QUERY_EMBEDDING_CACHE_ENABLED else None
+    return await _create_single_embedding(query, cache)
+
+
+async def _create_single_embedding(text: str, cache: Optional[EmbeddingCache]) -> List[float]:
+    """Embed one text, reading and filling cache if given"""
+    if cache is not None:
+        key = cache.key(text, _cache_model())
+        (cached,) = await cache.get_many([key])
+        if cached is not None:
+            return cached
+
     response = await client.embeddings.create(
         model=settings.EMBEDDING_MODEL,
         input=text,
+        **_embedding_options(),
     )
+    embedding = response.data[0].embedding
 
-    return response.data[0].embedding
+    if cache is not None:
+        await cache.set_many({key: embedding})
 
+    return embedding
 
-async def create_embeddings_batch(texts: List[str]) -> List[List[float]]:
+
+def count_input_tokens(texts: List[str]) -> List[int]:
+    """
+    Count tokens for each embedding input
+
+    Args:
+        texts: Texts to count
+
+    Returns:
+        Token count per text, in order
+    """
+    # Embedding models share the default (cl100k_base) tokenizer
+    return count_tokens_batch(texts)
+
+
+def plan_batches(token_counts: List[int], max_items: int, max_tokens: int) -> List[Tuple[int, int]]:
+    """
+    Split inputs into [start, end) batches bounded by item count and total tokens
+
+    An input larger than max_tokens on its own still gets a batch of one.
+
+    Args:
+        token_counts: Token count of each input, in order
+        max_items: Maximum inputs per batch
+        max_tokens: Maximum total tokens per batch
+
+    Returns:
+        List of (start, end) tuples in input order
+    """
+    batches = []
+    start = 0
+    batch_tokens = 0
+
+    for index, tokens in enumerate(token_counts):
+        if index > start and (index - start >= max_items or batch_tokens + tokens > max_tokens):
+            batches.append((start, index))
+            start = index
+            batch_tokens = 0
+        batch_tokens += tokens
+
+    if start < len(token_counts):
+        batches.append((start, len(token_counts)))
+
+    return batches
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Rate limits, timeouts, connection failures and 5xx responses are worth retrying"""
+    if isinstance(error, (RateLimitError, APIConnectionError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code >= 500
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """
+    Seconds the server asked us to wait before retrying, if it said
+
+    Args:
+        error: Failed request's error
+
+    Returns:
+        Delay from the retry-after-ms or retry-after header, or None
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return max(float(headers["retry-after-ms"]) / 1000, 0.0)
+        if "retry-after" in headers:
+            value = headers["retry-after"]
+            try:
+                return max(float(value), 0.0)
+            except ValueError:
+                # HTTP-date form
+                retry_at = parsedate_to_datetime(value)
+                return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+async def _embed_batch(texts: List[str], semaphore: asyncio.Semaphore) -> List[List[float]]:
+    """
+    Embed one batch, retrying it on its own after transient failures
+
+    Rate limits, timeouts, connection errors and 5xx responses are retried
+    with exponential backoff, or after the server's retry-after when given;
+    any other error is raised straight away.
+
+    Args:
+        texts: Texts in this batch
+        semaphore: Limits concurrent upstream requests
+
+    Returns:
+        Embedding vectors in input order
+    """
+    attempt = 0
+    while True:
+        try:
+            async with semaphore:
+                response = await client.embeddings.create(
+                    model=settings.EMBEDDING_MODEL,
+                    input=texts,
+                    **_embedding_options(),
+                )
+            # Sort by index to maintain order
+            sorted_embeddings = sorted(response.data, key=lambda x: x.index)
+            return [item.embedding for item in sorted_embeddings]
+        except Exception as e:
+            attempt += 1
+            if not _is_retryable(e) or attempt > settings.EMBEDDING_MAX_RETRIES:
+                raise
+            delay = _retry_after(e)
+            if delay is None:
+                delay = settings.EMBEDDING_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)
+            print(f"[EMBED] Batch of {len(texts)} failed ({e}), retry {attempt} in {delay}s")
+            await asyncio.sleep(delay)
+
+
+async def create_embeddings_batch(
+    texts: List[str], token_counts: Optional[List[int]] = None
+) -> List[List[float]]:
     """
     Create embeddings for multiple texts in batch
 
+    Cached texts are served from the embedding cache and duplicates are sent
+    once. The rest are split by EMBEDDING_BATCH_SIZE and
+    EMBEDDING_BATCH_MAX_TOKENS, and batches run concurrently (at most
+    EMBEDDING_MAX_CONCURRENCY at once); a batch that fails for good cancels
+    the others.
+
     Args:
         texts: List of texts to embed
+        token_counts: Token count per text if already known (skips re-tokenizing)
 
     Returns:
-        List of embedding vectors
+        List of embedding vectors, in the same order as texts
     """
     if not texts:
         return []
 
-    response = await client.embeddings.create(
-        model=settings.EMBEDDING_MODEL,
-        input=texts,
+    if token_counts is None:
+        token_counts = count_input_tokens(texts)
+
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return await _embed_uncached(texts, token_counts)
+
+    keys = [chunk_embedding_cache.key(text, _cache_model()) for text in texts]
+    embeddings = await chunk_embedding_cache.get_many(keys)
+
+    # One upstream input per distinct missing key
+    pending: Dict[str, Tuple[str, int]] = {}
+    for key, text, tokens, embedding in zip(keys, texts, token_counts, embeddings):
+        if embedding is None and key not in pending:
+            pending[key] = (text, tokens)
+
+    if pending:
+        pending_texts, pending_tokens = zip(*pending.values())
+        fresh = dict(zip(pending, await _embed_uncached(list(pending_texts), list(pending_tokens))))
+        await chunk_embedding_cache.set_many(fresh)
+        embeddings = [
+            embedding if embedding is not None else fresh[key]
+            for key, embedding in zip(keys, embeddings)
+        ]
+
+    return embeddings
+
+
+async def _embed_uncached(texts: List[str], token_counts: List[int]) -> List[List[float]]:
+    """
+    Embed texts upstream in token-budgeted concurrent batches
+
+    Args:
+        texts: List of texts to embed
+        token_counts: Token count per text
+
+    Returns:
+        List of embedding vectors, in the same order as texts
+    """
+    batches = plan_batches(
+        token_counts,
+        settings.EMBEDDING_BATCH_SIZE,
+        settings.EMBEDDING_BATCH_MAX_TOKENS,
     )
 
-    # Sort by index to maintain order
-    sorted_embeddings = sorted(response.data, key=lambda x: x.index)
-    return [item.embedding for item in sorted_embeddings]
+    semaphore = asyncio.Semaphore(settings.EMBEDDING_MAX_CONCURRENCY)
+    try:
+        async with asyncio.TaskGroup() as group:
+            tasks = [
+                group.create_task(_embed_batch(texts[start:end], semaphore))
+                for start, end in batches
+            ]
+    except ExceptionGroup as e:
+        # Surface the first batch failure; the other batches were cancelled
+        raise e.exceptions[0] from e
+
+    return [embedding for task in tasks for embedding in task.result()]
@@ -0,0 +1,182 @@
+"""Content-addressed embedding cache
+
+Embeddings are keyed by (embedding model, hash of normalized text) and kept
+in a per-process LRU backed by a shared Redis tier, so byte-identical text is
+only ever embedded once per model.
+"""
+
+import hashlib
+import re
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import redis.asyncio as redis
+
+from app.core.config import get_settings
+
+settings = get_settings()
+
+# Vectors are stored as raw float32 bytes, so responses must not be decoded
+redis_client = redis.from_url(settings.REDIS_URL, socket_timeout=1.0)
+
+_whitespace = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text before hashing
+
+    NFKC folds Arabic presentation forms that PDF extraction often produces
+    back to base letters; runs of whitespace collapse to a single space.
+
+    Args:
+        text: Raw text
+
+    Returns:
+        Normalized text
+    """
+    return _whitespace.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+class LRUCache:
+    """Bounded in-process LRU mapping keys to float32 vectors"""
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._items: "OrderedDict[str, array]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[array]:
+        vector = self._items.get(key)
+        if vector is not None:
+            self._items.move_to_end(key)
+        return vector
+
+    def put(self, key: str, vector: array) -> None:
+        if self.max_items <= 0:
+            return
+        self._items[key] = vector
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class EmbeddingCache:
+    """Two-tier (local LRU + Redis) embedding cache"""
+
+    def __init__(self, namespace: str, local_size: int, ttl_seconds: int, shared: bool = True):
+        """
+        Args:
+            namespace: Key prefix and metrics label for this cache
+            local_size: Maximum entries in the in-process LRU
+            ttl_seconds: Redis expiry in seconds (0 = never expire)
+            shared: Whether to use the Redis tier
+        """
+        self.namespace = namespace
+        self.local = LRUCache(local_size)
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared
+
+    def key(self, text: str, model: str) -> str:
+        """Build the cache key for text embedded with model"""
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{self.namespace}:{model}:{digest}"
+
+    async def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        """
+        Look up embeddings for keys
+
+        Args:
+            keys: Cache keys
+
+        Returns:
+            Embedding per key, or None on a miss
+        """
+        # Imported here: the routes package imports the embedder at load time
+        from app.api.routes.metrics import embedding_cache_hits_total, embedding_cache_misses_total
+
+        results: List[Optional[List[float]]] = [None] * len(keys)
+        missing = []
+
+        for i, key in enumerate(keys):
+            vector = self.local.get(key)
+            if vector is not None:
+                results[i] = vector.tolist()
+            else:
+                missing.append(i)
+
+        local_hits = len(keys) - len(missing)
+        shared_hits = 0
+
+        if missing and self.shared:
+            try:
+                values = await redis_client.mget([keys[i] for i in missing])
+            except Exception as e:
+                print(f"[CACHE] Redis lookup failed: {e}")
+                values = [None] * len(missing)
+
+            still_missing = []
+            for i, value in zip(missing, values):
+                if value is None:
+                    still_missing.append(i)
+                    continue
+                vector = array("f")
+                vector.frombytes(value)
+                self.local.put(keys[i], vector)
+                results[i] = vector.tolist()
+                shared_hits += 1
+            missing = still_missing
+
+        embedding_cache_hits_total.labels(cache=self.namespace, tier="local").inc(local_hits)
+        embedding_cache_hits_total.labels(cache=self.namespace, tier="redis").inc(shared_hits)
+        embedding_cache_misses_total.labels(cache=self.namespace).inc(len(missing))
+
+        return results
+
+    async def set_many(self, items: Dict[str, List[float]]) -> None:
+        """
+        Store embeddings in both tiers
+
+        Args:
+            items: Mapping of cache key to embedding
+        """
+        if not items:
+            return
+
+        packed = {}
+        for key, embedding in items.items():
+            vector = array("f", embedding)
+            self.local.put(key, vector)
+            packed[key] = vector.tobytes()
+
+        if not self.shared:
+            return
+
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for key, value in packed.items():
+                    pipe.set(key, value, ex=self.ttl_seconds or None)
+                await pipe.execute()
+        except Exception as e:
+            print(f"[CACHE] Redis store failed: {e}")
+
+
+# Cache for document chunk embeddings
+chunk_embedding_cache = EmbeddingCache(
+    namespace="emb",
+    local_size=settings.EMBEDDING_CACHE_LOCAL_SIZE,
+    ttl_seconds=settings.EMBEDDING_CACHE_TTL_SECONDS,
+    shared=settings.EMBEDDING_CACHE_SHARED,
+)
+
+# Cache for retrieval query embeddings (repeat questions skip the upstream call)
+query_embedding_cache = EmbeddingCache(
+    namespace="qemb",
+    local_size=settings.QUERY_EMBEDDING_CACHE_LOCAL_SIZE,
+    ttl_seconds=settings.QUERY_EMBEDDING_CACHE_TTL_SECONDS,
+    shared=settings.QUERY_EMBEDDING_CACHE_SHARED,
+)
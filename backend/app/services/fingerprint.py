@@ -0,0 +1,79 @@
+"""Document fingerprints for skipping duplicate uploads
+
+A document carries two SHA-256 fingerprints: one of the uploaded file bytes,
+known as soon as the upload is spooled, and one of its normalized extracted
+text, known once ingestion has read every page. The first catches re-uploads
+of the same file before any work is done; the second catches the same
+content re-exported or re-saved as a different file.
+"""
+
+import hashlib
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.document import Document
+from app.services.embedding_cache import normalize_text
+
+
+class TextFingerprint:
+    """Incremental SHA-256 of a document's normalized page text"""
+
+    def __init__(self):
+        self._hash = hashlib.sha256()
+
+    def update(self, pages: List[Tuple[int, str]]) -> None:
+        """Add pages in document order"""
+        for _, text in pages:
+            self._hash.update(normalize_text(text).encode("utf-8"))
+            self._hash.update(b"\x00")  # page separator
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+async def find_duplicate(
+    session: AsyncSession,
+    tenant_id: int,
+    file_sha256: Optional[str] = None,
+    text_sha256: Optional[str] = None,
+    exclude_id: Optional[int] = None,
+) -> Optional[Document]:
+    """
+    Find a tenant's original document with the same fingerprint
+
+    Failed documents and documents that are themselves duplicates are
+    ignored, so a lookup always resolves to a document that owns chunks.
+
+    Args:
+        session: Database session
+        tenant_id: Tenant to search within
+        file_sha256: File fingerprint to match
+        text_sha256: Text fingerprint to match (used if file_sha256 is not given)
+        exclude_id: Document ID to leave out (the one being ingested)
+
+    Returns:
+        Oldest matching document, or None
+    """
+    if file_sha256 is not None:
+        match = Document.file_sha256 == file_sha256
+    elif text_sha256 is not None:
+        match = Document.text_sha256 == text_sha256
+    else:
+        return None
+
+    query = (
+        select(Document)
+        .where(Document.tenant_id == tenant_id)
+        .where(match)
+        .where(Document.status != "failed")
+        .where(Document.duplicate_of.is_(None))
+        .order_by(Document.id)
+        .limit(1)
+    )
+    if exclude_id is not None:
+        query = query.where(Document.id != exclude_id)
+
+    result = await session.execute(query)
+    return result.scalar_one_or_none()
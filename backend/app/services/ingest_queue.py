@@ -0,0 +1,165 @@
+"""Durable ingestion job queue backed by the ingestion_jobs table
+
+Workers claim jobs with SELECT ... FOR UPDATE SKIP LOCKED, preferring
+tenants with the fewest jobs already running so one tenant's bulk upload
+cannot starve everyone else. Jobs whose worker stopped heartbeating are
+reclaimed after INGEST_JOB_LEASE_SECONDS.
+"""
+
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.core.config import get_settings
+from app.models.document import Document
+from app.models.job import IngestionJob
+
+settings = get_settings()
+
+
+def enqueue_ingestion(
+    session: AsyncSession, document: Document, file_path: str, num_pages: int
+) -> IngestionJob:
+    """
+    Add an ingestion job for a document (committed by the caller)
+
+    Args:
+        session: Database session
+        document: Document to ingest (must already have an ID)
+        file_path: Path of the spooled PDF, readable by worker processes
+        num_pages: Page count read during upload
+
+    Returns:
+        The new job
+    """
+    job = IngestionJob(
+        document_id=document.id,
+        tenant_id=document.tenant_id,
+        file_path=file_path,
+        num_pages=num_pages,
+    )
+    session.add(job)
+    return job
+
+
+async def claim_next_job(session: AsyncSession, worker_id: str) -> Optional[IngestionJob]:
+    """
+    Claim the next runnable job, fairly across tenants
+
+    Args:
+        session: Database session
+        worker_id: Identifier recorded on the claimed job
+
+    Returns:
+        The claimed job (now 'running'), or None if nothing is runnable
+    """
+    now = datetime.utcnow()
+    lease_expired = now - timedelta(seconds=settings.INGEST_JOB_LEASE_SECONDS)
+
+    running = aliased(IngestionJob)
+    running_for_tenant = (
+        select(func.count())
+        .select_from(running)
+        .where(running.tenant_id == IngestionJob.tenant_id)
+        .where(running.status == "running")
+        .scalar_subquery()
+    )
+
+    result = await session.execute(
+        select(IngestionJob)
+        .where(
+            or_(
+                and_(IngestionJob.status == "queued", IngestionJob.run_after <= now),
+                and_(IngestionJob.status == "running", IngestionJob.locked_at < lease_expired),
+            )
+        )
+        .order_by(running_for_tenant, IngestionJob.created_at)
+        .limit(1)
+        .with_for_update(skip_locked=True, of=IngestionJob)
+    )
+    job = result.scalar_one_or_none()
+
+    if job is None:
+        await session.rollback()
+        return None
+
+    job.status = "running"
+    job.attempts += 1
+    job.locked_at = now
+    job.locked_by = worker_id
+    job.updated_at = now
+
+    await session.execute(
+        update(Document).where(Document.id == job.document_id).values(status="processing")
+    )
+    await session.commit()
+
+    return job
+
+
+async def heartbeat_job(session: AsyncSession, job_id: int) -> None:
+    """Extend the lease on a running job"""
+    await session.execute(
+        update(IngestionJob)
+        .where(IngestionJob.id == job_id)
+        .where(IngestionJob.status == "running")
+        .values(locked_at=datetime.utcnow())
+    )
+    await session.commit()
+
+
+async def complete_job(session: AsyncSession, job: IngestionJob) -> None:
+    """Mark a job done and remove its spooled file"""
+    job.status = "done"
+    job.error = None
+    job.locked_at = None
+    job.updated_at = datetime.utcnow()
+    await session.commit()
+
+    _remove_file(job.file_path)
+
+
+async def fail_job(session: AsyncSession, job: IngestionJob, error: str) -> None:
+    """
+    Record a failed attempt, re-queueing with backoff while attempts remain
+
+    Args:
+        session: Database session
+        job: The failed job
+        error: Error message to record
+    """
+    # The session may have been rolled back after the failure
+    await session.refresh(job)
+
+    now = datetime.utcnow()
+    job.error = error[:2000]
+    job.locked_at = None
+    job.updated_at = now
+
+    if job.attempts < settings.INGEST_MAX_ATTEMPTS:
+        delay = settings.INGEST_RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1)
+        job.status = "queued"
+        job.run_after = now + timedelta(seconds=delay)
+        document_values = {"status": "pending"}
+    else:
+        job.status = "failed"
+        document_values = {"status": "failed", "error": job.error}
+
+    await session.execute(
+        update(Document).where(Document.id == job.document_id).values(**document_values)
+    )
+    await session.commit()
+
+    if job.status == "failed":
+        _remove_file(job.file_path)
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
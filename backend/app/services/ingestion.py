@@ -0,0 +1,254 @@
+"""PDF ingestion: extract, chunk, embed and store a spooled upload
+
+Ingestion runs as a bounded streaming pipeline:
+
+    extract (process pool) -> chunk -> embed (concurrent) -> store
+
+Each stage hands work to the next through a bounded asyncio.Queue, so
+stages overlap, memory is capped by the queue depths, and end-to-end time
+approaches that of the slowest stage rather than the sum of all stages.
+
+The extract stage also fingerprints the document text. Once every page
+is read, the fingerprint is checked against the tenant's documents while
+the other stages keep going; if the tenant already has the same text, the
+remaining stages are cancelled, the chunks stored so far are deleted and
+the document is linked to the original instead. Exact re-uploads never get
+this far (the upload's file fingerprint catches them), and re-embedding
+repeated text is served by the embedding cache.
+"""
+
+import asyncio
+import time
+from contextlib import aclosing
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.models.chunk import Chunk
+from app.models.document import Document
+from app.services.chunk_store import store_chunks
+from app.services.chunker import TextChunk, chunk_pages
+from app.services.embedder import create_embeddings_batch
+from app.services.fingerprint import TextFingerprint, find_duplicate
+from app.services.pdf_ingest import iter_pdf_pages
+from app.services.retriever import get_vector_store
+
+settings = get_settings()
+
+EmbeddedBatch = Tuple[List[TextChunk], List[List[float]]]
+
+
+class _DuplicateText(Exception):
+    """Raised in the pipeline to stop it when the text turns out to be a duplicate"""
+
+
+class _StageStats:
+    """Items processed and time spent working (not waiting) in one stage"""
+
+    def __init__(self):
+        self.items = 0
+        self.busy_seconds = 0.0
+
+    def record(self, items: int, started: float) -> None:
+        self.items += items
+        self.busy_seconds += time.perf_counter() - started
+
+    def as_dict(self) -> Dict[str, float]:
+        rate = self.items / self.busy_seconds if self.busy_seconds else 0.0
+        return {
+            "items": self.items,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "items_per_second": round(rate, 1),
+        }
+
+
+async def process_pdf_file(
+    session: AsyncSession, file_path: str, document_id: int, num_pages: int
+) -> Dict[str, object]:
+    """
+    Ingest a spooled PDF into chunks for a document
+
+    Safe to re-run after a failed attempt: chunks left by earlier attempts
+    are removed first. Errors propagate so the caller can retry. A document
+    whose text duplicates an existing one ends up with no chunks and
+    duplicate_of pointing at the original.
+
+    Args:
+        session: Database session (used only by the store stage)
+        file_path: Path of the spooled PDF
+        document_id: Document ID to ingest into
+        num_pages: Page count read during upload
+
+    Returns:
+        Stats dict with chunk count, duplicate_of, elapsed time and
+        per-stage throughput
+    """
+    document = await session.get(Document, document_id)
+    tenant_id = document.tenant_id
+
+    await session.execute(delete(Chunk).where(Chunk.document_id == document_id))
+    await session.execute(update(Document).where(Document.id == document_id).values(chunks=0))
+    await session.commit()
+    await get_vector_store().remove_document(session, document_id, tenant_id)
+
+    started = time.perf_counter()
+    embed_workers = max(settings.EMBEDDING_MAX_CONCURRENCY, 1)
+
+    page_queue: asyncio.Queue[Optional[List[Tuple[int, str]]]] = asyncio.Queue(
+        settings.INGEST_PAGE_QUEUE_SIZE
+    )
+    embed_queue: asyncio.Queue[Optional[List[TextChunk]]] = asyncio.Queue(
+        settings.INGEST_EMBED_QUEUE_SIZE
+    )
+    store_queue: asyncio.Queue[Optional[EmbeddedBatch]] = asyncio.Queue(
+        settings.INGEST_STORE_QUEUE_SIZE
+    )
+    stats = {name: _StageStats() for name in ("extract", "chunk", "embed", "store")}
+    stored = 0
+    fingerprint = TextFingerprint()
+    duplicate_of: Optional[int] = None
+    # The store stage and the duplicate check share the session
+    session_lock = asyncio.Lock()
+
+    async def extract_stage() -> None:
+        # aclosing cancels in-flight pool work if another stage fails
+        async with aclosing(iter_pdf_pages(file_path, num_pages=num_pages)) as page_ranges:
+            t0 = time.perf_counter()
+            async for pages in page_ranges:
+                fingerprint.update(pages)
+                stats["extract"].record(len(pages), t0)
+                await page_queue.put(pages)
+                t0 = time.perf_counter()
+
+        await page_queue.put(None)
+        async with session_lock:
+            await check_duplicate()
+        if duplicate_of is not None:
+            raise _DuplicateText()
+
+    async def check_duplicate() -> None:
+        nonlocal duplicate_of
+        text_sha256 = fingerprint.hexdigest()
+        original = await find_duplicate(
+            session, tenant_id, text_sha256=text_sha256, exclude_id=document_id
+        )
+        try:
+            await record_fingerprint(text_sha256, original.id if original else None)
+        except IntegrityError:
+            # A concurrent ingestion of the same text became the original first
+            await session.rollback()
+            original = await find_duplicate(
+                session, tenant_id, text_sha256=text_sha256, exclude_id=document_id
+            )
+            if original is None:
+                raise
+            await record_fingerprint(text_sha256, original.id)
+
+    async def record_fingerprint(text_sha256: str, original_id: Optional[int]) -> None:
+        nonlocal duplicate_of
+        await session.execute(
+            update(Document)
+            .where(Document.id == document_id)
+            .values(text_sha256=text_sha256, duplicate_of=original_id)
+        )
+        await session.commit()
+        duplicate_of = original_id
+
+    async def chunk_stage() -> None:
+        batch: List[TextChunk] = []
+        batch_tokens = 0
+        while (pages := await page_queue.get()) is not None:
+            t0 = time.perf_counter()
+            # Tokenizing is CPU-bound; keep the loop free for embed/store I/O
+            chunks = await asyncio.to_thread(chunk_pages, pages)
+            stats["chunk"].record(len(chunks), t0)
+
+            for chunk in chunks:
+                if batch and (
+                    len(batch) >= settings.EMBEDDING_BATCH_SIZE
+                    or batch_tokens + chunk.tokens > settings.EMBEDDING_BATCH_MAX_TOKENS
+                ):
+                    await embed_queue.put(batch)
+                    batch, batch_tokens = [], 0
+                batch.append(chunk)
+                batch_tokens += chunk.tokens
+
+        if batch:
+            await embed_queue.put(batch)
+        for _ in range(embed_workers):
+            await embed_queue.put(None)
+
+    async def embed_stage() -> None:
+        while (batch := await embed_queue.get()) is not None:
+            t0 = time.perf_counter()
+            embeddings = await create_embeddings_batch(
+                [chunk.text for chunk in batch], [chunk.tokens for chunk in batch]
+            )
+            stats["embed"].record(len(batch), t0)
+            await store_queue.put((batch, embeddings))
+        await store_queue.put(None)
+
+    async def store_stage() -> None:
+        nonlocal stored
+        pending_chunks: List[TextChunk] = []
+        pending_embeddings: List[List[float]] = []
+        finished_embedders = 0
+
+        async def flush() -> None:
+            nonlocal stored
+            t0 = time.perf_counter()
+            async with session_lock:
+                stored += await store_chunks(
+                    session, document_id, tenant_id, pending_chunks, pending_embeddings
+                )
+            stats["store"].record(len(pending_chunks), t0)
+            pending_chunks.clear()
+            pending_embeddings.clear()
+
+        while finished_embedders < embed_workers:
+            item = await store_queue.get()
+            if item is None:
+                finished_embedders += 1
+                continue
+            pending_chunks.extend(item[0])
+            pending_embeddings.extend(item[1])
+            if len(pending_chunks) >= settings.CHUNK_INSERT_BATCH_SIZE:
+                await flush()
+
+        if pending_chunks:
+            await flush()
+
+    try:
+        async with asyncio.TaskGroup() as group:
+            group.create_task(extract_stage())
+            group.create_task(chunk_stage())
+            for _ in range(embed_workers):
+                group.create_task(embed_stage())
+            group.create_task(store_stage())
+    except ExceptionGroup as e:
+        if not e.subgroup(_DuplicateText):
+            # Surface the first stage failure; its siblings were cancelled
+            raise e.exceptions[0] from e
+        # Same text as an existing document: drop what was stored before the check
+        await session.rollback()
+        await session.execute(delete(Chunk).where(Chunk.document_id == document_id))
+        await session.commit()
+        await get_vector_store().remove_document(session, document_id, tenant_id)
+        stored = 0
+
+    await session.execute(
+        update(Document)
+        .where(Document.id == document_id)
+        .values(status="ready", chunks=stored, error=None)
+    )
+    await session.commit()
+
+    return {
+        "chunks": stored,
+        "duplicate_of": duplicate_of,
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+        "stages": {name: stage.as_dict() for name, stage in stats.items()},
+    }
@@ -1,48 +1,242 @@
-"""PDF ingestion service using pypdf"""
+"""PDF ingestion service using pypdf
 
+Text extraction is CPU-bound, so pages are split into contiguous ranges and
+extracted in a process pool instead of on the event loop.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import signal
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
-from typing import List, Tuple
+from typing import AsyncIterator, Deque, List, Optional, Tuple, Union
 
 from pypdf import PdfReader
 
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_workers = 0
+
+# PDF content as raw bytes or as a path to a file on disk. Paths are preferred
+# for large files: workers open the file themselves instead of receiving a
+# pickled copy of the whole document per task.
+PdfSource = Union[bytes, str]
+
+
+class _PageTimeout(Exception):
+    """Raised inside a worker when a single page exceeds its time budget"""
+
+
+def _raise_page_timeout(signum, frame):
+    raise _PageTimeout()
+
+
+def _open_reader(source: PdfSource) -> PdfReader:
+    """Open a PdfReader over bytes or a file path"""
+    if isinstance(source, bytes):
+        return PdfReader(BytesIO(source))
+    return PdfReader(source)
+
+
+def _count_pages(source: PdfSource) -> int:
+    """Return the number of pages in a PDF (runs in a worker process)"""
+    return len(_open_reader(source).pages)
 
-async def extract_text_from_pdf(pdf_bytes: bytes) -> List[Tuple[int, str]]:
+
+def _extract_page_range(
+    source: PdfSource, start: int, end: int, page_timeout: float
+) -> List[Tuple[int, str]]:
     """
-    Extract text from PDF file
+    Extract text from pages [start, end) (runs in a worker process)
 
     Args:
-        pdf_bytes: PDF file content as bytes
+        source: PDF file content as bytes, or a path to the file
+        start: First page index (0-based, inclusive)
+        end: Last page index (0-based, exclusive)
+        page_timeout: Seconds allowed per page; slower pages are skipped
 
     Returns:
-        List of tuples (page_number, text_content)
-
-    Raises:
-        ValueError: If PDF is invalid or exceeds limits
+        List of tuples (page_number, text_content) for non-empty pages
     """
-    try:
-        pdf_file = BytesIO(pdf_bytes)
-        reader = PdfReader(pdf_file)
+    reader = _open_reader(source)
+
+    # Pool workers run tasks on their main thread, so SIGALRM can interrupt
+    # a single pathological page without losing the rest of the range.
+    use_alarm = page_timeout > 0 and hasattr(signal, "SIGALRM")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_page_timeout)
+
+    pages_text = []
+    for index in range(start, end):
+        try:
+            if use_alarm:
+                signal.setitimer(signal.ITIMER_REAL, page_timeout)
+            text = reader.pages[index].extract_text()
+        except _PageTimeout:
+            print(f"[PDF] Page {index + 1} exceeded {page_timeout}s, skipped")
+            continue
+        finally:
+            if use_alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+
+        if text.strip():  # Only include non-empty pages
+            pages_text.append((index + 1, text))
 
-        num_pages = len(reader.pages)
+    return pages_text
 
-        # Check page limit
+
+def get_pdf_executor() -> ProcessPoolExecutor:
+    """Get the shared PDF extraction process pool, creating it on first use"""
+    global _executor, _executor_workers
+
+    if _executor is None:
         from app.core.config import get_settings
 
         settings = get_settings()
+        _executor_workers = settings.PDF_EXTRACT_WORKERS or os.cpu_count() or 1
+
+        # spawn avoids forking a process that owns an event loop and DB pools
+        _executor = ProcessPoolExecutor(
+            max_workers=_executor_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+
+    return _executor
+
+
+def shutdown_pdf_executor() -> None:
+    """Shut down the PDF extraction process pool if it was started"""
+    global _executor
+
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def split_page_ranges(num_pages: int, workers: int, max_pages: int) -> List[Tuple[int, int]]:
+    """
+    Split pages into contiguous [start, end) ranges for the worker pool
+
+    Args:
+        num_pages: Total number of pages
+        workers: Number of pool workers
+        max_pages: Maximum pages per range
+
+    Returns:
+        List of (start, end) tuples in page order
+    """
+    if num_pages <= 0:
+        return []
+
+    size = max(1, min(max_pages, -(-num_pages // max(workers, 1))))
+    return [(start, min(start + size, num_pages)) for start in range(0, num_pages, size)]
+
+
+async def count_pdf_pages(source: PdfSource) -> int:
+    """
+    Count pages in a PDF without extracting any text
 
-        if num_pages > settings.MAX_PDF_PAGES:
-            raise ValueError(
-                f"PDF has {num_pages} pages, maximum allowed is {settings.MAX_PDF_PAGES}"
-            )
+    Args:
+        source: PDF file content as bytes, or a path to the file
+
+    Returns:
+        Number of pages
 
-        # Extract text from each page
-        pages_text = []
-        for page_num, page in enumerate(reader.pages, start=1):
-            text = page.extract_text()
-            if text.strip():  # Only include non-empty pages
-                pages_text.append((page_num, text))
+    Raises:
+        ValueError: If PDF is invalid or exceeds the page limit
+    """
+    from app.core.config import get_settings
 
-        return pages_text
+    settings = get_settings()
+    loop = asyncio.get_running_loop()
 
+    try:
+        num_pages = await loop.run_in_executor(get_pdf_executor(), _count_pages, source)
     except Exception as e:
-        raise ValueError(f"Failed to extract text from PDF: {str(e)}") from e
+        raise ValueError(f"Failed to read PDF: {str(e)}") from e
+
+    # Check page limit
+    if num_pages > settings.MAX_PDF_PAGES:
+        raise ValueError(f"PDF has {num_pages} pages, maximum allowed is {settings.MAX_PDF_PAGES}")
+
+    return num_pages
+
+
+async def iter_pdf_pages(
+    source: PdfSource, num_pages: Optional[int] = None
+) -> AsyncIterator[List[Tuple[int, str]]]:
+    """
+    Stream extracted pages, one page range at a time, in page order
+
+    At most one range per pool worker is in flight, so memory stays bounded
+    and consumers can start on early pages while later ones are extracted.
+
+    Args:
+        source: PDF file content as bytes, or a path to the file
+        num_pages: Page count if already known (skips re-counting)
+
+    Yields:
+        Lists of (page_number, text_content) tuples for non-empty pages
+
+    Raises:
+        ValueError: If PDF is invalid or exceeds limits
+    """
+    from app.core.config import get_settings
+
+    settings = get_settings()
+    loop = asyncio.get_running_loop()
+    executor = get_pdf_executor()
+
+    if num_pages is None:
+        num_pages = await count_pdf_pages(source)
+
+    ranges = iter(
+        split_page_ranges(num_pages, _executor_workers, settings.PDF_EXTRACT_PAGES_PER_TASK)
+    )
+    page_timeout = settings.PDF_PAGE_TIMEOUT_SECONDS
+    pending: Deque[asyncio.Future] = deque()
+
+    def submit_next() -> None:
+        page_range = next(ranges, None)
+        if page_range is None:
+            return
+        start, end = page_range
+        # Not wrapped in a timeout: the range may wait in the shared pool's
+        # queue; the worker bounds each page itself (PDF_PAGE_TIMEOUT_SECONDS)
+        pending.append(
+            loop.run_in_executor(executor, _extract_page_range, source, start, end, page_timeout)
+        )
+
+    for _ in range(max(_executor_workers, 1)):
+        submit_next()
+
+    try:
+        while pending:
+            try:
+                pages = await pending.popleft()
+            except Exception as e:
+                raise ValueError(f"Failed to extract text from PDF: {str(e)}") from e
+            submit_next()
+            yield pages
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+async def extract_text_from_pdf(
+    source: PdfSource, num_pages: Optional[int] = None
+) -> List[Tuple[int, str]]:
+    """
+    Extract text from PDF file
+
+    Args:
+        source: PDF file content as bytes, or a path to the file
+        num_pages: Page count if already known (skips re-counting)
+
+    Returns:
+        List of tuples (page_number, text_content), in page order
+
+    Raises:
+        ValueError: If PDF is invalid or exceeds limits
+    """
+    return [page async for pages in iter_pdf_pages(source, num_pages) for page in pages]
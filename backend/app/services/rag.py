@@ -1,22 +1,115 @@
-"""RAG prompt construction service"""
+"""RAG prompt construction service
 
-from typing import List, Tuple
+Retrieved chunks are filtered on the scores the vector search already
+computed before they are packed: chunks too far from the question, chunks
+much worse than the best match and near-duplicates of a better chunk are
+dropped, so the prompt carries fewer, more relevant tokens.
+
+Each chunk's token count, source header included, is stored at ingestion
+(Chunk.tokens), so packing adds integers; only the question is tokenized
+per turn.
+"""
+
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
 
 from app.core.config import get_settings
-from app.services.chunker import count_tokens
+from app.services.tokenizer import count_tokens
+from app.services.vector_store import SearchHit, normalize_rows
 
 settings = get_settings()
 
+# Share of MAX_CONTEXT_TOKENS for retrieved context and question; the rest is
+# left for the system prompt and the answer
+CONTEXT_SHARE = 0.7
+
+
+def chunk_context(text: str, page: int, title: str) -> str:
+    """Chunk as it appears in the prompt, with its source header"""
+    return f"[سند: {title} - صفحه {page}]\n{text}\n"
+
+
+def header_tokens(page: int, title: str) -> int:
+    """
+    Tokens chunk_context adds around a chunk's text
+
+    Counted with the chunking encoding (and memoized: a document's headers
+    differ only in the page), so a chunk's prompt tokens are its
+    TextChunk.tokens plus this.
+
+    Args:
+        page: Page number
+        title: Document title
+
+    Returns:
+        Token count of the header and trailing newline
+    """
+    return count_tokens(chunk_context("", page, title))
+
+
+def select_chunks(
+    hits: Sequence[SearchHit],
+    max_distance: Optional[float] = None,
+    relative_gap: Optional[float] = None,
+    duplicate_similarity: Optional[float] = None,
+) -> List[SearchHit]:
+    """
+    Keep the retrieved chunks worth putting in the prompt
+
+    Args:
+        hits: Retrieved chunks ordered by increasing distance
+        max_distance: Largest cosine distance kept (RAG_MAX_DISTANCE if not provided)
+        relative_gap: Drop chunks whose similarity is this fraction below the
+            best chunk's (RAG_RELATIVE_GAP if not provided)
+        duplicate_similarity: Drop chunks at least this cosine-similar to a
+            closer kept chunk (RAG_DUPLICATE_SIMILARITY if not provided)
+
+    Returns:
+        Kept chunks, in order; a cutoff of 0 disables it
+    """
+    if max_distance is None:
+        max_distance = settings.RAG_MAX_DISTANCE
+    if relative_gap is None:
+        relative_gap = settings.RAG_RELATIVE_GAP
+    if duplicate_similarity is None:
+        duplicate_similarity = settings.RAG_DUPLICATE_SIMILARITY
+
+    hits = sorted(hits, key=lambda hit: hit.distance)
+    if max_distance:
+        hits = [hit for hit in hits if hit.distance <= max_distance]
+    if relative_gap and hits:
+        min_similarity = (1.0 - hits[0].distance) * (1.0 - relative_gap)
+        hits = [hit for hit in hits if 1.0 - hit.distance >= min_similarity]
+
+    with_vectors = [i for i, hit in enumerate(hits) if hit.embedding is not None]
+    if not duplicate_similarity or len(with_vectors) < 2:
+        return hits
+
+    vectors = normalize_rows(
+        np.stack([np.asarray(hits[i].embedding, dtype=np.float32) for i in with_vectors])
+    )
+    similarity = vectors @ vectors.T
+    duplicates = set()
+    kept: List[int] = []
+    for row, i in enumerate(with_vectors):
+        if kept and similarity[row, kept].max() >= duplicate_similarity:
+            duplicates.add(i)
+        else:
+            kept.append(row)
+
+    return [hit for i, hit in enumerate(hits) if i not in duplicates]
+
 
 def build_rag_prompt(
-    user_question: str, retrieved_chunks: List[Tuple[str, int, str]], max_tokens: int = None
+    user_question: str, retrieved_chunks: Sequence[SearchHit], max_tokens: int = None
 ) -> Tuple[str, str]:
     """
     Build system and user prompts for RAG
 
     Args:
         user_question: User's question
-        retrieved_chunks: List of (chunk_text, page, title) tuples
+        retrieved_chunks: Scored chunks from retrieve_relevant_chunks
         max_tokens: Maximum tokens for context (from settings if not provided)
 
     Returns:
@@ -25,21 +118,20 @@ def build_rag_prompt(
     if max_tokens is None:
         max_tokens = settings.MAX_CONTEXT_TOKENS
 
-    # Build retrieved documents context
+    # Build retrieved documents context within what the question leaves
     context_parts = []
+    budget = max_tokens * CONTEXT_SHARE - count_tokens(user_question)
     current_tokens = 0
 
-    for chunk_text, page, title in retrieved_chunks:
-        chunk_context = f"[سند: {title} - صفحه {page}]\n{chunk_text}\n"
-        chunk_tokens = count_tokens(chunk_context)
+    for hit in select_chunks(retrieved_chunks):
+        context = chunk_context(hit.text, hit.page, hit.title)
+        # Chunks stored before token counts existed have 0 and are counted here
+        chunk_tokens = hit.tokens or count_tokens(context)
 
-        # Check if adding this chunk exceeds max tokens
-        if (
-            current_tokens + chunk_tokens > max_tokens * 0.7
-        ):  # Reserve 30% for question and system prompt
+        if current_tokens + chunk_tokens > budget:
             break
 
-        context_parts.append(chunk_context)
+        context_parts.append(context)
         current_tokens += chunk_tokens
 
     retrieved_context = "\n".join(context_parts)
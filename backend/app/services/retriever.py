@@ -1,19 +1,222 @@
-"""Vector retrieval service for RAG"""
+"""Vector retrieval service for RAG
 
-from typing import List, Tuple
+Retrieval goes through the configured vector store (VECTOR_STORE). With
+pgvector, the similarity query runs directly on the session's asyncpg
+connection as a prepared statement (prepared once per pooled connection and
+reused), with the query vector bound once in pgvector's binary format
+instead of as a text literal Postgres has to parse. With quantization or
+a search prefix, the nearest-neighbour scan orders by the coarse expression
+the vector index is built on, and only its candidates are reranked on the
+full vectors.
+"""
 
-from sqlalchemy import text
+import weakref
+from functools import lru_cache
+from typing import Any, Dict, List, Sequence
+
+from pgvector.utils import from_db, from_db_binary, to_db_binary
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import get_settings
-from app.services.embedder import create_embedding
+from app.models.chunk import Chunk
+from app.services.embedder import create_query_embedding
+from app.services.vector_store import (
+    NumpyVectorStore,
+    SearchHit,
+    VectorStore,
+    coarse_expression,
+)
 
 settings = get_settings()
 
+# The nearest-neighbour scan filters on chunks.tenant_id alone, so it can use
+# the tenant's partial index; titles are joined for the top_k rows only. The
+# embeddings and token counts come back for prompt packing.
+RETRIEVE_SQL = """
+    SELECT c.text, c.page, d.title, c.distance, c.embedding, c.tokens
+    FROM (
+        SELECT text, page, document_id, embedding <=> $1 AS distance, embedding, tokens
+        FROM chunks
+        WHERE tenant_id = $2
+        ORDER BY distance
+        LIMIT $3
+    ) c
+    JOIN documents d ON c.document_id = d.id
+    ORDER BY c.distance
+"""
+
+# Coarse top $4 on the indexed expression, exact top $3
+RERANK_SQL = """
+    SELECT c.text, c.page, d.title, c.distance, c.embedding, c.tokens
+    FROM (
+        SELECT text, page, document_id, embedding <=> $1 AS distance, embedding, tokens
+        FROM (
+            SELECT text, page, document_id, embedding, tokens
+            FROM chunks
+            WHERE tenant_id = $2
+            ORDER BY {order}
+            LIMIT $4
+        ) candidates
+        ORDER BY distance
+        LIMIT $3
+    ) c
+    JOIN documents d ON c.document_id = d.id
+    ORDER BY c.distance
+"""
+
+# Prepared retrieval statements per asyncpg connection (dropped with the connection)
+_statements: "weakref.WeakKeyDictionary[Any, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+
+
+def retrieve_sql(quantization: str, prefix_dimensions: int = 0) -> str:
+    """
+    Retrieval query for a coarse search mode
+
+    Args:
+        quantization: 'none', 'halfvec' or 'binary'
+        prefix_dimensions: Leading dimensions searched before the rerank (0 = all)
+
+    Returns:
+        SQL taking (embedding, tenant_id, top_k) plus the candidate count if two-stage
+    """
+    if quantization == "none" and not prefix_dimensions:
+        return RETRIEVE_SQL
+    dimensions = Chunk.__table__.c.embedding.type.dim
+    column, operator, _ = coarse_expression(
+        "embedding", quantization, dimensions, prefix_dimensions
+    )
+    query, _, _ = coarse_expression("$1::vector", quantization, dimensions, prefix_dimensions)
+    return RERANK_SQL.format(order=f"{column} {operator} {query}")
+
+
+def encode_vector(value: Any) -> bytes:
+    """
+    Encode a vector parameter in pgvector's binary format
+
+    Also accepts the text literals SQLAlchemy's Vector type binds, so other
+    statements on a connection with the binary codec keep working.
+
+    Args:
+        value: Sequence of floats, numpy array or '[1,2,3]' literal
+
+    Returns:
+        Binary vector payload
+    """
+    if isinstance(value, str):
+        value = from_db(value)
+    return to_db_binary(value)
+
+
+async def _retrieve_statement(session: AsyncSession):
+    """Get the session's asyncpg connection and its prepared retrieval statement"""
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    driver_connection = raw_connection.driver_connection
+    sql = retrieve_sql(settings.VECTOR_QUANTIZATION, settings.VECTOR_SEARCH_PREFIX_DIMENSIONS)
+
+    statements = _statements.get(driver_connection)
+    if statements is None:
+        await driver_connection.set_type_codec(
+            "vector", encoder=encode_vector, decoder=from_db_binary, format="binary"
+        )
+        statements = _statements[driver_connection] = {}
+
+    statement = statements.get(sql)
+    if statement is None:
+        statement = statements[sql] = await driver_connection.prepare(sql)
+
+    return driver_connection, statement
+
+
+async def search_chunks(
+    session: AsyncSession, embedding: Sequence[float], tenant_id: int, top_k: int
+) -> List[SearchHit]:
+    """
+    Nearest chunks to an embedding within a tenant
+
+    Args:
+        session: Database session (PostgreSQL)
+        embedding: Query vector
+        tenant_id: Tenant ID for scoping
+        top_k: Number of chunks to return
+
+    Returns:
+        Hits ordered by increasing distance
+    """
+    connection, statement = await _retrieve_statement(session)
+    if settings.VECTOR_QUANTIZATION == "none" and not settings.VECTOR_SEARCH_PREFIX_DIMENSIONS:
+        args = (embedding, tenant_id, top_k)
+    else:
+        args = (embedding, tenant_id, top_k, top_k * max(settings.VECTOR_RERANK_FACTOR, 1))
+
+    # A generic plan cannot prove tenant_id = $2 matches a tenant's partial
+    # index, a custom one can; the setting is scoped to this query so other
+    # statements keep their cached plans. If the session already has a
+    # transaction open this block is only a savepoint and SET LOCAL would
+    # last until the outer commit, hence the RESET. A failed fetch rolls the
+    # block back, which undoes the SET LOCAL with it.
+    async with connection.transaction():
+        await connection.execute("SET LOCAL plan_cache_mode = force_custom_plan")
+        rows = await statement.fetch(*args)
+        await connection.execute("RESET plan_cache_mode")
+    return [SearchHit(*row) for row in rows]
+
+
+class PgVectorStore(VectorStore):
+    """Searches chunks.embedding with pgvector; chunks are indexed as they are stored"""
+
+    name = "pgvector"
+
+    async def search(self, session, embedding, tenant_id, top_k) -> List[SearchHit]:
+        return await search_chunks(session, embedding, tenant_id, top_k)
+
+
+@lru_cache()
+def _vector_store(
+    backend: str,
+    path: str,
+    block_rows: int,
+    quantization: str,
+    rerank_factor: int,
+    prefix_dimensions: int,
+) -> VectorStore:
+    if backend == "pgvector":
+        retrieve_sql(quantization, prefix_dimensions)  # reject modes pgvector cannot index
+        return PgVectorStore()
+    if backend == "numpy":
+        dimensions = Chunk.__table__.c.embedding.type.dim
+        return NumpyVectorStore(
+            path, dimensions, block_rows, quantization, rerank_factor, prefix_dimensions
+        )
+    raise ValueError(f"Unknown vector store: {backend}")
+
+
+def get_vector_store() -> VectorStore:
+    """
+    Get the configured vector store
+
+    VECTOR_STORE=auto uses the NumPy store on SQLite (no pgvector there) and
+    pgvector otherwise.
+
+    Returns:
+        Shared store instance
+    """
+    backend = settings.VECTOR_STORE
+    if backend == "auto":
+        backend = "numpy" if settings.DATABASE_URL.startswith("sqlite") else "pgvector"
+    return _vector_store(
+        backend,
+        settings.VECTOR_STORE_PATH,
+        settings.VECTOR_STORE_BLOCK_ROWS,
+        settings.VECTOR_QUANTIZATION,
+        settings.VECTOR_RERANK_FACTOR,
+        settings.VECTOR_SEARCH_PREFIX_DIMENSIONS,
+    )
+
 
 async def retrieve_relevant_chunks(
     query: str, tenant_id: int, session: AsyncSession, top_k: int = None
-) -> List[Tuple[str, int, str]]:
+) -> List[SearchHit]:
     """
     Retrieve most relevant chunks for a query using vector similarity
 
@@ -24,35 +227,12 @@ async def retrieve_relevant_chunks(
         top_k: Number of chunks to retrieve (from settings if not provided)
 
     Returns:
-        List of tuples (chunk_text, page_number, document_title)
+        Scored chunks (text, page, title, distance, embedding, tokens) by increasing distance
     """
     if top_k is None:
         top_k = settings.TOP_K
 
-    # Create embedding for query
-    query_embedding = await create_embedding(query)
-
-    # Convert embedding to PostgreSQL array format
-    embedding_str = "[" + ",".join(map(str, query_embedding)) + "]"
-
-    # Query for similar chunks with tenant scoping
-    query_sql = text("""
-        SELECT
-            c.text,
-            c.page,
-            d.title,
-            (c.embedding <=> :embedding::vector) AS distance
-        FROM chunks c
-        JOIN documents d ON c.document_id = d.id
-        WHERE d.tenant_id = :tenant_id
-        ORDER BY c.embedding <=> :embedding::vector
-        LIMIT :limit
-    """)
-
-    result = await session.execute(
-        query_sql, {"embedding": embedding_str, "tenant_id": tenant_id, "limit": top_k}
-    )
-
-    rows = result.fetchall()
+    # Create embedding for query (cached for repeated questions)
+    query_embedding = await create_query_embedding(query)
 
-    return [(row[0], row[1], row[2]) for row in rows]
+    return await get_vector_store().search(session, query_embedding, tenant_id, top_k)
@@ -0,0 +1,116 @@
+"""Shared tiktoken tokenizer
+
+Encoders are loaded once per process (warm_up loads them at startup, off the
+event loop) and resolved per model once. Counts of short strings that recur -
+the system prompt, repeated questions, chunk headers - are memoized. Large
+inputs are counted with tiktoken's batch encoder in a worker thread so a long
+prompt or answer never stalls the event loop.
+"""
+
+import asyncio
+from functools import lru_cache
+from typing import Iterable, List, Optional, Sequence
+
+import tiktoken
+
+from app.core.config import get_settings
+
+settings = get_settings()
+
+# cl100k_base is used by GPT-4, GPT-3.5-turbo and the embedding models; it is
+# also what chunks are cut and counted with
+DEFAULT_ENCODING = "cl100k_base"
+
+# Longer strings are counted directly rather than memoized
+_MEMO_MAX_CHARS = 4096
+
+
+@lru_cache()
+def get_encoding(name: str = DEFAULT_ENCODING) -> tiktoken.Encoding:
+    """Get an encoding by name (loaded once per process)"""
+    return tiktoken.get_encoding(name)
+
+
+@lru_cache()
+def encoding_for_model(model: Optional[str] = None) -> tiktoken.Encoding:
+    """
+    Get the encoding of a model
+
+    Args:
+        model: Model name; None or an unknown model uses DEFAULT_ENCODING
+
+    Returns:
+        Shared encoding
+    """
+    try:
+        name = tiktoken.encoding_name_for_model(model) if model else DEFAULT_ENCODING
+    except KeyError:
+        name = DEFAULT_ENCODING
+    return get_encoding(name)
+
+
+def warm_up(models: Iterable[Optional[str]] = ()) -> None:
+    """
+    Load the default encoding and those of models ahead of the first request
+
+    Args:
+        models: Model names whose encodings to load
+    """
+    encoding_for_model(None)
+    for model in models:
+        encoding_for_model(model)
+
+
+@lru_cache(maxsize=settings.TOKEN_COUNT_CACHE_SIZE)
+def _memo_count(text: str, model: Optional[str]) -> int:
+    return len(encoding_for_model(model).encode_ordinary(text))
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    Count tokens in text for a specific model
+
+    Args:
+        text: Text to count tokens for
+        model: Model name (DEFAULT_ENCODING if not provided)
+
+    Returns:
+        Number of tokens
+    """
+    if len(text) <= _MEMO_MAX_CHARS:
+        return _memo_count(text, model)
+    return len(encoding_for_model(model).encode_ordinary(text))
+
+
+def count_tokens_batch(texts: Sequence[str], model: Optional[str] = None) -> List[int]:
+    """
+    Count tokens of many texts with one batch encode
+
+    Args:
+        texts: Texts to count
+        model: Model name (DEFAULT_ENCODING if not provided)
+
+    Returns:
+        Token count per text, in order
+    """
+    encoding = encoding_for_model(model)
+    return [len(tokens) for tokens in encoding.encode_ordinary_batch(list(texts))]
+
+
+async def count_tokens_async(texts: Sequence[str], model: Optional[str] = None) -> List[int]:
+    """
+    Count tokens of texts without blocking the event loop on large inputs
+
+    Inputs totalling fewer than TOKENIZER_OFFLOAD_CHARS characters are
+    counted inline (and memoized); larger ones in a worker thread.
+
+    Args:
+        texts: Texts to count
+        model: Model name (DEFAULT_ENCODING if not provided)
+
+    Returns:
+        Token count per text, in order
+    """
+    if sum(len(text) for text in texts) < settings.TOKENIZER_OFFLOAD_CHARS:
+        return [count_tokens(text, model) for text in texts]
+    return await asyncio.to_thread(count_tokens_batch, texts, model)
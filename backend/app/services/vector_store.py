@@ -0,0 +1,568 @@
+"""Vector stores behind retrieval
+
+A VectorStore answers nearest-chunk queries for a tenant and is told about
+chunks as they are stored or deleted. The pgvector store (see
+app.services.retriever) searches chunks.embedding in PostgreSQL. The NumPy
+store here keeps each tenant's embeddings in a memory-mapped file next to the
+app, so SQLite and single-node deployments get retrieval without the
+pgvector extension.
+
+Both can search a coarse copy of the embeddings - quantized
+(VECTOR_QUANTIZATION) and/or truncated to a Matryoshka prefix
+(VECTOR_SEARCH_PREFIX_DIMENSIONS) - and rerank the best
+top_k * VECTOR_RERANK_FACTOR candidates on the full float32 vectors, which
+are always kept.
+"""
+
+import asyncio
+import fcntl
+import os
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.chunk import Chunk
+from app.models.document import Document
+
+
+class SearchHit(NamedTuple):
+    """A retrieved chunk with its cosine distance to the query"""
+
+    text: str
+    page: int
+    title: str
+    distance: float
+    embedding: Optional[np.ndarray] = None  # unit vector, for near-duplicate checks
+    tokens: int = 0  # prompt tokens with the source header (Chunk.tokens)
+
+
+QUANTIZATIONS = ("none", "halfvec", "int8", "binary")
+
+# Set bits per byte value, for Hamming distances where np.bitwise_count (NumPy 2) is missing
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+# Rows per coarse scoring step; the float32 copy of a quantized block stays in cache
+_COARSE_BLOCK_ROWS = 2048
+
+
+class VectorStore(ABC):
+    """
+    Interface of a chunk vector store
+
+    Subclasses must implement search. add and remove_document default to
+    no-ops for stores that read the chunks table directly.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def search(
+        self, session: AsyncSession, embedding: Sequence[float], tenant_id: int, top_k: int
+    ) -> List[SearchHit]:
+        """
+        Nearest chunks to an embedding within a tenant
+
+        Args:
+            session: Database session
+            embedding: Query vector
+            tenant_id: Tenant ID for scoping
+            top_k: Number of chunks to return
+
+        Returns:
+            Hits ordered by increasing distance
+        """
+
+    async def add(
+        self,
+        session: AsyncSession,
+        document_id: int,
+        tenant_id: int,
+        embeddings: Sequence[Sequence[float]],
+    ) -> None:
+        """
+        Index chunks that were just committed
+
+        Args:
+            session: Database session
+            document_id: Owning document ID
+            tenant_id: Owning tenant ID
+            embeddings: Embeddings of the document's most recently inserted chunks
+        """
+
+    async def remove_document(
+        self, session: AsyncSession, document_id: int, tenant_id: int
+    ) -> None:
+        """
+        Forget a document's chunks after they were deleted
+
+        Args:
+            session: Database session
+            document_id: Document ID
+            tenant_id: Owning tenant ID
+        """
+
+
+def _top_k(
+    score_block: Callable[[int, int], np.ndarray],
+    rows: int,
+    num_queries: int,
+    k: int,
+    block_rows: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Blockwise top k over rows; score_block(start, stop) returns (queries, rows) scores"""
+    best_idx = np.empty((num_queries, 0), dtype=np.int64)
+    best_scores = np.empty((num_queries, 0), dtype=np.float32)
+
+    for start in range(0, rows, block_rows):
+        stop = min(start + block_rows, rows)
+        block_idx = np.broadcast_to(np.arange(start, stop), (num_queries, stop - start))
+        scores = np.concatenate([best_scores, score_block(start, stop)], axis=1)
+        idx = np.concatenate([best_idx, block_idx], axis=1)
+        if scores.shape[1] > k:
+            keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            scores = np.take_along_axis(scores, keep, axis=1)
+            idx = np.take_along_axis(idx, keep, axis=1)
+        best_scores, best_idx = scores, idx
+
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    return np.take_along_axis(best_idx, order, axis=1), np.take_along_axis(
+        best_scores, order, axis=1
+    )
+
+
+def top_k_rows(
+    vectors: np.ndarray, queries: np.ndarray, k: int, block_rows: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Highest inner products of each query against the rows of vectors
+
+    Scores block_rows rows at a time with one matrix product per block and
+    keeps only each block's top k (argpartition), so memory stays bounded
+    however large the matrix is.
+
+    Args:
+        vectors: Row matrix (n, d); may be a memory map
+        queries: Query matrix (q, d)
+        k: Rows to keep per query
+        block_rows: Rows scored per matrix product
+
+    Returns:
+        (indices, scores), both (q, min(k, n)) and sorted by decreasing score
+    """
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+
+    def score_block(start: int, stop: int) -> np.ndarray:
+        return queries @ np.asarray(vectors[start:stop], dtype=np.float32).T
+
+    return _top_k(score_block, len(vectors), len(queries), k, block_rows)
+
+
+def coarse_expression(
+    value: str, quantization: str, dimensions: int, prefix_dimensions: int = 0
+) -> Tuple[str, str, str]:
+    """
+    SQL for the coarse form of a pgvector value
+
+    The vector index is built on the expression for the column and the
+    retrieval query orders by the same expression, so they must come from
+    here.
+
+    Args:
+        value: SQL vector value ('embedding' or the query parameter)
+        quantization: 'none', 'halfvec' or 'binary'
+        dimensions: Full vector length
+        prefix_dimensions: Leading dimensions kept (0 = all)
+
+    Returns:
+        (expression, distance operator, index operator class)
+    """
+    if prefix_dimensions:
+        value = f"subvector({value}, 1, {prefix_dimensions})::vector({prefix_dimensions})"
+        dimensions = prefix_dimensions
+    if quantization == "none":
+        return value, "<=>", "vector_cosine_ops"
+    if quantization == "halfvec":
+        return f"{value}::halfvec({dimensions})", "<=>", "halfvec_cosine_ops"
+    if quantization == "binary":
+        return f"binary_quantize({value})::bit({dimensions})", "<~>", "bit_hamming_ops"
+    raise ValueError(f"Quantization {quantization} is not available with pgvector")
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length (zero rows stay zero)"""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+def quantize(vectors: np.ndarray, quantization: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Compact representation of unit vectors for coarse search
+
+    Args:
+        vectors: float32 rows (n, d)
+        quantization: 'none' (float32 copy), 'halfvec' (float16), 'int8'
+            (per-row scaled) or 'binary' (sign bits)
+
+    Returns:
+        (codes, scales); scales is the per-row int8 scale, None otherwise
+    """
+    if quantization == "none":
+        return np.array(vectors, dtype=np.float32), None
+    if quantization == "halfvec":
+        return vectors.astype(np.float16), None
+    if quantization == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1.0
+        codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    if quantization == "binary":
+        return np.packbits(vectors > 0, axis=1), None
+    raise ValueError(f"Unknown quantization: {quantization}")
+
+
+def coarse_scores(
+    codes: np.ndarray, scales: Optional[np.ndarray], query: np.ndarray, quantization: str
+) -> np.ndarray:
+    """
+    Approximate similarity of a query to quantized rows (higher is closer)
+
+    Args:
+        codes: Quantized rows from quantize
+        scales: Per-row scales from quantize (int8 only)
+        query: float32 unit query vector
+        quantization: Quantization the codes were made with
+
+    Returns:
+        Score per row
+    """
+    if quantization == "binary":
+        # Negated Hamming distance between sign bits
+        xor = codes ^ np.packbits(query > 0)
+        if hasattr(np, "bitwise_count"):
+            if xor.shape[1] % 8 == 0:
+                xor = xor.view(np.uint64)
+            return -np.bitwise_count(xor).sum(axis=1, dtype=np.int32)
+        return -_POPCOUNT[xor].sum(axis=1, dtype=np.int32)
+    scores = codes.astype(np.float32, copy=False) @ query
+    return scores * scales if quantization == "int8" else scores
+
+
+class _TenantMatrix(NamedTuple):
+    """A mapped tenant file, its quantized vectors and the stat it was mapped at"""
+
+    stat_key: Tuple[int, int, int]
+    records: np.ndarray
+    codes: Optional[np.ndarray] = None
+    scales: Optional[np.ndarray] = None
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Per-tenant float32 matrices in memory-mapped files
+
+    Each tenant file is a flat array of (chunk_id, document_id, vector)
+    records. Appends are single writes and removals replace the file
+    atomically, so readers in other processes never lock; writers serialize
+    on a per-tenant lock file. Vectors are normalized on the way in, so an
+    inner product is the cosine similarity. A tenant whose file is missing
+    (e.g. chunks stored before the store was enabled) is rebuilt from the
+    chunks table on first use.
+
+    With quantization or a search prefix, only the coarse copy is held in
+    memory (built when a file is mapped, and extended for appended rows);
+    the float32 file is read just for the rerank candidates.
+    """
+
+    name = "numpy"
+
+    def __init__(
+        self,
+        path: str,
+        dimensions: int,
+        block_rows: int,
+        quantization: str = "none",
+        rerank_factor: int = 4,
+        prefix_dimensions: int = 0,
+    ):
+        """
+        Args:
+            path: Directory holding the tenant files
+            dimensions: Embedding length
+            block_rows: Rows scored per matrix product
+            quantization: 'none', 'halfvec', 'int8' or 'binary'
+            rerank_factor: Coarse candidates per requested result
+            prefix_dimensions: Leading dimensions searched before the rerank (0 = all)
+        """
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        if not 0 <= prefix_dimensions < dimensions:
+            prefix_dimensions = 0
+        self.path = path
+        self.dimensions = dimensions
+        self.block_rows = block_rows
+        self.quantization = quantization
+        self.rerank_factor = max(rerank_factor, 1)
+        self.prefix_dimensions = prefix_dimensions
+        self.two_stage = quantization != "none" or prefix_dimensions > 0
+        self.dtype = np.dtype(
+            [("chunk_id", "<i8"), ("document_id", "<i8"), ("vector", "<f4", (dimensions,))]
+        )
+        self._matrices: Dict[int, _TenantMatrix] = {}
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, tenant_id: int) -> str:
+        return os.path.join(self.path, f"tenant_{int(tenant_id)}.vec")
+
+    @contextmanager
+    def _write_lock(self, tenant_id: int) -> Iterator[None]:
+        with open(os.path.join(self.path, f"tenant_{int(tenant_id)}.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _records(self, chunk_ids, document_ids, embeddings) -> np.ndarray:
+        records = np.empty(len(chunk_ids), dtype=self.dtype)
+        records["chunk_id"] = chunk_ids
+        records["document_id"] = document_ids
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(chunk_ids), self.dimensions)
+        records["vector"] = normalize_rows(vectors)
+        return records
+
+    def _coarse(self, vectors: np.ndarray) -> np.ndarray:
+        """Prefix of unit vectors, renormalized (the vectors themselves without a prefix)"""
+        if not self.prefix_dimensions:
+            return vectors
+        return normalize_rows(np.asarray(vectors[..., : self.prefix_dimensions]))
+
+    def _replace(self, tenant_id: int, records: np.ndarray) -> None:
+        path = self._file(tenant_id)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        records.tofile(tmp)
+        os.replace(tmp, path)
+
+    def _append(self, tenant_id: int, records: np.ndarray) -> bool:
+        """Append records; False if the tenant file does not exist yet"""
+        with self._write_lock(tenant_id):
+            if not os.path.exists(self._file(tenant_id)):
+                return False
+            with open(self._file(tenant_id), "ab") as f:
+                f.write(records.tobytes())
+        return True
+
+    def _remove(self, tenant_id: int, document_id: int) -> None:
+        with self._write_lock(tenant_id):
+            if not os.path.exists(self._file(tenant_id)):
+                return
+            records = np.fromfile(self._file(tenant_id), dtype=self.dtype)
+            keep = records["document_id"] != document_id
+            if not keep.all():
+                self._replace(tenant_id, records[keep])
+
+    def _quantize(self, records: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Coarse copy of records' vectors, a block at a time (bounded float32 copies)"""
+        parts = [
+            quantize(
+                self._coarse(np.asarray(records["vector"][start : start + self.block_rows])),
+                self.quantization,
+            )
+            for start in range(0, len(records), self.block_rows)
+        ]
+        if not parts:
+            width = self.prefix_dimensions or self.dimensions
+            parts = [quantize(np.empty((0, width), np.float32), self.quantization)]
+        codes = np.concatenate([codes for codes, _ in parts])
+        scales = None if parts[0][1] is None else np.concatenate([sc for _, sc in parts])
+        return codes, scales
+
+    def _load(self, tenant_id: int) -> Optional[_TenantMatrix]:
+        """Map the tenant file (remapped only when it changed); None if missing"""
+        try:
+            stat = os.stat(self._file(tenant_id))
+        except FileNotFoundError:
+            return None
+
+        stat_key = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        cached = self._matrices.get(tenant_id)
+        if cached is not None and cached.stat_key == stat_key:
+            return cached
+
+        rows = stat.st_size // self.dtype.itemsize
+        if rows == 0:
+            records = np.empty(0, dtype=self.dtype)
+        else:
+            records = np.memmap(self._file(tenant_id), dtype=self.dtype, mode="r", shape=(rows,))
+
+        codes = scales = None
+        if self.two_stage:
+            appended = (
+                cached is not None
+                and cached.stat_key[0] == stat.st_ino
+                and len(cached.records) <= rows
+            )
+            # Same file grown by appends: quantize only the new rows
+            start = len(cached.records) if appended else 0
+            codes, scales = self._quantize(records[start:])
+            if appended:
+                codes = np.concatenate([cached.codes, codes])
+                if scales is not None:
+                    scales = np.concatenate([cached.scales, scales])
+
+        matrix = _TenantMatrix(stat_key, records, codes, scales)
+        self._matrices[tenant_id] = matrix
+        return matrix
+
+    def replace_tenant(
+        self,
+        tenant_id: int,
+        chunk_ids: Sequence[int],
+        document_ids: Sequence[int],
+        embeddings: Sequence[Sequence[float]],
+    ) -> None:
+        """
+        Overwrite a tenant file
+
+        Args:
+            tenant_id: Tenant ID
+            chunk_ids: Chunk ID per embedding
+            document_ids: Document ID per embedding
+            embeddings: Vectors, in the same order
+        """
+        records = self._records(
+            chunk_ids,
+            document_ids,
+            embeddings if len(embeddings) else np.empty((0, self.dimensions)),
+        )
+        with self._write_lock(tenant_id):
+            self._replace(tenant_id, records)
+
+    def _nearest_rows(
+        self, tenant_id: int, embedding: Sequence[float], top_k: int
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Nearest (records, row indices, scores) in a tenant file; no rows if missing"""
+        matrix = self._load(tenant_id)
+        if matrix is None or not len(matrix.records) or top_k <= 0:
+            empty = np.empty(0, dtype=np.int64)
+            return np.empty(0, dtype=self.dtype), empty, empty.astype(np.float32)
+
+        query = normalize_rows(np.asarray(embedding, dtype=np.float32))
+        records = matrix.records
+
+        if not self.two_stage:
+            idx, scores = top_k_rows(records["vector"], query, top_k, self.block_rows)
+            idx, scores = idx[0], scores[0]
+        else:
+            coarse_query = self._coarse(query)
+
+            def score_block(start: int, stop: int) -> np.ndarray:
+                scales = None if matrix.scales is None else matrix.scales[start:stop]
+                codes = matrix.codes[start:stop]
+                return coarse_scores(codes, scales, coarse_query, self.quantization)[None, :]
+
+            candidates, _ = _top_k(
+                score_block, len(records), 1, top_k * self.rerank_factor, _COARSE_BLOCK_ROWS
+            )
+            # Rerank on full precision, reading candidate rows in file order
+            candidates = np.sort(candidates[0])
+            exact = np.asarray(records["vector"][candidates], dtype=np.float32) @ query
+            order = np.argsort(-exact, kind="stable")[:top_k]
+            idx, scores = candidates[order], exact[order]
+
+        return records, idx, scores
+
+    def nearest(
+        self, tenant_id: int, embedding: Sequence[float], top_k: int
+    ) -> List[Tuple[int, float]]:
+        """
+        Nearest chunk IDs in a tenant file
+
+        Args:
+            tenant_id: Tenant ID
+            embedding: Query vector
+            top_k: Number of chunks to return
+
+        Returns:
+            (chunk_id, cosine distance) pairs by increasing distance
+        """
+        records, idx, scores = self._nearest_rows(tenant_id, embedding, top_k)
+        chunk_ids = records["chunk_id"][idx].tolist()
+        return [
+            (chunk_id, float(1.0 - score)) for chunk_id, score in zip(chunk_ids, scores.tolist())
+        ]
+
+    async def rebuild(self, session: AsyncSession, tenant_id: int) -> int:
+        """
+        Rewrite a tenant file from the chunks table
+
+        Args:
+            session: Database session
+            tenant_id: Tenant ID
+
+        Returns:
+            Number of chunks indexed
+        """
+        result = await session.execute(
+            select(Chunk.id, Chunk.document_id, Chunk.embedding)
+            .where(Chunk.tenant_id == tenant_id, Chunk.embedding.is_not(None))
+            .order_by(Chunk.id)
+        )
+        rows = result.all()
+        await asyncio.to_thread(
+            self.replace_tenant,
+            tenant_id,
+            [row[0] for row in rows],
+            [row[1] for row in rows],
+            [row[2] for row in rows],
+        )
+        return len(rows)
+
+    async def add(self, session, document_id, tenant_id, embeddings) -> None:
+        if not embeddings:
+            return
+
+        # Chunk ids increase in insert order; one document is stored by one worker
+        result = await session.execute(
+            select(Chunk.id)
+            .where(Chunk.document_id == document_id)
+            .order_by(Chunk.id.desc())
+            .limit(len(embeddings))
+        )
+        chunk_ids = result.scalars().all()[::-1]
+        records = self._records(chunk_ids, [document_id] * len(chunk_ids), embeddings)
+
+        if not await asyncio.to_thread(self._append, tenant_id, records):
+            await self.rebuild(session, tenant_id)
+
+    async def remove_document(self, session, document_id, tenant_id) -> None:
+        await asyncio.to_thread(self._remove, tenant_id, document_id)
+
+    async def search(self, session, embedding, tenant_id, top_k) -> List[SearchHit]:
+        if not os.path.exists(self._file(tenant_id)):
+            await self.rebuild(session, tenant_id)
+
+        records, idx, scores = await asyncio.to_thread(
+            self._nearest_rows, tenant_id, embedding, top_k
+        )
+        if not len(idx):
+            return []
+        chunk_ids = records["chunk_id"][idx].tolist()
+        vectors = np.array(records["vector"][idx])
+
+        result = await session.execute(
+            select(Chunk.id, Chunk.text, Chunk.page, Document.title, Chunk.tokens)
+            .join(Document, Chunk.document_id == Document.id)
+            .where(Chunk.id.in_(chunk_ids))
+        )
+        rows = {row[0]: row[1:] for row in result.all()}
+
+        # Chunks deleted since they were indexed simply drop out
+        return [
+            SearchHit(*rows[chunk_id][:3], float(1.0 - score), vector, rows[chunk_id][3])
+            for chunk_id, score, vector in zip(chunk_ids, scores.tolist(), vectors)
+            if chunk_id in rows
+        ]
@@ -0,0 +1,183 @@
+"""Ingestion worker entry point
+
+Runs PDF ingestion outside the API processes so chat latency does not
+depend on how many documents are being ingested.
+
+Usage:
+    python -m app.workers.ingest --processes 4
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import socket
+
+from app.core.config import get_settings
+from app.db.session import async_session_maker
+from app.db.vector_index import ensure_index
+from app.services.ingest_queue import claim_next_job, complete_job, fail_job, heartbeat_job
+from app.services.ingestion import process_pdf_file
+from app.services.pdf_ingest import shutdown_pdf_executor
+from app.services.retriever import get_vector_store
+from app.services.tokenizer import warm_up
+
+settings = get_settings()
+
+
+async def _heartbeat(job_id: int) -> None:
+    """Keep the job lease alive while it is being processed"""
+    interval = max(settings.INGEST_JOB_LEASE_SECONDS / 3, 1)
+    while True:
+        await asyncio.sleep(interval)
+        async with async_session_maker() as session:
+            await heartbeat_job(session, job_id)
+
+
+async def run_once(worker_id: str) -> bool:
+    """
+    Claim and process a single job
+
+    Args:
+        worker_id: Identifier recorded on claimed jobs
+
+    Returns:
+        True if a job was processed, False if the queue was empty
+    """
+    async with async_session_maker() as session:
+        job = await claim_next_job(session, worker_id)
+        if job is None:
+            return False
+
+        # A job reclaimed after its worker died counts that attempt too
+        if job.attempts > settings.INGEST_MAX_ATTEMPTS:
+            await fail_job(session, job, job.error or "Worker lost while processing")
+            return True
+
+        heartbeat = asyncio.create_task(_heartbeat(job.id))
+        try:
+            stats = await process_pdf_file(session, job.file_path, job.document_id, job.num_pages)
+        except Exception as e:
+            await session.rollback()
+            print(f"[INGEST] Job {job.id} attempt {job.attempts} failed: {e}")
+            await fail_job(session, job, str(e))
+        else:
+            await complete_job(session, job)
+            print(f"[INGEST] Job {job.id} document {job.document_id} done: {json.dumps(stats)}")
+        finally:
+            heartbeat.cancel()
+
+        return True
+
+
+async def run_worker(worker_id: str, stop: asyncio.Event) -> None:
+    """Process jobs until stop is set, polling when the queue is empty"""
+    print(f"[INGEST] Worker {worker_id} started")
+    while not stop.is_set():
+        try:
+            processed = await run_once(worker_id)
+        except Exception as e:
+            print(f"[INGEST] Worker {worker_id} error: {e}")
+            processed = False
+
+        if not processed:
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=settings.INGEST_POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    shutdown_pdf_executor()
+    print(f"[INGEST] Worker {worker_id} stopped")
+
+
+async def run_index_maintenance(stop: asyncio.Event) -> None:
+    """Rebuild the vector index when it falls out of date, until stop is set"""
+    while not stop.is_set():
+        try:
+            result = await ensure_index()
+            if result["action"] != "none":
+                print(f"[INDEX] {result['action']}: {result['rebuild_reason']}")
+            for tenant in result["tenants"]:
+                if tenant["action"] != "none":
+                    print(
+                        f"[INDEX] Tenant {tenant['tenant_id']} {tenant['action']}: "
+                        f"{tenant['rebuild_reason']}"
+                    )
+        except Exception as e:
+            print(f"[INDEX] Maintenance check failed: {e}")
+
+        try:
+            await asyncio.wait_for(
+                stop.wait(), timeout=settings.VECTOR_INDEX_CHECK_INTERVAL_SECONDS
+            )
+        except asyncio.TimeoutError:
+            pass
+
+
+def _worker_process(index: int) -> None:
+    """Entry point of one worker process"""
+
+    async def main():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+
+        # One process per host checks the index (builds also take an advisory lock)
+        maintenance = None
+        if (
+            index == 0
+            and settings.VECTOR_INDEX_CHECK_INTERVAL_SECONDS > 0
+            and get_vector_store().name == "pgvector"
+        ):
+            maintenance = asyncio.create_task(run_index_maintenance(stop))
+
+        try:
+            await asyncio.to_thread(warm_up)  # chunking vocabulary, off the event loop
+        except Exception as e:
+            print(f"[INGEST] Tokenizer warm-up failed: {e}")
+
+        await run_worker(f"{socket.gethostname()}:{os.getpid()}:{index}", stop)
+        if maintenance is not None:
+            await maintenance
+
+    asyncio.run(main())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="DocuChat ingestion worker")
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=settings.INGEST_WORKER_PROCESSES,
+        help="Number of worker processes",
+    )
+    args = parser.parse_args()
+
+    # Share the CPUs between workers' PDF extraction pools unless configured
+    if not settings.PDF_EXTRACT_WORKERS:
+        per_worker = max((os.cpu_count() or 1) // args.processes, 1)
+        os.environ["PDF_EXTRACT_WORKERS"] = str(per_worker)
+
+    if args.processes == 1:
+        _worker_process(0)
+        return
+
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_worker_process, args=(i,)) for i in range(args.processes)]
+    for process in processes:
+        process.start()
+
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
 """WebSocket chat handler with RAG and streaming"""
 
+import asyncio
 import json
-from typing import Optional
+import time
+import uuid
+from typing import Dict, List, Optional, Set, Tuple
 
 from fastapi import Header, Query, WebSocket, WebSocketDisconnect, status
 from openai import AsyncOpenAI
@@ -10,13 +13,19 @@ from app.core.config import get_settings
 from app.core.security import verify_token
 from app.db.session import async_session_maker
 from app.models.chat import ChatSession, Message
-from app.services.chunker import count_tokens
+from app.services.embedder import create_query_embedding
 from app.services.rag import build_rag_prompt
-from app.services.retriever import retrieve_relevant_chunks
+from app.services.retriever import get_vector_store
+from app.services.tokenizer import count_tokens, count_tokens_async
 from app.services.tokens_meter import record_token_usage
+from app.services.vector_store import SearchHit
+from app.ws.stream import Outbox, StreamWriter, encode_message, negotiate_encoding
 
 settings = get_settings()
 
+# Write-behind persistence of finished turns (awaited at shutdown)
+_pending_writes: Set[asyncio.Task] = set()
+
 # Initialize OpenAI client
 openai_client = AsyncOpenAI(
     api_key=settings.OPENAI_API_KEY,
@@ -68,107 +77,317 @@ async def authenticate_websocket(
         return None
 
 
-async def handle_chat_message(
-    websocket: WebSocket, message: str, user_info: dict, session_id: Optional[int] = None
-):
-    """
-    Handle a chat message with RAG and streaming
+class TurnProgress:
+    """What a turn's upstream stream has done so far (read after a cancel)"""
 
-    Args:
-        websocket: WebSocket connection
-        message: User message
-        user_info: User authentication info
-        session_id: Optional existing session ID
-    """
-    async with async_session_maker() as session:
-        try:
-            # Create or get chat session
-            if not session_id:
-                chat_session = ChatSession(
-                    tenant_id=user_info["tenant_id"], user_id=user_info["user_id"]
-                )
-                session.add(chat_session)
-                await session.commit()
-                await session.refresh(chat_session)
-                session_id = chat_session.id
+    def __init__(self):
+        self.parts: List[str] = []  # deltas received
+        self.issued = False  # the upstream request was accepted and is streaming
+        self.tokens_in: Optional[int] = None  # reported by the provider
+        self.tokens_out = 0  # counted as deltas arrive, or reported
 
-            # Send start message
-            await websocket.send_json({"type": "start", "session_id": session_id})
 
-            # Retrieve relevant chunks
-            chunks = await retrieve_relevant_chunks(message, user_info["tenant_id"], session)
-
-            # Build RAG prompt
-            system_prompt, user_prompt = build_rag_prompt(message, chunks)
+async def stream_answer(
+    writer: StreamWriter,
+    system_prompt: str,
+    user_prompt: str,
+    progress: Optional[TurnProgress] = None,
+) -> Tuple[str, int, int]:
+    """
+    Stream the model's answer to the client
 
-            # Validate model
-            if settings.OPENAI_MODEL not in settings.ALLOWED_MODELS:
-                raise ValueError(f"Model {settings.OPENAI_MODEL} not allowed")
+    Deltas are collected in a list and joined once. Token usage comes from
+    the provider's last chunk (stream_options.include_usage). Until it
+    arrives, the prompt is counted in a task while the answer streams and the
+    answer delta by delta, so nothing is counted after the stream even when
+    OPENAI_STREAM_USAGE is off or the provider ignores the option; reported
+    usage replaces both counts.
 
-            # Stream response from OpenAI
-            response_text = ""
-            tokens_in = count_tokens(system_prompt + user_prompt, settings.OPENAI_MODEL)
-            tokens_out = 0
+    Cancelling the calling task closes the upstream response, which stops
+    generation (and billing) at once.
 
-            stream = await openai_client.chat.completions.create(
-                model=settings.OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-                stream=True,
-            )
+    Args:
+        writer: Stream writer of the turn
+        system_prompt: System prompt
+        user_prompt: User prompt with the retrieved context
+        progress: Progress record to update (what was streamed survives a cancel)
 
-            async for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    token = chunk.choices[0].delta.content
-                    response_text += token
+    Returns:
+        Tuple of (response_text, tokens_in, tokens_out)
+    """
+    model = settings.OPENAI_MODEL
+    request_usage = settings.OPENAI_STREAM_USAGE
+    prompt_count = asyncio.create_task(count_tokens_async([system_prompt, user_prompt], model))
 
-                    # Send delta to client
-                    await websocket.send_json({"type": "delta", "token": token})
+    if progress is None:
+        progress = TurnProgress()
+    parts = progress.parts
+    usage = None
+    stream = None
 
-            # Count output tokens
-            tokens_out = count_tokens(response_text, settings.OPENAI_MODEL)
+    try:
+        stream = await openai_client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            stream=True,
+            **({"stream_options": {"include_usage": True}} if request_usage else {}),
+        )
+        progress.issued = True
+
+        async for chunk in stream:
+            # The usage chunk comes last and has no choices
+            if chunk.usage is not None:
+                usage = chunk.usage
+                progress.tokens_in = usage.prompt_tokens
+                progress.tokens_out = usage.completion_tokens
+            if not chunk.choices:
+                continue
+            token = chunk.choices[0].delta.content
+            if token:
+                parts.append(token)
+                if usage is None:
+                    progress.tokens_out += count_tokens(token, model)
+
+                # Coalesced with neighbouring deltas (the first one goes out at once)
+                await writer.delta(token)
+
+        response_text = "".join(parts)
+        if usage is not None:
+            return response_text, usage.prompt_tokens, usage.completion_tokens
+        return response_text, sum(await prompt_count), progress.tokens_out
+    finally:
+        if not prompt_count.done():
+            prompt_count.cancel()
+        elif not prompt_count.cancelled():
+            prompt_count.exception()  # discarded; retrieved so it is not logged
+        if stream is not None:
+            await stream.close()
+
+
+async def persist_turn(
+    session_id: int,
+    user_info: dict,
+    message: str,
+    response_text: str,
+    tokens_in: int,
+    tokens_out: int,
+) -> None:
+    """
+    Store a finished turn's messages and token usage in one transaction
 
-            # Save messages to database
-            user_message = Message(
+    Args:
+        session_id: Chat session ID
+        user_info: User authentication info
+        message: User message
+        response_text: Assistant answer
+        tokens_in: Prompt tokens
+        tokens_out: Answer tokens
+    """
+    async with async_session_maker() as session:
+        session.add(
+            Message(
                 session_id=session_id,
                 role="user",
                 content=message,
                 tokens_in=tokens_in,
                 tokens_out=0,
             )
-
-            assistant_message = Message(
+        )
+        session.add(
+            Message(
                 session_id=session_id,
                 role="assistant",
                 content=response_text,
                 tokens_in=0,
                 tokens_out=tokens_out,
             )
+        )
+        # Commits the messages together with the usage row
+        await record_token_usage(
+            session, user_info["tenant_id"], user_info["user_id"], tokens_in, tokens_out
+        )
 
-            session.add(user_message)
-            session.add(assistant_message)
-            await session.commit()
 
-            # Record usage
-            await record_token_usage(
-                session, user_info["tenant_id"], user_info["user_id"], tokens_in, tokens_out
-            )
+def _write_behind(coro) -> None:
+    """Run a persistence coroutine in the background, tracked for shutdown"""
+    task = asyncio.create_task(coro)
+    _pending_writes.add(task)
+    task.add_done_callback(_write_done)
+
+
+def _write_done(task: asyncio.Task) -> None:
+    _pending_writes.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"[CHAT] Failed to persist turn: {task.exception()}")
+
+
+async def drain_pending_writes() -> None:
+    """Wait for write-behind persistence still running (at shutdown)"""
+    if _pending_writes:
+        await asyncio.gather(*_pending_writes, return_exceptions=True)
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+async def handle_chat_message(
+    websocket: WebSocket,
+    message: str,
+    user_info: dict,
+    session_id: Optional[int] = None,
+    encoding: str = "json",
+    request_id: Optional[str] = None,
+    outbox: Optional[Outbox] = None,
+):
+    """
+    Handle a chat message with RAG and streaming
+
+    A new chat session is created while the query is embedded and searched,
+    and the turn is persisted after the end message is sent, so neither
+    delays the answer. The end message carries per-stage timings (ms).
+
+    Cancelling the task running this (a client cancel or disconnect) aborts
+    the upstream stream and sends a ``cancelled`` message if the client is
+    still there. Once the provider has accepted the request, the tokens
+    already consumed are recorded with the partial answer.
+
+    If the client fell so far behind that deltas were dropped (see
+    app.ws.stream), the end or cancelled message carries the answer in
+    ``text``.
+
+    Args:
+        websocket: WebSocket connection
+        message: User message
+        user_info: User authentication info
+        session_id: Optional existing session ID
+        encoding: Negotiated frame encoding (see app.ws.stream)
+        request_id: Client's request id, echoed on every message of the turn
+        outbox: Outbox shared by the connection's turns
+    """
+    writer = StreamWriter(websocket, encoding, request_id=request_id, outbox=outbox)
+    started = time.perf_counter()
+    timings: Dict[str, float] = {}
+    prompts: Optional[Tuple[str, str]] = None
+    progress = TurnProgress()
+    persisted = False
+
+    async def open_session() -> None:
+        nonlocal session_id
+        if not session_id:
+            t0 = time.perf_counter()
+            async with async_session_maker() as session:
+                chat_session = ChatSession(
+                    tenant_id=user_info["tenant_id"], user_id=user_info["user_id"]
+                )
+                session.add(chat_session)
+                await session.commit()
+                session_id = chat_session.id
+            timings["session_ms"] = _elapsed_ms(t0)
 
-            # Send end message with usage
-            await websocket.send_json(
-                {"type": "end", "usage": {"tokens_in": tokens_in, "tokens_out": tokens_out}}
+        # Send start message
+        await writer.send({"type": "start", "session_id": session_id, "encoding": encoding})
+
+    async def retrieve() -> List[SearchHit]:
+        t0 = time.perf_counter()
+        # Create embedding for query (cached for repeated questions)
+        query_embedding = await create_query_embedding(message)
+        timings["embed_ms"] = _elapsed_ms(t0)
+
+        t0 = time.perf_counter()
+        async with async_session_maker() as session:
+            hits = await get_vector_store().search(
+                session, query_embedding, user_info["tenant_id"], settings.TOP_K
             )
+        timings["search_ms"] = _elapsed_ms(t0)
+        return hits
 
-        except Exception as e:
-            # Send error message
-            await websocket.send_json({"type": "error", "message": str(e)})
+    try:
+        # Validate model
+        if settings.OPENAI_MODEL not in settings.ALLOWED_MODELS:
+            raise ValueError(f"Model {settings.OPENAI_MODEL} not allowed")
+
+        # Create the session and retrieve relevant chunks concurrently
+        try:
+            async with asyncio.TaskGroup() as group:
+                group.create_task(open_session())
+                retrieval = group.create_task(retrieve())
+        except ExceptionGroup as e:
+            raise e.exceptions[0] from e
+
+        # Build RAG prompt
+        t0 = time.perf_counter()
+        prompts = system_prompt, user_prompt = build_rag_prompt(message, retrieval.result())
+        timings["prompt_ms"] = _elapsed_ms(t0)
+
+        # Stream response from OpenAI
+        t0 = time.perf_counter()
+        response_text, tokens_in, tokens_out = await stream_answer(
+            writer, system_prompt, user_prompt, progress
+        )
+        timings["stream_ms"] = _elapsed_ms(t0)
+        if writer.first_delta_at is not None:
+            timings["first_token_ms"] = round((writer.first_delta_at - started) * 1000, 1)
+
+        # Save messages and usage without holding up the end message
+        _write_behind(
+            persist_turn(session_id, user_info, message, response_text, tokens_in, tokens_out)
+        )
+        persisted = True
+
+        # Send end message with usage
+        timings["total_ms"] = _elapsed_ms(started)
+        end = {
+            "type": "end",
+            "usage": {"tokens_in": tokens_in, "tokens_out": tokens_out},
+            "timings": timings,
+        }
+        if writer.dropped:
+            end["text"] = response_text
+        await writer.send(end)
+
+    except asyncio.CancelledError:
+        if not persisted:
+            response_text = "".join(progress.parts)
+            tokens_in = tokens_out = 0
+            if progress.issued and session_id:
+                # The provider took the prompt: record it and the part of the
+                # answer streamed. Nothing here awaits before the write is
+                # scheduled, so a second cancel (e.g. a disconnect right after
+                # a cancel) cannot skip it.
+                tokens_in = progress.tokens_in
+                if tokens_in is None:
+                    model = settings.OPENAI_MODEL
+                    tokens_in = sum(count_tokens(prompt, model) for prompt in prompts)
+                tokens_out = progress.tokens_out
+                _write_behind(
+                    persist_turn(
+                        session_id, user_info, message, response_text, tokens_in, tokens_out
+                    )
+                )
+            cancelled = {
+                "type": "cancelled",
+                "usage": {"tokens_in": tokens_in, "tokens_out": tokens_out},
+            }
+            if writer.dropped:
+                cancelled["text"] = response_text
+            # Dropped by the outbox if the connection is gone
+            await writer.send(cancelled)
+        raise
+    except Exception as e:
+        # Send error message
+        await writer.send({"type": "error", "message": str(e)})
+    finally:
+        await writer.close()
 
 
 async def websocket_chat_handler(
     websocket: WebSocket,
     token: Optional[str] = Query(None),
+    encoding: Optional[str] = Query(None),
     x_tenant_id: Optional[str] = Header(None, alias=settings.TENANT_HEADER),
 ):
     """
@@ -177,37 +396,95 @@ async def websocket_chat_handler(
     Expected message format from client:
     {
         "message": "user question",
-        "session_id": 123  // optional
+        "session_id": 123,  // optional
+        "request_id": "q1"  // optional, echoed on every message of the turn
     }
+    or, to stop a turn in flight:
+    {
+        "type": "cancel",
+        "request_id": "q1"
+    }
+
+    Up to WS_MAX_INFLIGHT_TURNS turns stream concurrently on a connection;
+    closing the connection cancels them. Frames go through a bounded
+    per-connection Outbox, which also handles slow clients. The ``encoding``
+    query parameter selects the frame encoding (json, binary or msgpack).
+    See app.ws.stream for both.
     """
     await websocket.accept()
+    encoding = negotiate_encoding(encoding)
 
     # Authenticate
     user_info = await authenticate_websocket(websocket, token, x_tenant_id)
     if not user_info:
         return
 
+    turns: Dict[str, asyncio.Task] = {}
+
+    def cancel_turns() -> None:
+        for turn in list(turns.values()):
+            turn.cancel()
+
+    outbox = Outbox(websocket, on_disconnect=cancel_turns)
+
+    def send_error(text: str, request_id: Optional[str] = None) -> None:
+        error = {"type": "error", "message": text}
+        if request_id is not None:
+            error["request_id"] = request_id
+        outbox.put(encode_message(error, encoding))
+
     try:
         while True:
             # Receive message from client
             data = await websocket.receive_text()
+            if outbox.closed:
+                break  # disconnected as a slow consumer
 
             try:
                 message_data = json.loads(data)
-                user_message = message_data.get("message")
-                session_id = message_data.get("session_id")
-
-                if not user_message:
-                    await websocket.send_json(
-                        {"type": "error", "message": "Missing 'message' field"}
-                    )
-                    continue
-
-                # Handle message
-                await handle_chat_message(websocket, user_message, user_info, session_id)
-
             except json.JSONDecodeError:
-                await websocket.send_json({"type": "error", "message": "Invalid JSON"})
+                send_error("Invalid JSON")
+                continue
+
+            request_id = message_data.get("request_id")
+            request_id = None if request_id is None else str(request_id)
+
+            if message_data.get("type") == "cancel":
+                turn = turns.get(request_id)
+                if turn is None:
+                    send_error("Unknown request_id", request_id)
+                else:
+                    turn.cancel()
+                continue
+
+            user_message = message_data.get("message")
+            session_id = message_data.get("session_id")
+
+            if not user_message:
+                send_error("Missing 'message' field", request_id)
+                continue
+            if len(turns) >= settings.WS_MAX_INFLIGHT_TURNS:
+                send_error("Too many requests in flight", request_id)
+                continue
+            if request_id is None:
+                request_id = uuid.uuid4().hex
+            elif request_id in turns:
+                send_error("Duplicate request_id", request_id)
+                continue
+
+            # Handle message while the next frame is read
+            turn = asyncio.create_task(
+                handle_chat_message(
+                    websocket, user_message, user_info, session_id, encoding, request_id, outbox
+                )
+            )
+            turns[request_id] = turn
+            turn.add_done_callback(lambda _, request_id=request_id: turns.pop(request_id, None))
 
     except WebSocketDisconnect:
         pass
+    finally:
+        # Nobody reads these answers any more; stop paying for them
+        cancel_turns()
+        await asyncio.gather(*turns.values(), return_exceptions=True)
+        await outbox.close()
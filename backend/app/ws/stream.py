@@ -0,0 +1,411 @@
+"""Outbound framing for chat streams
+
+Upstream deltas arrive one token at a time; sending each as its own JSON
+frame makes per-frame encoding and writes dominate CPU with many concurrent
+streams. StreamWriter coalesces deltas over a short time/size window
+(WS_DELTA_FLUSH_MS / WS_DELTA_FLUSH_BYTES) and sends the first delta of a
+turn and everything before a control message immediately, so time to first
+token does not change.
+
+Clients pick the frame encoding with the ``encoding`` query parameter:
+
+- ``json`` (default): every message is a JSON text frame
+- ``binary``: deltas are binary frames of the UTF-8 request id, a NUL byte
+  and the UTF-8 text; other messages JSON text
+- ``msgpack``: every message is a MessagePack binary frame (needs the
+  optional ``msgpack`` package; falls back to ``json`` without it)
+
+Every message of a turn carries its ``request_id``, so several turns can
+stream on one connection. Writers do not send themselves: frames go to the
+connection's Outbox, whose single sender task writes them in order. The
+outbox is bounded - when a client reads slowly (WS_OUTBOUND_BUFFER_BYTES
+queued, or a send blocked for WS_SEND_TIMEOUT_SECONDS), WS_SLOW_CONSUMER_POLICY
+decides what happens to further deltas:
+
+- ``coalesce``: held back and sent as one frame once the client catches up;
+  beyond WS_OUTBOUND_BUFFER_BYTES held, as ``summary``
+- ``summary``: dropped for the rest of the turn; the ``end`` (or
+  ``cancelled``) message then carries the whole answer in ``text``
+- ``disconnect``: the connection is closed (1013) and its turns cancelled
+
+Whatever the policy, a client is disconnected once one send has been
+blocked for WS_SEND_STALL_LIMIT_SECONDS or twice WS_OUTBOUND_BUFFER_BYTES
+are queued (control messages are always queued), so a client that stops
+reading cannot keep its turns and their upstream streams alive. A
+connection holds at most about two buffers queued plus one held back per
+turn in flight.
+"""
+
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+from fastapi import WebSocket, status
+
+from app.api.routes.metrics import (
+    ws_connection_queued_bytes,
+    ws_outbound_queued_bytes,
+    ws_slow_consumer_total,
+)
+from app.core.config import get_settings
+
+try:
+    import msgpack
+except ImportError:  # optional
+    msgpack = None
+
+settings = get_settings()
+
+ENCODINGS = ("json", "binary", "msgpack")
+POLICIES = ("coalesce", "summary", "disconnect")
+
+Frame = Union[str, bytes]
+
+
+def negotiate_encoding(requested: Optional[str]) -> str:
+    """
+    Frame encoding to use for a client's request
+
+    Args:
+        requested: Value of the ``encoding`` query parameter
+
+    Returns:
+        'json', 'binary' or 'msgpack'; 'json' if the request cannot be honoured
+    """
+    if requested not in ENCODINGS or (requested == "msgpack" and msgpack is None):
+        return "json"
+    return requested
+
+
+def encode_message(message: Dict[str, Any], encoding: str) -> Frame:
+    """
+    Encode one message in the negotiated encoding
+
+    Args:
+        message: Message dict
+        encoding: Negotiated encoding
+
+    Returns:
+        Text frame, or binary frame for msgpack
+    """
+    if encoding == "msgpack":
+        return msgpack.packb(message)
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+class Outbox:
+    """Bounded outbound queue of one connection, drained by a single sender task"""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        max_bytes: Optional[int] = None,
+        send_timeout: Optional[float] = None,
+        policy: Optional[str] = None,
+        on_disconnect: Optional[Callable[[], None]] = None,
+        stall_limit: Optional[float] = None,
+    ):
+        """
+        Args:
+            websocket: WebSocket connection
+            max_bytes: Queued bytes at which the client counts as slow
+                (WS_OUTBOUND_BUFFER_BYTES if not provided)
+            send_timeout: Seconds a send may block before the client counts
+                as slow (WS_SEND_TIMEOUT_SECONDS if not provided)
+            policy: 'coalesce', 'summary' or 'disconnect'
+                (WS_SLOW_CONSUMER_POLICY if not provided)
+            on_disconnect: Called when a slow client is disconnected
+            stall_limit: Seconds a send may block before the client is
+                disconnected under any policy (WS_SEND_STALL_LIMIT_SECONDS
+                if not provided)
+        """
+        self.websocket = websocket
+        self.max_bytes = settings.WS_OUTBOUND_BUFFER_BYTES if max_bytes is None else max_bytes
+        self.send_timeout = (
+            settings.WS_SEND_TIMEOUT_SECONDS if send_timeout is None else send_timeout
+        )
+        self.policy = policy or settings.WS_SLOW_CONSUMER_POLICY
+        if self.policy not in POLICIES:
+            raise ValueError(f"Unknown slow consumer policy: {self.policy}")
+        self.on_disconnect = on_disconnect
+        self.stall_limit = (
+            settings.WS_SEND_STALL_LIMIT_SECONDS if stall_limit is None else stall_limit
+        )
+
+        self.queued_bytes = 0
+        self.peak_bytes = 0
+        self._burst_peak = 0  # since the queue last drained
+        self.stalled = False  # a send has been blocked longer than send_timeout
+        self.closed = False
+        self.evicted = False  # closed for being too slow
+
+        self._frames: Deque[Tuple[Frame, int]] = deque()
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._sender: Optional[asyncio.Task] = None
+
+    @property
+    def congested(self) -> bool:
+        """Whether the client is behind: deltas should be held back or dropped"""
+        return self.stalled or self.queued_bytes >= self.max_bytes
+
+    def put(self, frame: Frame) -> None:
+        """
+        Queue a frame for sending (dropped once the connection is closed)
+
+        Args:
+            frame: Encoded frame (text or bytes)
+        """
+        if self.closed:
+            return
+        size = len(frame) if isinstance(frame, bytes) else len(frame.encode("utf-8"))
+        self._frames.append((frame, size))
+        self.queued_bytes += size
+        if self.queued_bytes > self._burst_peak:
+            self._burst_peak = self.queued_bytes
+            self.peak_bytes = max(self.peak_bytes, self.queued_bytes)
+        ws_outbound_queued_bytes.inc(size)
+
+        if self.queued_bytes > self.max_bytes and (
+            self.policy == "disconnect" or self.queued_bytes > 2 * self.max_bytes
+        ):
+            self._evict()
+            return
+        self._idle.clear()
+        self._wakeup.set()
+        if self._sender is None:
+            self._sender = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        try:
+            while not self.closed:
+                if not self._frames:
+                    # One sample per burst keeps the histogram off the hot path
+                    if self._burst_peak:
+                        ws_connection_queued_bytes.observe(self._burst_peak)
+                        self._burst_peak = 0
+                    self._idle.set()
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                frame, size = self._frames.popleft()
+                try:
+                    await self._send(frame)
+                finally:
+                    self._release(size)
+        except Exception:
+            self.closed = True  # the client went away; the reader sees the disconnect
+        finally:
+            self._discard()
+            self._idle.set()
+
+        if self.evicted:
+            try:
+                await self.websocket.close(
+                    code=status.WS_1013_TRY_AGAIN_LATER, reason="Client too slow"
+                )
+            except Exception:
+                pass
+
+    async def _send(self, frame: Frame) -> None:
+        if isinstance(frame, bytes):
+            send = asyncio.ensure_future(self.websocket.send_bytes(frame))
+        else:
+            send = asyncio.ensure_future(self.websocket.send_text(frame))
+        try:
+            done, _ = await asyncio.wait({send}, timeout=self.send_timeout)
+            if not done:
+                ws_slow_consumer_total.labels(policy=self.policy).inc()
+                if self.policy != "disconnect":
+                    # Keep waiting up to the stall limit; writers hold back or
+                    # drop deltas meanwhile
+                    self.stalled = True
+                    try:
+                        done, _ = await asyncio.wait(
+                            {send}, timeout=max(self.stall_limit - self.send_timeout, 0)
+                        )
+                    finally:
+                        self.stalled = False
+                if not done:
+                    send.cancel()
+                    self._evict()
+                    return
+            send.result()
+        except asyncio.CancelledError:
+            send.cancel()
+            raise
+
+    def _evict(self) -> None:
+        """Stop serving a client that cannot keep up and cancel its turns"""
+        if self.closed:
+            return
+        print(f"[WS] Disconnecting slow client ({self.queued_bytes} bytes queued)")
+        self.closed = True
+        self.evicted = True
+        self._discard()
+        self._wakeup.set()
+        if self._sender is None:
+            self._sender = asyncio.create_task(self._run())
+        if self.on_disconnect is not None:
+            self.on_disconnect()
+
+    def _release(self, size: int) -> None:
+        self.queued_bytes -= size
+        ws_outbound_queued_bytes.dec(size)
+
+    def _discard(self) -> None:
+        while self._frames:
+            self._release(self._frames.popleft()[1])
+
+    async def close(self) -> None:
+        """Send what is queued (waiting at most send_timeout) and stop the sender"""
+        if self._sender is None:
+            self.closed = True
+            return
+        if not self.closed:
+            try:
+                await asyncio.wait_for(self._idle.wait(), self.send_timeout)
+            except TimeoutError:
+                pass
+        self.closed = True
+        if not self.evicted:
+            self._sender.cancel()
+        await asyncio.gather(self._sender, return_exceptions=True)
+
+
+class StreamWriter:
+    """Coalesces one turn's deltas into few frames"""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        encoding: str = "json",
+        flush_seconds: Optional[float] = None,
+        flush_bytes: Optional[int] = None,
+        request_id: Optional[str] = None,
+        outbox: Optional[Outbox] = None,
+    ):
+        """
+        Args:
+            websocket: WebSocket connection
+            encoding: Negotiated encoding (see negotiate_encoding)
+            flush_seconds: Longest a delta waits (WS_DELTA_FLUSH_MS if not provided)
+            flush_bytes: Buffered UTF-8 bytes that trigger a send
+                (WS_DELTA_FLUSH_BYTES if not provided)
+            request_id: Turn's request id, added to every message
+            outbox: Outbox shared by the connection's writers (a private one,
+                drained on close, if not provided)
+        """
+        self.websocket = websocket
+        self.encoding = encoding
+        self.request_id = request_id
+        self.flush_seconds = (
+            settings.WS_DELTA_FLUSH_MS / 1000 if flush_seconds is None else flush_seconds
+        )
+        self.flush_bytes = settings.WS_DELTA_FLUSH_BYTES if flush_bytes is None else flush_bytes
+        self.frames = 0  # delta frames sent
+        self.first_delta_at: Optional[float] = None  # perf_counter of the first delta
+        self.dropped = False  # deltas were dropped; the final message must carry the text
+
+        self._owns_outbox = outbox is None
+        self.outbox = outbox or Outbox(websocket)
+        self._pending: List[str] = []
+        self._pending_bytes = 0
+        self._last_flush = 0.0
+        self._timer: Optional[asyncio.Task] = None
+
+    async def delta(self, token: str) -> None:
+        """
+        Queue a delta; sent at once if it is the turn's first, else when the window fills
+
+        Args:
+            token: Text delta from the model
+        """
+        if not token or self.dropped:
+            return
+        self._pending.append(token)
+        self._pending_bytes += len(token.encode("utf-8"))
+
+        loop = asyncio.get_running_loop()
+        if self.first_delta_at is None:
+            self.first_delta_at = time.perf_counter()
+        if self.outbox.congested:
+            self._hold_back()
+        elif self.frames == 0 or (
+            self._pending_bytes >= self.flush_bytes
+            or loop.time() - self._last_flush >= self.flush_seconds
+        ):
+            await self.flush()
+        elif self._timer is None:
+            delay = self.flush_seconds - (loop.time() - self._last_flush)
+            self._timer = asyncio.create_task(self._flush_after(delay))
+
+    def _hold_back(self) -> None:
+        """Keep deltas while the client is behind, or drop them (policy 'summary')"""
+        if self.outbox.policy != "summary" and self._pending_bytes <= self.outbox.max_bytes:
+            # Coalesce everything into one frame once the client catches up
+            if self._timer is None:
+                self._timer = asyncio.create_task(self._flush_after(self.flush_seconds))
+            return
+        self.dropped = True
+        self._pending.clear()
+        self._pending_bytes = 0
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    async def _flush_after(self, delay: float) -> None:
+        """Send what is buffered if no later delta filled the window first"""
+        await asyncio.sleep(delay)
+        self._timer = None
+        if self.outbox.congested:
+            self._hold_back()
+        else:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Send buffered deltas as one frame"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        text = "".join(self._pending)
+        self._pending.clear()
+        self._pending_bytes = 0
+        self._last_flush = asyncio.get_running_loop().time()
+
+        if self.encoding == "binary":
+            self.outbox.put(f"{self.request_id or ''}\x00{text}".encode("utf-8"))
+        else:
+            self.outbox.put(
+                encode_message(self._tagged({"type": "delta", "token": text}), self.encoding)
+            )
+        self.frames += 1
+
+    def _tagged(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        if self.request_id is None:
+            return message
+        return {**message, "request_id": self.request_id}
+
+    async def send(self, message: Dict[str, Any]) -> None:
+        """
+        Send a control message after everything buffered before it
+
+        Args:
+            message: Message dict (start, end, error)
+        """
+        await self.flush()
+        self.outbox.put(encode_message(self._tagged(message), self.encoding))
+
+    async def close(self) -> None:
+        """Drop a pending deferred flush (e.g. when the turn failed)"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._owns_outbox:
+            await self.outbox.close()
@@ -0,0 +1,97 @@
+"""Micro-benchmark: offset-based chunker vs per-window decode
+
+Usage:
+    python -m benchmarks.bench_chunker --pages 500
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+import tiktoken  # noqa: E402
+
+from app.services.chunker import chunk_pages, get_encoding  # noqa: E402
+
+WORDS = (
+    "قرارداد طرفین مبلغ پرداخت تعهدات ماده تبصره شرکت کارفرما پیمانکار مدت "
+    "contract party payment clause article obligations term"
+).split()
+
+
+def make_pages(num_pages: int, words_per_page: int, seed: int = 0):
+    """Generate synthetic mixed Persian/English page text"""
+    rng = random.Random(seed)
+    return [
+        (page, " ".join(rng.choice(WORDS) for _ in range(words_per_page)))
+        for page in range(1, num_pages + 1)
+    ]
+
+
+def legacy_chunk_text(text, page_num, chunk_size, overlap):
+    """Previous implementation: get_encoding per page, decode per window"""
+    encoding = tiktoken.get_encoding("cl100k_base")
+    tokens = encoding.encode(text)
+    if len(tokens) <= chunk_size:
+        return [(page_num, text)]
+    chunks = []
+    start = 0
+    while start < len(tokens):
+        end = start + chunk_size
+        chunks.append((page_num, encoding.decode(tokens[start:end])))
+        start = end - overlap
+    return chunks
+
+
+def best_of(fn, repeat):
+    """Best wall time of fn over repeat runs"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--words-per-page", type=int, default=450)
+    parser.add_argument("--chunk-size", type=int, default=400)
+    parser.add_argument("--overlap", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    pages = make_pages(args.pages, args.words_per_page)
+
+    # Warm both paths so encoder loading is not timed
+    get_encoding()
+    chunk_pages(pages[:1], args.chunk_size, args.overlap)
+
+    legacy = best_of(
+        lambda: [
+            legacy_chunk_text(text, page, args.chunk_size, args.overlap) for page, text in pages
+        ],
+        args.repeat,
+    )
+    offsets = best_of(lambda: chunk_pages(pages, args.chunk_size, args.overlap), args.repeat)
+
+    print(
+        json.dumps(
+            {
+                "pages": args.pages,
+                "chunks": len(chunk_pages(pages, args.chunk_size, args.overlap)),
+                "legacy_seconds": round(legacy, 4),
+                "offset_seconds": round(offsets, 4),
+                "speedup": round(legacy / offsets, 2),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
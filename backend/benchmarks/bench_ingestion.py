@@ -0,0 +1,273 @@
+"""Ingestion benchmark: extract, chunk, embed and store a synthetic PDF
+
+Generates a synthetic Persian/English PDF, times each ingestion stage on its
+own (text extraction, chunking, embedding against a local fake OpenAI
+server, chunk persistence) and then the streaming pipeline end to end.
+Prints JSON with throughput, peak RSS and per-stage timings. With
+--baseline, exits non-zero if any throughput fell by more than --tolerance.
+
+Usage:
+    python -m benchmarks.bench_ingestion --pages 200 --output baseline.json
+    python -m benchmarks.bench_ingestion --pages 200 --baseline baseline.json
+    python -m benchmarks.bench_ingestion --database-url sqlite+aiosqlite:///bench.db
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+from openai import AsyncOpenAI  # noqa: E402
+from sqlalchemy import delete, select, text  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from sqlmodel import SQLModel  # noqa: E402
+
+import app.models  # noqa: E402,F401  (registers every table)
+from app.core.config import get_settings  # noqa: E402
+from app.models.chunk import Chunk  # noqa: E402
+from app.models.document import Document  # noqa: E402
+from app.models.tenant import Tenant  # noqa: E402
+from app.services import embedder  # noqa: E402
+from app.services.chunk_store import store_chunks  # noqa: E402
+from app.services.chunker import chunk_pages, get_encoding  # noqa: E402
+from app.services.ingestion import process_pdf_file  # noqa: E402
+from app.services.pdf_ingest import (  # noqa: E402
+    count_pdf_pages,
+    extract_text_from_pdf,
+    shutdown_pdf_executor,
+)
+from benchmarks.fake_openai import run_fake_openai  # noqa: E402
+from benchmarks.synthetic_pdf import make_document  # noqa: E402
+
+settings = get_settings()
+
+
+def _reset_peak_rss() -> None:
+    """Reset this process's peak RSS (Linux only; no-op elsewhere)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss_mb() -> float:
+    """Peak RSS of this process since the last reset"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return _max_rss_mb(resource.RUSAGE_SELF)
+
+
+def _max_rss_mb(who: int) -> float:
+    """Lifetime peak RSS from getrusage (never reset)"""
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(who).ru_maxrss / scale, 1)
+
+
+class _Stage:
+    """Time one stage and record its throughput and peak RSS"""
+
+    def __init__(self, results: Dict[str, dict], name: str, unit: str):
+        self.results = results
+        self.name = name
+        self.unit = unit
+        self.items = 0
+
+    def __enter__(self):
+        _reset_peak_rss()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.started
+        self.results[self.name] = {
+            "seconds": round(seconds, 3),
+            self.unit: self.items,
+            f"{self.unit}_per_second": round(self.items / seconds, 1) if seconds else 0.0,
+            "peak_rss_mb": _peak_rss_mb(),
+        }
+
+
+async def _create_tables(engine) -> None:
+    async with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+
+async def _new_document(session: AsyncSession, tenant_id: int, num_pages: int) -> Document:
+    document = Document(tenant_id=tenant_id, title="benchmark.pdf", pages=num_pages)
+    session.add(document)
+    await session.commit()
+    return document
+
+
+async def run(args: argparse.Namespace) -> dict:
+    """Run every stage and the pipeline; return the report"""
+    pdf, _ = make_document(args.pages, args.words_per_page, args.persian_ratio)
+    # Measure the embedding path itself, not cache hits from an earlier stage
+    settings.EMBEDDING_CACHE_ENABLED = args.cache
+
+    engine = create_async_engine(args.database_url)
+    await _create_tables(engine)
+    session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    stages: Dict[str, dict] = {}
+
+    with (
+        tempfile.TemporaryDirectory() as tmp,
+        run_fake_openai(latency_ms=args.embed_latency_ms) as fake,
+    ):
+        path = os.path.join(tmp, "benchmark.pdf")
+        with open(path, "wb") as f:
+            f.write(pdf)
+
+        embedder.client = AsyncOpenAI(api_key="bench", base_url=fake.state.base_url)
+        get_encoding()  # load the tokenizer outside the timed stages
+
+        async with session_maker() as session:
+            tenant = Tenant(name="benchmark")
+            session.add(tenant)
+            await session.commit()
+
+            try:
+                num_pages = await count_pdf_pages(path)
+
+                with _Stage(stages, "extract", "pages") as stage:
+                    pages = await extract_text_from_pdf(path, num_pages)
+                    stage.items = len(pages)
+
+                with _Stage(stages, "chunk", "chunks") as stage:
+                    chunks = chunk_pages(pages)
+                    stage.items = len(chunks)
+
+                with _Stage(stages, "embed", "chunks") as stage:
+                    embeddings = await embedder.create_embeddings_batch(
+                        [chunk.text for chunk in chunks], [chunk.tokens for chunk in chunks]
+                    )
+                    stage.items = len(embeddings)
+                stages["embed"]["requests"] = fake.state.requests
+
+                document = await _new_document(session, tenant.id, num_pages)
+                with _Stage(stages, "store", "chunks") as stage:
+                    stage.items = await store_chunks(
+                        session, document.id, tenant.id, chunks, embeddings
+                    )
+
+                document = await _new_document(session, tenant.id, num_pages)
+                _reset_peak_rss()
+                pipeline = await process_pdf_file(session, path, document.id, num_pages)
+                pipeline["peak_rss_mb"] = _peak_rss_mb()
+                pipeline["pages_per_second"] = round(num_pages / pipeline["elapsed_seconds"], 1)
+                pipeline["chunks_per_second"] = round(
+                    pipeline["chunks"] / pipeline["elapsed_seconds"], 1
+                )
+            finally:
+                document_ids = select(Document.id).where(Document.tenant_id == tenant.id)
+                await session.execute(delete(Chunk).where(Chunk.document_id.in_(document_ids)))
+                await session.execute(delete(Document).where(Document.tenant_id == tenant.id))
+                await session.execute(delete(Tenant).where(Tenant.id == tenant.id))
+                await session.commit()
+
+    shutdown_pdf_executor()
+    await engine.dispose()
+
+    return {
+        "config": {
+            "pages": args.pages,
+            "words_per_page": args.words_per_page,
+            "persian_ratio": args.persian_ratio,
+            "embed_latency_ms": args.embed_latency_ms,
+            "cache": args.cache,
+            "database": engine.dialect.name,
+            "pdf_bytes": len(pdf),
+            "pdf_extract_workers": settings.PDF_EXTRACT_WORKERS,
+            "embedding_batch_size": settings.EMBEDDING_BATCH_SIZE,
+            "embedding_max_concurrency": settings.EMBEDDING_MAX_CONCURRENCY,
+            "chunk_insert_batch_size": settings.CHUNK_INSERT_BATCH_SIZE,
+        },
+        "pages_per_second": pipeline["pages_per_second"],
+        "chunks_per_second": pipeline["chunks_per_second"],
+        "peak_rss_mb": {
+            "main": _max_rss_mb(resource.RUSAGE_SELF),
+            # Extraction workers were reaped by the shutdown above, so they count here
+            "extract_workers": _max_rss_mb(resource.RUSAGE_CHILDREN),
+        },
+        "stages": stages,
+        "pipeline": pipeline,
+    }
+
+
+def find_regressions(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    Compare throughputs against a baseline report
+
+    Args:
+        report: Current report
+        baseline: Earlier report from the same configuration
+        tolerance: Allowed fractional drop (0.2 = 20% slower is still fine)
+
+    Returns:
+        Human-readable description of each regression
+    """
+    pairs = [("pipeline", "pages_per_second", report, baseline)]
+    for name, stage in report["stages"].items():
+        for key in stage:
+            if key.endswith("_per_second"):
+                pairs.append((name, key, stage, baseline["stages"].get(name, {})))
+
+    regressions = []
+    for name, key, current, previous in pairs:
+        if not previous.get(key):
+            continue
+        if current[key] < previous[key] * (1 - tolerance):
+            regressions.append(f"{name}.{key}: {current[key]} < baseline {previous[key]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--words-per-page", type=int, default=450)
+    parser.add_argument("--persian-ratio", type=float, default=0.7)
+    parser.add_argument("--embed-latency-ms", type=float, default=100.0)
+    parser.add_argument("--cache", action="store_true", help="Keep the embedding cache on")
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    parser.add_argument("--baseline", help="Earlier report to compare throughput against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = find_regressions(report, json.load(f), args.tolerance)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+    if report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
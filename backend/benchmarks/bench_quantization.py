@@ -0,0 +1,144 @@
+"""Two-stage search benchmark: recall and latency of each coarse search mode
+
+Builds a clustered synthetic corpus (embeddings of real documents are far
+from uniformly spread, which matters for binary codes) whose variance
+decays along the dimensions like Matryoshka embeddings, so a leading
+prefix carries most of the signal. Writes it to a NumPy vector store per
+mode (each VECTOR_QUANTIZATION, plus a VECTOR_SEARCH_PREFIX_DIMENSIONS
+prefix) and compares each mode's top-k with the exact float32 top-k.
+Reports recall@k, query latency and the bytes per vector that must stay in
+memory for the coarse search, as JSON.
+
+The pgvector modes use the same two-stage scheme on the server; compare
+them with benchmarks.bench_retriever after changing the settings and
+rebuilding the index (python -m app.db.vector_index ensure).
+
+Usage:
+    python -m benchmarks.bench_quantization --chunks 100000 --queries 200
+    python -m benchmarks.bench_quantization --prefix-dimensions 256 --rerank-factor 10
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+import numpy as np  # noqa: E402
+
+from app.core.config import get_settings  # noqa: E402
+from app.services.vector_store import QUANTIZATIONS, NumpyVectorStore, quantize  # noqa: E402
+
+settings = get_settings()
+
+DIMENSIONS = settings.EMBEDDING_DIMENSIONS
+
+
+def clustered_vectors(count: int, clusters: int, spread: float, seed: int) -> np.ndarray:
+    """Unit vectors scattered around random topic centres, leading dimensions dominant"""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, DIMENSIONS), dtype=np.float32)
+    vectors = centres[rng.integers(clusters, size=count)]
+    vectors += spread * rng.standard_normal((count, DIMENSIONS), dtype=np.float32)
+    vectors *= 1 / np.sqrt(1 + np.arange(DIMENSIONS, dtype=np.float32) / 64)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def coarse_bytes_per_vector(quantization: str, prefix_dimensions: int) -> float:
+    """Memory held per vector for the coarse scan"""
+    width = prefix_dimensions or DIMENSIONS
+    codes, scales = quantize(np.zeros((1, width), dtype=np.float32), quantization)
+    return codes.nbytes + (scales.nbytes if scales is not None else 0)
+
+
+def run(args: argparse.Namespace) -> dict:
+    corpus = clustered_vectors(args.chunks, args.clusters, args.spread, seed=0)
+    # Paraphrases of stored chunks: each query is a chunk plus relative noise
+    queries = corpus[np.random.default_rng(1).integers(args.chunks, size=args.queries)]
+    noise = np.random.default_rng(2).standard_normal(queries.shape, dtype=np.float32)
+    queries = queries + args.query_noise * noise / np.sqrt(DIMENSIONS)
+    chunk_ids = list(range(args.chunks))
+    modes = [(quantization, 0) for quantization in QUANTIZATIONS]
+    if args.prefix_dimensions:
+        modes += [(quantization, args.prefix_dimensions) for quantization in ("none", "int8")]
+
+    report = {
+        "config": {
+            "chunks": args.chunks,
+            "queries": args.queries,
+            "top_k": args.top_k,
+            "rerank_factor": args.rerank_factor,
+            "clusters": args.clusters,
+            "spread": args.spread,
+            "query_noise": args.query_noise,
+            "prefix_dimensions": args.prefix_dimensions,
+        },
+        "modes": {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        exact = None
+        for quantization, prefix_dimensions in modes:
+            mode = (
+                f"{quantization}+prefix{prefix_dimensions}" if prefix_dimensions else quantization
+            )
+            store = NumpyVectorStore(
+                os.path.join(tmp, mode),
+                DIMENSIONS,
+                settings.VECTOR_STORE_BLOCK_ROWS,
+                quantization,
+                args.rerank_factor,
+                prefix_dimensions,
+            )
+            store.replace_tenant(1, chunk_ids, [1] * args.chunks, corpus)
+            store.nearest(1, queries[0], args.top_k)  # map and quantize outside the timing
+
+            latencies, results = [], []
+            for query in queries:
+                start = time.perf_counter()
+                hits = store.nearest(1, query, args.top_k)
+                latencies.append((time.perf_counter() - start) * 1000)
+                results.append({chunk_id for chunk_id, _ in hits})
+
+            if exact is None:
+                exact = results
+            recall = np.mean([len(a & b) / args.top_k for a, b in zip(results, exact)])
+
+            report["modes"][mode] = {
+                "recall_at_k": round(float(recall), 4),
+                "mean_ms": round(float(np.mean(latencies)), 3),
+                "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+                "coarse_bytes_per_vector": coarse_bytes_per_vector(quantization, prefix_dimensions),
+            }
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=settings.TOP_K)
+    parser.add_argument("--rerank-factor", type=int, default=settings.VECTOR_RERANK_FACTOR)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--spread", type=float, default=1.0, help="Noise around each centre")
+    parser.add_argument(
+        "--query-noise", type=float, default=0.5, help="Query distance from its chunk"
+    )
+    parser.add_argument(
+        "--prefix-dimensions",
+        type=int,
+        default=settings.VECTOR_SEARCH_PREFIX_DIMENSIONS or 256,
+        help="Also run prefix modes (0 = skip)",
+    )
+    args = parser.parse_args()
+
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""Retrieval query benchmark: text-literal vector vs binary prepared statement
+
+Seeds a PostgreSQL database with random chunks for a throwaway tenant, then
+runs the same similarity queries through the previous implementation (text
+literal through SQLAlchemy, parsed twice by Postgres) and through
+search_chunks (binary vector bound once to a prepared statement). Reports
+client CPU, wall time and, when the pg_stat_statements extension is
+installed, server execution + planning time per query, as JSON.
+--other-chunks adds rows for a second tenant; per-tenant latency should
+stay flat as it grows.
+
+Usage:
+    python -m benchmarks.bench_retriever --chunks 20000 --queries 500
+    python -m benchmarks.bench_retriever --chunks 20000 --other-chunks 500000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+import numpy as np  # noqa: E402
+from pgvector.utils import to_db_binary  # noqa: E402
+from sqlalchemy import delete, text  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from sqlmodel import SQLModel  # noqa: E402
+
+import app.models  # noqa: E402,F401  (registers every table)
+from app.core.config import get_settings  # noqa: E402
+from app.models.chunk import Chunk  # noqa: E402
+from app.models.document import Document  # noqa: E402
+from app.models.tenant import Tenant  # noqa: E402
+from app.services.chunk_store import store_chunks  # noqa: E402
+from app.services.chunker import TextChunk  # noqa: E402
+from app.services.retriever import search_chunks  # noqa: E402
+
+settings = get_settings()
+
+DIMENSIONS = settings.EMBEDDING_DIMENSIONS
+SEED_BATCH_ROWS = 10_000  # rows generated and stored at a time (~60 MB of float32)
+
+LEGACY_SQL = text("""
+    SELECT
+        c.text,
+        c.page,
+        d.title,
+        (c.embedding <=> :embedding::vector) AS distance
+    FROM chunks c
+    JOIN documents d ON c.document_id = d.id
+    WHERE d.tenant_id = :tenant_id
+    ORDER BY c.embedding <=> :embedding::vector
+    LIMIT :limit
+""")
+
+
+async def legacy_search(session: AsyncSession, embedding, tenant_id: int, top_k: int):
+    """Previous implementation: vector formatted as a text literal"""
+    embedding_str = "[" + ",".join(map(str, embedding)) + "]"
+    result = await session.execute(
+        LEGACY_SQL, {"embedding": embedding_str, "tenant_id": tenant_id, "limit": top_k}
+    )
+    return result.fetchall()
+
+
+def unit_vectors(rng: np.random.Generator, count: int) -> np.ndarray:
+    """Random float32 unit vectors, one per row"""
+    vectors = rng.standard_normal((count, DIMENSIONS), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def random_vectors(count: int, seed: int) -> list:
+    """Unit vectors as lists of floats (what the embedder returns)"""
+    return unit_vectors(np.random.default_rng(seed), count).tolist()
+
+
+async def seed_chunks(session: AsyncSession, tenant_id: int, count: int, seed: int) -> None:
+    """Store count random chunks for a tenant, SEED_BATCH_ROWS at a time"""
+    document = Document(tenant_id=tenant_id, title="benchmark.pdf", pages=1)
+    session.add(document)
+    await session.commit()
+
+    rng = np.random.default_rng(seed)
+    for start in range(0, count, SEED_BATCH_ROWS):
+        rows = min(SEED_BATCH_ROWS, count - start)
+        chunks = [TextChunk(1, f"chunk {i}", 2, 0, 0) for i in range(start, start + rows)]
+        await store_chunks(session, document.id, tenant_id, chunks, unit_vectors(rng, rows))
+
+
+def time_encoding(vector: list, repeat: int) -> dict:
+    """Client cost of turning one query vector into a parameter"""
+    start = time.process_time()
+    for _ in range(repeat):
+        "[" + ",".join(map(str, vector)) + "]"
+    text_us = (time.process_time() - start) / repeat * 1e6
+
+    start = time.process_time()
+    for _ in range(repeat):
+        to_db_binary(vector)
+    binary_us = (time.process_time() - start) / repeat * 1e6
+
+    return {"text_literal_us": round(text_us, 1), "binary_us": round(binary_us, 1)}
+
+
+async def _server_ms_per_query(session: AsyncSession, calls: int):
+    """Mean server exec + plan time of similarity queries since the last reset"""
+    try:
+        result = await session.execute(
+            text("""
+                SELECT sum(total_exec_time + total_plan_time)
+                FROM pg_stat_statements
+                WHERE query LIKE '%<=>%' AND query NOT LIKE '%pg_stat_statements%'
+            """)
+        )
+        total_ms = result.scalar()
+    except Exception:
+        await session.rollback()
+        return None
+    return round(total_ms / calls, 3) if total_ms else None
+
+
+async def _reset_server_stats(session: AsyncSession) -> None:
+    try:
+        await session.execute(text("SELECT pg_stat_statements_reset()"))
+    except Exception:
+        await session.rollback()
+
+
+async def run_variant(session: AsyncSession, search, queries: list, tenant_id: int, top_k: int):
+    """Run every query through search and measure it"""
+    await search(session, queries[0], tenant_id, top_k)  # warm up / prepare
+    await _reset_server_stats(session)
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for query in queries:
+        await search(session, query, tenant_id, top_k)
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+
+    return {
+        "client_cpu_ms_per_query": round(cpu / len(queries) * 1000, 3),
+        "wall_ms_per_query": round(wall / len(queries) * 1000, 3),
+        "server_ms_per_query": await _server_ms_per_query(session, len(queries)),
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    engine = create_async_engine(args.database_url)
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        await conn.run_sync(SQLModel.metadata.create_all)
+    session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    queries = random_vectors(args.queries, seed=1)
+
+    async with session_maker() as session:
+        tenant = Tenant(name="benchmark")
+        other = Tenant(name="benchmark-other")
+        session.add_all([tenant, other])
+        await session.commit()
+        tenant_ids = [tenant.id, other.id]
+
+        try:
+            for owner, count, seed in ((tenant, args.chunks, 0), (other, args.other_chunks, 2)):
+                if count:
+                    await seed_chunks(session, owner.id, count, seed)
+            await session.execute(text("ANALYZE chunks"))
+            await session.commit()
+
+            legacy = await run_variant(session, legacy_search, queries, tenant.id, args.top_k)
+            binary = await run_variant(session, search_chunks, queries, tenant.id, args.top_k)
+        finally:
+            await session.execute(delete(Chunk).where(Chunk.tenant_id.in_(tenant_ids)))
+            await session.execute(delete(Document).where(Document.tenant_id.in_(tenant_ids)))
+            await session.execute(delete(Tenant).where(Tenant.id.in_(tenant_ids)))
+            await session.commit()
+
+    await engine.dispose()
+
+    return {
+        "config": {
+            "chunks": args.chunks,
+            "other_chunks": args.other_chunks,
+            "queries": args.queries,
+            "top_k": args.top_k,
+        },
+        "encode": time_encoding(queries[0], repeat=1000),
+        "text_literal": legacy,
+        "binary_prepared": binary,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--other-chunks", type=int, default=0, help="Rows of another tenant")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=settings.TOP_K)
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
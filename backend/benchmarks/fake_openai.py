@@ -0,0 +1,133 @@
+"""Local fake of the OpenAI embeddings endpoint for benchmarks
+
+Returns deterministic unit vectors (seeded by the input text) after a
+configurable per-request latency, so embedding-stage numbers measure our
+batching and concurrency rather than a remote service.
+
+Usage (standalone):
+    python -m benchmarks.fake_openai --port 8765 --latency-ms 150
+"""
+
+import argparse
+import asyncio
+import base64
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Union
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+
+class EmbeddingRequest(BaseModel):
+    """Subset of the OpenAI embeddings request we need"""
+
+    model: str
+    input: Union[str, List[str], List[int], List[List[int]]]
+    encoding_format: str = "float"
+    dimensions: Optional[int] = None
+
+
+def _vector(item: Union[str, List[int]], dimensions: int) -> np.ndarray:
+    """Deterministic unit vector for an input"""
+    seed = zlib.crc32(item.encode("utf-8") if isinstance(item, str) else str(item).encode())
+    vector = np.random.default_rng(seed).standard_normal(dimensions, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def create_app(dimensions: int = 1536, latency_ms: float = 0.0) -> FastAPI:
+    """
+    Build the fake embeddings app
+
+    Args:
+        dimensions: Default vector length
+        latency_ms: Delay added to every request
+
+    Returns:
+        FastAPI app serving POST /v1/embeddings
+    """
+    app = FastAPI()
+    app.state.requests = 0
+    app.state.inputs = 0
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: EmbeddingRequest):
+        items = request.input
+        if isinstance(items, str) or (items and isinstance(items[0], int)):
+            items = [items]
+
+        app.state.requests += 1
+        app.state.inputs += len(items)
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+
+        data = []
+        for index, item in enumerate(items):
+            vector = _vector(item, request.dimensions or dimensions)
+            if request.encoding_format == "base64":
+                embedding = base64.b64encode(vector.tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+
+        tokens = sum(len(item) // 4 + 1 for item in items)
+        return {
+            "object": "list",
+            "data": data,
+            "model": request.model,
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    return app
+
+
+@contextmanager
+def run_fake_openai(dimensions: int = 1536, latency_ms: float = 0.0) -> Iterator[FastAPI]:
+    """
+    Serve the fake on a free localhost port in a background thread
+
+    The server runs on its own event loop, so its work is not charged to the
+    benchmarked loop. The yielded app has base_url, requests and inputs on
+    app.state.
+
+    Args:
+        dimensions: Default vector length
+        latency_ms: Delay added to every request
+    """
+    app = create_app(dimensions, latency_ms)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("Fake OpenAI server failed to start")
+        time.sleep(0.01)
+
+    port = server.servers[0].sockets[0].getsockname()[1]
+    app.state.base_url = f"http://127.0.0.1:{port}/v1"
+
+    try:
+        yield app
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args.dimensions, args.latency_ms), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Synthetic Persian/English PDFs for benchmarks
+
+Pages are drawn with a Type0 font using Identity-H encoding, so each glyph id
+is the character's Unicode code point, and a ToUnicode CMap maps it back.
+No font program is embedded: viewers render boxes, but text extraction sees
+exactly the generated text, Persian included.
+
+Like real producers, Persian lines are written in visual order (characters
+reversed) and extractors restore logical order. Each line is a single
+script: pypdf drops text from lines that mix Persian and Latin runs, which
+would skew chunk counts.
+"""
+
+import random
+from typing import List, Tuple
+
+PERSIAN_WORDS = (
+    "قرارداد طرفین مبلغ پرداخت تعهدات ماده تبصره شرکت کارفرما پیمانکار مدت "
+    "اجرای پروژه تحویل خسارت فسخ داوری محرمانه ضمانت نامه صورتحساب"
+).split()
+ENGLISH_WORDS = (
+    "contract party payment clause article obligations term delivery "
+    "warranty invoice termination arbitration confidential schedule"
+).split()
+
+_WORDS_PER_LINE = 12
+_ARABIC_BLOCK = range(0x0600, 0x0700)
+
+
+def make_page_texts(
+    num_pages: int, words_per_page: int, persian_ratio: float = 0.7, seed: int = 0
+) -> List[str]:
+    """
+    Generate synthetic mixed Persian/English page text
+
+    Args:
+        num_pages: Number of pages
+        words_per_page: Words on each page
+        persian_ratio: Fraction of lines drawn from the Persian vocabulary
+        seed: Random seed, so runs are comparable
+
+    Returns:
+        Text of each page (lines separated by newlines)
+    """
+    rng = random.Random(seed)
+    pages = []
+    for _ in range(num_pages):
+        lines = []
+        for start in range(0, words_per_page, _WORDS_PER_LINE):
+            vocabulary = PERSIAN_WORDS if rng.random() < persian_ratio else ENGLISH_WORDS
+            count = min(_WORDS_PER_LINE, words_per_page - start)
+            lines.append(" ".join(rng.choice(vocabulary) for _ in range(count)))
+        pages.append("\n".join(lines))
+    return pages
+
+
+def _is_rtl(line: str) -> bool:
+    return any(ord(char) in _ARABIC_BLOCK for char in line)
+
+
+def _to_unicode_cmap(codepoints: List[int]) -> bytes:
+    """ToUnicode CMap mapping each glyph id to the same code point"""
+    entries = []
+    # bfchar blocks are limited to 100 entries each
+    for i in range(0, len(codepoints), 100):
+        block = codepoints[i : i + 100]
+        entries.append(f"{len(block)} beginbfchar")
+        entries.extend(f"<{cp:04X}> <{cp:04X}>" for cp in block)
+        entries.append("endbfchar")
+
+    return "\n".join(
+        [
+            "/CIDInit /ProcSet findresource begin",
+            "12 dict begin",
+            "begincmap",
+            "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def",
+            "/CMapName /Adobe-Identity-UCS def",
+            "/CMapType 2 def",
+            "1 begincodespacerange",
+            "<0000> <FFFF>",
+            "endcodespacerange",
+            *entries,
+            "endcmap",
+            "CMapName currentdict /CMap defineresource pop",
+            "end",
+            "end",
+        ]
+    ).encode("ascii")
+
+
+def _content_stream(text: str) -> bytes:
+    """Page content drawing each line of text with the Type0 font"""
+    lines = text.split("\n")
+    # Squeeze long pages so every line stays inside the MediaBox
+    leading = min(14.0, 700.0 / len(lines))
+    size = leading * 0.8
+    ops = ["BT", f"/F1 {size:.2f} Tf", f"{leading:.2f} TL", "50 760 Td"]
+    for i, line in enumerate(lines):
+        visual = line[::-1] if _is_rtl(line) else line
+        glyphs = "".join(f"{ord(char):04X}" for char in visual)
+        ops.append(f"<{glyphs}> Tj" if i == 0 else f"T* <{glyphs}> Tj")
+    ops.append("ET")
+    return "\n".join(ops).encode("ascii")
+
+
+def make_pdf(pages: List[str]) -> bytes:
+    """
+    Build a PDF with one page per text
+
+    Args:
+        pages: Page texts (BMP characters only, single-script lines)
+
+    Returns:
+        PDF file bytes
+    """
+    codepoints = sorted({ord(char) for text in pages for char in text if char != "\n"})
+    cmap = _to_unicode_cmap(codepoints)
+
+    objects: List[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"",  # Pages tree, filled in once page ids are known
+        b"<< /Type /Font /Subtype /Type0 /BaseFont /Synthetic /Encoding /Identity-H "
+        b"/DescendantFonts [4 0 R] /ToUnicode 5 0 R >>",
+        b"<< /Type /Font /Subtype /CIDFontType2 /BaseFont /Synthetic "
+        b"/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> "
+        b"/FontDescriptor 6 0 R /DW 500 /CIDToGIDMap /Identity >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(cmap), cmap),
+        b"<< /Type /FontDescriptor /FontName /Synthetic /Flags 4 "
+        b"/FontBBox [0 -200 1000 800] /ItalicAngle 0 /Ascent 800 /Descent -200 "
+        b"/CapHeight 700 /StemV 80 >>",
+    ]
+
+    page_ids = []
+    for text in pages:
+        stream = _content_stream(text)
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+
+    xref_offset = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref_offset,
+    )
+    return bytes(out)
+
+
+def make_document(
+    num_pages: int, words_per_page: int, persian_ratio: float = 0.7, seed: int = 0
+) -> Tuple[bytes, List[str]]:
+    """
+    Generate a synthetic PDF and the text it contains
+
+    Returns:
+        Tuple of (PDF bytes, page texts)
+    """
+    texts = make_page_texts(num_pages, words_per_page, persian_ratio, seed)
+    return make_pdf(texts), texts
@@ -40,9 +40,29 @@ def fake_redis(monkeypatch):
     import redis.asyncio as redis_module
 
     from app.api.routes import auth as auth_module
+    from app.services import embedding_cache as embedding_cache_module
 
     shared_store: dict[str, str] = {}
 
+    class FakePipeline:
+        def __init__(self, client):
+            self._client = client
+            self._commands = []
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc_info):
+            return None
+
+        def set(self, key: str, value, ex: int = None):
+            self._commands.append((key, value))
+
+        async def execute(self):
+            for key, value in self._commands:
+                await self._client.set(key, value)
+            self._commands = []
+
     class FakeRedis:
         def __init__(self):
             # Share storage across all instances
@@ -54,9 +74,18 @@ def fake_redis(monkeypatch):
         async def get(self, key: str):
             return self._store.get(key)
 
+        async def set(self, key: str, value, ex: int = None):
+            self._store[key] = value
+
+        async def mget(self, keys):
+            return [self._store.get(key) for key in keys]
+
         async def delete(self, key: str):
             self._store.pop(key, None)
 
+        def pipeline(self, transaction: bool = True):
+            return FakePipeline(self)
+
         async def close(self):
             return None
 
@@ -64,6 +93,7 @@ def fake_redis(monkeypatch):
     fake_instance = FakeRedis()
     # Replace global client in auth module
     monkeypatch.setattr(auth_module, "redis_client", fake_instance)
+    monkeypatch.setattr(embedding_cache_module, "redis_client", fake_instance)
     # Replace factory so tests creating their own client get the same fake instance
     monkeypatch.setattr(redis_module, "from_url", lambda *args, **kwargs: fake_instance)
     yield
@@ -73,6 +103,7 @@ def fake_redis(monkeypatch):
 async def db_session() -> AsyncGenerator[AsyncSession, None]:
     """Provide a test database session"""
     from app.models.document import Document
+    from app.models.job import IngestionJob
     from app.models.quota import Quota
     from app.models.tenant import Tenant
     from app.models.user import User
@@ -89,6 +120,7 @@ async def db_session() -> AsyncGenerator[AsyncSession, None]:
                     Tenant.__table__,
                     User.__table__,
                     Document.__table__,
+                    IngestionJob.__table__,
                     Quota.__table__,
                 ],
             )
@@ -110,6 +142,7 @@ async def db_session() -> AsyncGenerator[AsyncSession, None]:
                     Tenant.__table__,
                     User.__table__,
                     Document.__table__,
+                    IngestionJob.__table__,
                     Quota.__table__,
                 ],
             )
@@ -117,6 +150,36 @@ async def db_session() -> AsyncGenerator[AsyncSession, None]:
         await conn.run_sync(_drop_all)
 
 
+@pytest_asyncio.fixture
+async def chunk_table(db_session: AsyncSession) -> AsyncGenerator[None, None]:
+    """Create the chunks table (embeddings are stored as text on SQLite)"""
+    from app.models.chunk import Chunk
+
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Chunk.__table__.create)
+
+    yield
+
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Chunk.__table__.drop)
+
+
+@pytest_asyncio.fixture
+async def chat_tables(db_session: AsyncSession) -> AsyncGenerator[None, None]:
+    """Create the chat session and message tables"""
+    from app.models.chat import ChatSession, Message
+
+    async with test_engine.begin() as conn:
+        await conn.run_sync(ChatSession.__table__.create)
+        await conn.run_sync(Message.__table__.create)
+
+    yield
+
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Message.__table__.drop)
+        await conn.run_sync(ChatSession.__table__.drop)
+
+
 @pytest_asyncio.fixture
 async def client(db_session: AsyncSession) -> AsyncGenerator[AsyncClient, None]:
     """Provide a test HTTP client without authentication override"""
@@ -155,6 +218,78 @@ async def authenticated_client(
     app.dependency_overrides.clear()
 
 
+@pytest.fixture
+def byte_encoding(monkeypatch):
+    """Use a small byte-level tiktoken encoding so tests need no vocabulary download"""
+    import tiktoken
+
+    from app.services import chunker, tokenizer
+
+    ranks = {bytes([i]): i for i in range(256)}
+    # A few merges so tokens have mixed byte lengths, including whole Persian letters
+    for merged in [b"th", b"the", b" the", "س".encode(), "ل".encode(), "ا".encode()]:
+        ranks[merged] = len(ranks)
+
+    encoding = tiktoken.Encoding(
+        name="test_bytes", pat_str=r"\s?\S+|\s+", mergeable_ranks=ranks, special_tokens={}
+    )
+    caches = [
+        chunker._token_byte_lengths,
+        tokenizer.encoding_for_model,
+        tokenizer._memo_count,
+    ]
+    monkeypatch.setattr(tokenizer, "get_encoding", lambda name=None: encoding)
+    for cache in caches:
+        cache.cache_clear()
+    yield encoding
+    for cache in caches:
+        cache.cache_clear()
+
+
+@pytest.fixture
+def pdf_factory():
+    """Build a minimal text PDF with one ASCII string per page"""
+
+    def _make_pdf(pages: list[str]) -> bytes:
+        objects = [
+            b"<< /Type /Catalog /Pages 2 0 R >>",
+            None,  # Pages tree, filled in once page ids are known
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        ]
+        page_ids = []
+        for text in pages:
+            escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            stream = f"BT /F1 12 Tf 72 720 Td ({escaped}) Tj ET".encode("latin-1")
+            objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+            content_id = len(objects)
+            objects.append(
+                b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+            )
+            page_ids.append(len(objects))
+
+        kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+        objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+        out = bytearray(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(len(out))
+            out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+
+        xref_offset = len(out)
+        out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+        for offset in offsets:
+            out += b"%010d 00000 n \n" % offset
+        out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+            len(objects) + 1,
+            xref_offset,
+        )
+        return bytes(out)
+
+    return _make_pdf
+
+
 @pytest.fixture
 def tenant_id() -> int:
     """Default tenant ID for tests"""
@@ -0,0 +1,70 @@
+"""Tests for bulk chunk persistence"""
+
+import struct
+
+import numpy as np
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.chunk import Chunk
+from app.services.chunk_store import encode_copy_binary, store_chunks
+from app.services.chunker import TextChunk
+from app.services.rag import header_tokens
+
+
+def test_encode_copy_binary():
+    """Test the COPY payload follows the PGCOPY binary layout"""
+    payload = encode_copy_binary(
+        [
+            {
+                "document_id": 7,
+                "tenant_id": 3,
+                "page": 2,
+                "text": "متن",
+                "tokens": 12,
+                "embedding": [0.5, -1.0],
+            }
+        ]
+    )
+
+    assert payload.startswith(b"PGCOPY\n\xff\r\n\x00")
+    assert payload.endswith(struct.pack(">h", -1))
+
+    body = payload[19:-2]
+    fields, *ints = struct.unpack(">hiiiiii", body[:26])
+    assert fields == 6
+    assert ints == [4, 7, 4, 3, 4, 2]  # (length, value) for document_id, tenant_id, page
+
+    text = "متن".encode("utf-8")
+    (text_len,) = struct.unpack(">i", body[26:30])
+    assert body[30 : 30 + text_len] == text
+
+    assert struct.unpack(">ii", body[30 + text_len : 38 + text_len]) == (4, 12)
+
+    vector = body[38 + text_len + 4 :]
+    dim, _ = struct.unpack(">HH", vector[:4])
+    assert dim == 2
+    assert np.frombuffer(vector[4:], dtype=">f4").tolist() == [0.5, -1.0]
+
+
+@pytest.mark.asyncio
+async def test_store_chunks_executemany(db_session: AsyncSession, chunk_table, byte_encoding):
+    """Test the executemany fallback stores every chunk across slices with token counts"""
+    chunks = [
+        TextChunk(page=i // 2 + 1, text=f"chunk {i}", tokens=2, start=0, end=7) for i in range(5)
+    ]
+    embeddings = [[float(i)] * 1536 for i in range(5)]
+
+    stored = await store_chunks(db_session, 1, 9, chunks, embeddings, batch_size=2)
+
+    result = await db_session.execute(
+        select(Chunk.text, Chunk.page, Chunk.tenant_id, Chunk.tokens).order_by(Chunk.id)
+    )
+    rows = result.all()
+    assert stored == 5
+    assert [row[:3] for row in rows] == [(f"chunk {i}", i // 2 + 1, 9) for i in range(5)]
+    # Chunk tokens plus the source header, counted once per page
+    header = header_tokens(1, "")
+    assert rows[0].tokens == 2 + header
+    assert header > 2
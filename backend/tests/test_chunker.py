@@ -0,0 +1,49 @@
+"""Tests for the token chunker"""
+
+from app.services.chunker import chunk_pages, chunk_text
+
+
+def test_chunk_text_short_page(byte_encoding):
+    """Test a page under the chunk size is returned whole"""
+    chunks = chunk_text("the cat", page_num=3, chunk_size=100, overlap=10)
+
+    assert len(chunks) == 1
+    assert chunks[0].page == 3
+    assert chunks[0].text == "the cat"
+    assert (chunks[0].start, chunks[0].end) == (0, 7)
+
+
+def test_chunk_spans_match_decoded_windows(byte_encoding):
+    """Test offset slicing covers the same tokens as decoding each window"""
+    text = "the theory of the thing " * 20
+    tokens = byte_encoding.encode_ordinary(text)
+
+    chunks = chunk_text(text, page_num=1, chunk_size=16, overlap=4)
+
+    assert chunks[0].start == 0
+    assert chunks[-1].end == len(text)
+    for i, chunk in enumerate(chunks):
+        assert chunk.text == text[chunk.start : chunk.end]
+        assert chunk.text == byte_encoding.decode(tokens[i * 12 : i * 12 + 16])
+        assert chunk.tokens == len(tokens[i * 12 : i * 12 + 16])
+
+
+def test_chunk_persian_boundaries(byte_encoding):
+    """Test windows that split a multi-byte character widen to whole characters"""
+    text = "سلام دنیا، این یک متن آزمایشی فارسی است. " * 10
+
+    chunks = chunk_text(text, page_num=1, chunk_size=9, overlap=2)
+
+    assert chunks[-1].end == len(text)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.start <= previous.end
+        assert chunk.text == text[chunk.start : chunk.end]
+
+
+def test_chunk_pages_batch(byte_encoding):
+    """Test chunking several pages keeps page order and numbers"""
+    chunks = chunk_pages([(1, "the one"), (4, "the four " * 10)], chunk_size=8, overlap=2)
+
+    assert chunks[0].page == 1
+    assert {chunk.page for chunk in chunks[1:]} == {4}
+    assert [c.page for c in chunks] == sorted(c.page for c in chunks)
@@ -0,0 +1,193 @@
+"""Tests for the embedding batcher"""
+
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import APIStatusError, BadRequestError, RateLimitError
+
+from app.services import embedder
+from app.services.embedder import (
+    create_embedding,
+    create_embeddings_batch,
+    create_query_embedding,
+    plan_batches,
+)
+from app.services.embedding_cache import EmbeddingCache
+
+
+def _status_error(cls, status: int, headers=None):
+    """An openai status error as the client raises it"""
+    request = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+    response = httpx.Response(status, headers=headers, request=request)
+    return cls("upstream error", response=response, body=None)
+
+
+class FakeEmbeddings:
+    """Stand-in for client.embeddings that embeds each text as [len(text)]"""
+
+    def __init__(self, fail_first: int = 0):
+        self.calls = []
+        self.options = []
+        self.fail_first = fail_first
+        self.error = lambda: _status_error(APIStatusError, 503)
+
+    async def create(self, model: str, input, **options):
+        inputs = [input] if isinstance(input, str) else list(input)
+        self.calls.append(inputs)
+        self.options.append(options)
+        if self.fail_first:
+            self.fail_first -= 1
+            raise self.error()
+        # Return out of order to check results are re-sorted by index
+        data = [
+            SimpleNamespace(index=i, embedding=[float(len(text))]) for i, text in enumerate(inputs)
+        ]
+        return SimpleNamespace(data=list(reversed(data)))
+
+
+@pytest.fixture
+def fake_embeddings(monkeypatch):
+    fake = FakeEmbeddings()
+    monkeypatch.setattr(embedder, "client", SimpleNamespace(embeddings=fake))
+    # Keep tests independent of tokenizer downloads
+    monkeypatch.setattr(embedder, "count_input_tokens", lambda texts: [len(t) for t in texts])
+    monkeypatch.setattr(embedder.settings, "EMBEDDING_RETRY_BACKOFF_SECONDS", 0)
+    monkeypatch.setattr(
+        embedder, "chunk_embedding_cache", EmbeddingCache("emb", local_size=100, ttl_seconds=0)
+    )
+    return fake
+
+
+def test_plan_batches():
+    """Test batches respect both item and token limits"""
+    assert plan_batches([1, 1, 1, 1, 1], max_items=2, max_tokens=100) == [(0, 2), (2, 4), (4, 5)]
+    assert plan_batches([40, 40, 40, 10], max_items=10, max_tokens=100) == [(0, 2), (2, 4)]
+    # Oversized input still gets its own batch
+    assert plan_batches([500, 1], max_items=10, max_tokens=100) == [(0, 1), (1, 2)]
+    assert plan_batches([], max_items=10, max_tokens=100) == []
+
+
+@pytest.mark.asyncio
+async def test_create_embeddings_batch_order(fake_embeddings, monkeypatch):
+    """Test results are reassembled in input order across batches"""
+    monkeypatch.setattr(embedder.settings, "EMBEDDING_BATCH_SIZE", 3)
+    texts = ["a" * n for n in range(1, 11)]
+
+    embeddings = await create_embeddings_batch(texts)
+
+    assert embeddings == [[float(n)] for n in range(1, 11)]
+    assert len(fake_embeddings.calls) == 4
+
+
+@pytest.mark.asyncio
+async def test_create_embeddings_batch_retries(fake_embeddings, monkeypatch):
+    """Test a failed batch is retried on its own"""
+    monkeypatch.setattr(embedder.settings, "EMBEDDING_BATCH_SIZE", 2)
+    fake_embeddings.fail_first = 1
+
+    embeddings = await create_embeddings_batch(["a", "bb", "ccc", "dddd"])
+
+    assert embeddings == [[1.0], [2.0], [3.0], [4.0]]
+    assert len(fake_embeddings.calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_create_embeddings_batch_honours_retry_after(fake_embeddings, monkeypatch):
+    """Test a rate-limited batch waits as long as the server asks"""
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(embedder.asyncio, "sleep", fake_sleep)
+    fake_embeddings.fail_first = 2
+    fake_embeddings.error = lambda: _status_error(RateLimitError, 429, {"retry-after": "7"})
+
+    assert await create_embeddings_batch(["a"]) == [[1.0]]
+    assert delays == [7.0, 7.0]
+
+
+@pytest.mark.asyncio
+async def test_create_embeddings_batch_client_error_not_retried(fake_embeddings, monkeypatch):
+    """Test a request error fails at once and cancels the other batches"""
+    monkeypatch.setattr(embedder.settings, "EMBEDDING_BATCH_SIZE", 1)
+    cancelled = []
+    create = fake_embeddings.create
+
+    async def slow_or_failing_create(model, input, **options):
+        if input == ["bad"]:
+            raise _status_error(BadRequestError, 400)
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(input)
+            raise
+        return await create(model, input, **options)
+
+    monkeypatch.setattr(fake_embeddings, "create", slow_or_failing_create)
+
+    with pytest.raises(BadRequestError):
+        await create_embeddings_batch(["a", "bad", "bb"])
+    assert sorted(cancelled) == [["a"], ["bb"]]
+
+
+@pytest.mark.asyncio
+async def test_embedding_cache_skips_known_text(fake_embeddings):
+    """Test cached and duplicate texts are not sent upstream again"""
+    await create_embeddings_batch(["alpha", "beta"])
+    fake_embeddings.calls.clear()
+
+    embeddings = await create_embeddings_batch(["beta", "gamma ", " gamma", "alpha"])
+
+    assert embeddings == [[4.0], [6.0], [6.0], [5.0]]
+    assert fake_embeddings.calls == [["gamma "]]
+
+
+@pytest.mark.asyncio
+async def test_embedding_cache_shared_tier(fake_embeddings, monkeypatch):
+    """Test a fresh process-local cache is filled from the shared tier"""
+    await create_embedding("shared text")
+    monkeypatch.setattr(
+        embedder, "chunk_embedding_cache", EmbeddingCache("emb", local_size=100, ttl_seconds=0)
+    )
+    fake_embeddings.calls.clear()
+
+    assert await create_embedding("shared text") == [11.0]
+    assert fake_embeddings.calls == []
+
+
+@pytest.mark.asyncio
+async def test_query_embedding_cache(fake_embeddings, monkeypatch):
+    """Test repeated queries are served from the query cache, separately from chunks"""
+    query_cache = EmbeddingCache("qemb", local_size=100, ttl_seconds=3600)
+    monkeypatch.setattr(embedder, "query_embedding_cache", query_cache)
+
+    assert await create_query_embedding("What is the  payment term?") == [26.0]
+    assert await create_query_embedding(" What is the payment term? ") == [26.0]
+
+    assert fake_embeddings.calls == [["What is the  payment term?"]]
+    assert len(query_cache.local) == 1
+    assert len(embedder.chunk_embedding_cache.local) == 0
+
+    monkeypatch.setattr(embedder.settings, "QUERY_EMBEDDING_CACHE_ENABLED", False)
+    await create_query_embedding("What is the payment term?")
+    assert len(fake_embeddings.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_embedding_dimensions_requested_and_cached_apart(fake_embeddings, monkeypatch):
+    """Test text-embedding-3 requests carry dimensions and each length has its own cache keys"""
+    monkeypatch.setattr(embedder.settings, "EMBEDDING_MODEL", "text-embedding-3-small")
+    monkeypatch.setattr(embedder.settings, "EMBEDDING_DIMENSIONS", 512)
+    await create_embeddings_batch(["same text"])
+
+    monkeypatch.setattr(embedder.settings, "EMBEDDING_DIMENSIONS", 256)
+    await create_embeddings_batch(["same text"])
+
+    assert fake_embeddings.options == [{"dimensions": 512}, {"dimensions": 256}]
+
+    monkeypatch.setattr(embedder.settings, "EMBEDDING_MODEL", "text-embedding-ada-002")
+    await create_embeddings_batch(["other text"])
+    assert fake_embeddings.options[-1] == {}
@@ -1,11 +1,15 @@
 """Tests for file upload endpoint"""
 
+import os
 from io import BytesIO
 
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.models.document import Document
+from app.models.job import IngestionJob
 from app.models.tenant import Tenant
 from app.models.user import User
 
@@ -40,3 +44,154 @@ async def test_upload_invalid_file_type(
 
     assert response.status_code == 400
     assert "PDF" in response.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_upload_pdf_queues_job(
+    authenticated_client: AsyncClient,
+    db_session: AsyncSession,
+    tenant_headers: dict,
+    pdf_factory,
+):
+    """Test upload reads the page count and queues the spooled file for ingestion"""
+    tenant = Tenant(id=1, name="test")
+    db_session.add(tenant)
+    await db_session.commit()
+
+    pdf_bytes = pdf_factory(["one", "two", "three"])
+    files = {"file": ("doc.pdf", BytesIO(pdf_bytes), "application/pdf")}
+
+    response = await authenticated_client.post("/v1/files", files=files, headers=tenant_headers)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "pending"
+
+    job = (await db_session.execute(select(IngestionJob))).scalar_one()
+    assert job.document_id == data["document_id"]
+    assert job.num_pages == 3
+    with open(job.file_path, "rb") as spooled:
+        assert spooled.read() == pdf_bytes
+    os.unlink(job.file_path)
+
+    response = await authenticated_client.get(
+        f"/v1/files/{data['document_id']}/status", headers=tenant_headers
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "document_id": data["document_id"],
+        "status": "pending",
+        "pages": 3,
+        "chunks": 0,
+        "attempts": 0,
+        "error": None,
+        "duplicate_of": None,
+    }
+
+
+@pytest.mark.asyncio
+async def test_upload_duplicate_pdf_returns_existing(
+    authenticated_client: AsyncClient,
+    db_session: AsyncSession,
+    tenant_headers: dict,
+    pdf_factory,
+    monkeypatch,
+    tmp_path,
+):
+    """Test re-uploading the same file links to the existing document without a new job"""
+    from app.api.routes import files as files_module
+
+    monkeypatch.setattr(files_module.settings, "UPLOAD_SPOOL_DIR", str(tmp_path))
+    db_session.add(Tenant(id=1, name="test"))
+    await db_session.commit()
+
+    pdf_bytes = pdf_factory(["same content"])
+    responses = []
+    for name in ("first.pdf", "again.pdf"):
+        files = {"file": (name, BytesIO(pdf_bytes), "application/pdf")}
+        responses.append(
+            await authenticated_client.post("/v1/files", files=files, headers=tenant_headers)
+        )
+
+    first, second = (response.json() for response in responses)
+    assert first["duplicate"] is False
+    assert second["duplicate"] is True
+    assert second["document_id"] == first["document_id"]
+
+    jobs = (await db_session.execute(select(IngestionJob))).scalars().all()
+    assert len(jobs) == 1
+    assert list(tmp_path.iterdir()) == [tmp_path / os.path.basename(jobs[0].file_path)]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicate_upload_resolves_to_original(
+    authenticated_client: AsyncClient,
+    db_session: AsyncSession,
+    tenant_headers: dict,
+    pdf_factory,
+    monkeypatch,
+    tmp_path,
+):
+    """Test an upload that misses the duplicate lookup still links to the original"""
+    from app.api.routes import files as files_module
+
+    monkeypatch.setattr(files_module.settings, "UPLOAD_SPOOL_DIR", str(tmp_path))
+    db_session.add(Tenant(id=1, name="test"))
+    await db_session.commit()
+
+    pdf_bytes = pdf_factory(["same content"])
+    files = {"file": ("first.pdf", BytesIO(pdf_bytes), "application/pdf")}
+    first = await authenticated_client.post("/v1/files", files=files, headers=tenant_headers)
+
+    # As if the first upload committed between this upload's lookup and insert
+    lookups = []
+    find_duplicate = files_module.find_duplicate
+
+    async def racing_find_duplicate(*args, **kwargs):
+        lookups.append(kwargs)
+        return None if len(lookups) == 1 else await find_duplicate(*args, **kwargs)
+
+    monkeypatch.setattr(files_module, "find_duplicate", racing_find_duplicate)
+    files = {"file": ("again.pdf", BytesIO(pdf_bytes), "application/pdf")}
+    second = await authenticated_client.post("/v1/files", files=files, headers=tenant_headers)
+
+    assert second.status_code == 200
+    assert second.json()["duplicate"] is True
+    assert second.json()["document_id"] == first.json()["document_id"]
+    assert len(lookups) == 2
+    jobs = (await db_session.execute(select(IngestionJob))).scalars().all()
+    assert len(jobs) == 1
+
+
+@pytest.mark.asyncio
+async def test_file_status_other_tenant(
+    authenticated_client: AsyncClient, db_session: AsyncSession, tenant_headers: dict
+):
+    """Test status of another tenant's document is not found"""
+    db_session.add(Tenant(id=1, name="test"))
+    db_session.add(Tenant(id=2, name="other"))
+    db_session.add(Document(id=5, tenant_id=2, title="secret", pages=1))
+    await db_session.commit()
+
+    response = await authenticated_client.get("/v1/files/5/status", headers=tenant_headers)
+
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_upload_pdf_too_large(
+    authenticated_client: AsyncClient, tenant_headers: dict, monkeypatch, tmp_path
+):
+    """Test size limit is enforced while streaming and the spool file is removed"""
+    from app.api.routes import files as files_module
+
+    monkeypatch.setattr(files_module.settings, "MAX_FILE_SIZE_MB", 1)
+    monkeypatch.setattr(files_module.settings, "UPLOAD_SPOOL_DIR", str(tmp_path))
+
+    files = {"file": ("big.pdf", BytesIO(b"0" * (1024 * 1024 + 1)), "application/pdf")}
+
+    response = await authenticated_client.post("/v1/files", files=files, headers=tenant_headers)
+
+    assert response.status_code == 413
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,87 @@
+"""Tests for the ingestion job queue"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.document import Document
+from app.models.tenant import Tenant
+from app.services import ingest_queue
+from app.services.ingest_queue import claim_next_job, enqueue_ingestion, fail_job
+
+
+async def _add_document(session: AsyncSession, tenant_id: int, file_path: str = "/tmp/x.pdf"):
+    document = Document(tenant_id=tenant_id, title="doc", pages=1)
+    session.add(document)
+    await session.flush()
+    job = enqueue_ingestion(session, document, file_path, 1)
+    await session.commit()
+    return document, job
+
+
+@pytest.mark.asyncio
+async def test_claim_is_fair_across_tenants(db_session: AsyncSession):
+    """Test a tenant with a running job yields to a tenant with none"""
+    db_session.add_all([Tenant(id=1, name="busy"), Tenant(id=2, name="quiet")])
+    await db_session.commit()
+
+    for _ in range(3):
+        await _add_document(db_session, tenant_id=1)
+    _, quiet_job = await _add_document(db_session, tenant_id=2)
+
+    first = await claim_next_job(db_session, "worker-a")
+    second = await claim_next_job(db_session, "worker-b")
+
+    assert first.tenant_id == 1
+    assert second.id == quiet_job.id
+    assert second.status == "running"
+    assert second.attempts == 1
+
+
+@pytest.mark.asyncio
+async def test_fail_job_retries_then_fails(db_session: AsyncSession, monkeypatch, tmp_path):
+    """Test failures re-queue with backoff until attempts run out"""
+    monkeypatch.setattr(ingest_queue.settings, "INGEST_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(ingest_queue.settings, "INGEST_RETRY_BACKOFF_SECONDS", 0)
+    db_session.add(Tenant(id=1, name="test"))
+    await db_session.commit()
+
+    spooled = tmp_path / "upload.pdf"
+    spooled.write_bytes(b"%PDF")
+    document, _ = await _add_document(db_session, tenant_id=1, file_path=str(spooled))
+
+    job = await claim_next_job(db_session, "worker")
+    await fail_job(db_session, job, "boom")
+    assert job.status == "queued"
+    await db_session.refresh(document)
+    assert document.status == "pending"
+
+    job = await claim_next_job(db_session, "worker")
+    await fail_job(db_session, job, "boom again")
+
+    await db_session.refresh(document)
+    assert job.status == "failed"
+    assert document.status == "failed"
+    assert document.error == "boom again"
+    assert not spooled.exists()
+    assert await claim_next_job(db_session, "worker") is None
+
+
+@pytest.mark.asyncio
+async def test_claim_reclaims_expired_lease(db_session: AsyncSession):
+    """Test a running job whose worker stopped heartbeating is claimable again"""
+    db_session.add(Tenant(id=1, name="test"))
+    await db_session.commit()
+    await _add_document(db_session, tenant_id=1)
+
+    job = await claim_next_job(db_session, "dead-worker")
+    assert await claim_next_job(db_session, "worker") is None
+
+    job.locked_at = datetime.utcnow() - timedelta(hours=1)
+    await db_session.commit()
+
+    reclaimed = await claim_next_job(db_session, "worker")
+    assert reclaimed.id == job.id
+    assert reclaimed.locked_by == "worker"
+    assert reclaimed.attempts == 2
@@ -0,0 +1,165 @@
+"""Tests for the streaming ingestion pipeline"""
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.chunk import Chunk
+from app.models.document import Document
+from app.models.tenant import Tenant
+from app.services import ingestion
+from app.services.ingestion import process_pdf_file
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    monkeypatch.setattr(ingestion.settings, "EMBEDDING_BATCH_SIZE", 2)
+    monkeypatch.setattr(ingestion.settings, "CHUNK_INSERT_BATCH_SIZE", 3)
+    monkeypatch.setattr(ingestion.settings, "CHUNK_TOKEN_SIZE", 8)
+    monkeypatch.setattr(ingestion.settings, "CHUNK_OVERLAP", 2)
+
+
+async def _spooled_document(session: AsyncSession, pdf_factory, tmp_path, pages):
+    session.add(Tenant(id=1, name="test"))
+    document = Document(tenant_id=1, title="doc", pages=len(pages))
+    session.add(document)
+    await session.commit()
+
+    path = tmp_path / "upload.pdf"
+    path.write_bytes(pdf_factory(pages))
+    return document, str(path)
+
+
+@pytest.mark.asyncio
+async def test_pipeline_stores_all_chunks(
+    db_session: AsyncSession,
+    chunk_table,
+    byte_encoding,
+    small_batches,
+    pdf_factory,
+    tmp_path,
+    monkeypatch,
+):
+    """Test every chunk flows through all stages and progress is recorded"""
+
+    async def fake_embeddings(texts, token_counts=None):
+        return [[float(len(text))] * 1536 for text in texts]
+
+    monkeypatch.setattr(ingestion, "create_embeddings_batch", fake_embeddings)
+    pages = [f"page {i} text" for i in range(1, 9)]
+    document, path = await _spooled_document(db_session, pdf_factory, tmp_path, pages)
+
+    stats = await process_pdf_file(db_session, path, document.id, len(pages))
+
+    count = await db_session.scalar(select(func.count()).select_from(Chunk))
+    await db_session.refresh(document)
+    assert stats["chunks"] == count > len(pages)
+    assert document.status == "ready"
+    assert document.chunks == count
+    assert stats["stages"]["extract"]["items"] == len(pages)
+    assert stats["stages"]["embed"]["items"] == stats["stages"]["store"]["items"] == count
+
+
+@pytest.mark.asyncio
+async def test_pipeline_stage_failure_propagates(
+    db_session: AsyncSession,
+    chunk_table,
+    byte_encoding,
+    small_batches,
+    pdf_factory,
+    tmp_path,
+    monkeypatch,
+):
+    """Test a failing stage cancels the pipeline and re-raises the original error"""
+
+    async def failing_embeddings(texts, token_counts=None):
+        raise RuntimeError("embedding provider down")
+
+    monkeypatch.setattr(ingestion, "create_embeddings_batch", failing_embeddings)
+    pages = [f"page {i}" for i in range(1, 4)]
+    document, path = await _spooled_document(db_session, pdf_factory, tmp_path, pages)
+
+    with pytest.raises(RuntimeError, match="embedding provider down"):
+        await process_pdf_file(db_session, path, document.id, len(pages))
+
+
+@pytest.mark.asyncio
+async def test_pipeline_links_text_duplicate(
+    db_session: AsyncSession,
+    chunk_table,
+    byte_encoding,
+    small_batches,
+    pdf_factory,
+    tmp_path,
+    monkeypatch,
+):
+    """Test a document with the same text as an existing one is linked and keeps no chunks"""
+
+    async def fake_embeddings(texts, token_counts=None):
+        return [[0.0] * 1536 for _ in texts]
+
+    monkeypatch.setattr(ingestion, "create_embeddings_batch", fake_embeddings)
+    pages = ["same  text", "second page"]
+    original, path = await _spooled_document(db_session, pdf_factory, tmp_path, pages)
+    original_id = original.id
+    first = await process_pdf_file(db_session, path, original_id, len(pages))
+
+    copy = Document(tenant_id=1, title="copy", pages=len(pages))
+    db_session.add(copy)
+    await db_session.commit()
+    # Different whitespace, same normalized text
+    path = tmp_path / "copy.pdf"
+    path.write_bytes(pdf_factory(["same text", "second  page"]))
+    copy_id = copy.id
+    second = await process_pdf_file(db_session, str(path), copy_id, len(pages))
+
+    count = await db_session.scalar(select(func.count()).select_from(Chunk))
+    copy = await db_session.get(Document, copy_id)
+    assert first["duplicate_of"] is None
+    assert second == {**second, "chunks": 0, "duplicate_of": original_id}
+    assert count == first["chunks"]
+    assert copy.status == "ready"
+    assert copy.duplicate_of == original_id
+
+
+@pytest.mark.asyncio
+async def test_pipeline_links_text_duplicate_after_lost_race(
+    db_session: AsyncSession,
+    chunk_table,
+    byte_encoding,
+    small_batches,
+    pdf_factory,
+    tmp_path,
+    monkeypatch,
+):
+    """Test a document that loses the race to become the original is linked to the winner"""
+
+    async def fake_embeddings(texts, token_counts=None):
+        return [[0.0] * 1536 for _ in texts]
+
+    monkeypatch.setattr(ingestion, "create_embeddings_batch", fake_embeddings)
+    pages = ["same text", "second page"]
+    original, path = await _spooled_document(db_session, pdf_factory, tmp_path, pages)
+    original_id = original.id
+    await process_pdf_file(db_session, path, original_id, len(pages))
+
+    copy = Document(tenant_id=1, title="copy", pages=len(pages))
+    db_session.add(copy)
+    await db_session.commit()
+    copy_id = copy.id
+
+    find_duplicate = ingestion.find_duplicate
+    lookups = []
+
+    async def racing_find_duplicate(*args, **kwargs):
+        # The first lookup runs before the winner recorded its fingerprint
+        lookups.append(kwargs)
+        return None if len(lookups) == 1 else await find_duplicate(*args, **kwargs)
+
+    monkeypatch.setattr(ingestion, "find_duplicate", racing_find_duplicate)
+    stats = await process_pdf_file(db_session, path, copy_id, len(pages))
+
+    copy = await db_session.get(Document, copy_id)
+    assert len(lookups) == 2
+    assert stats["chunks"] == 0
+    assert stats["duplicate_of"] == copy.duplicate_of == original_id
@@ -0,0 +1,45 @@
+"""Tests for PDF text extraction"""
+
+import pytest
+
+from app.services.pdf_ingest import extract_text_from_pdf, split_page_ranges
+
+
+def test_split_page_ranges():
+    """Test page ranges cover every page once, in order"""
+    ranges = split_page_ranges(10, workers=3, max_pages=25)
+
+    assert ranges == [(0, 4), (4, 8), (8, 10)]
+    assert split_page_ranges(10, workers=2, max_pages=3) == [(0, 3), (3, 6), (6, 9), (9, 10)]
+    assert split_page_ranges(0, workers=4, max_pages=25) == []
+
+
+@pytest.mark.asyncio
+async def test_extract_text_page_order(pdf_factory):
+    """Test pages extracted in the pool come back in page order"""
+    pdf_bytes = pdf_factory([f"page {i}" for i in range(1, 8)] + [""])
+
+    pages = await extract_text_from_pdf(pdf_bytes)
+
+    assert [page_num for page_num, _ in pages] == list(range(1, 8))
+    assert "page 3" in pages[2][1]
+
+
+@pytest.mark.asyncio
+async def test_extract_text_invalid_pdf():
+    """Test invalid PDF raises ValueError"""
+    with pytest.raises(ValueError):
+        await extract_text_from_pdf(b"not a pdf")
+
+
+@pytest.mark.asyncio
+async def test_extract_text_synthetic_persian_pdf():
+    """Test the benchmark's synthetic Persian/English PDFs extract to their source text"""
+    from benchmarks.synthetic_pdf import make_document
+
+    pdf_bytes, texts = make_document(num_pages=3, words_per_page=60, seed=1)
+
+    pages = await extract_text_from_pdf(pdf_bytes)
+
+    assert [text for _, text in pages] == texts
+    assert any("\u0600" <= char <= "\u06ff" for char in texts[0])
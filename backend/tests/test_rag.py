@@ -0,0 +1,54 @@
+"""Tests for RAG prompt construction"""
+
+import numpy as np
+
+from app.services import rag
+from app.services.rag import build_rag_prompt, select_chunks
+from app.services.vector_store import SearchHit
+
+
+def _hit(text: str, distance: float, vector=None, tokens: int = 0) -> SearchHit:
+    embedding = None if vector is None else np.asarray(vector, dtype=np.float32)
+    return SearchHit(text, 1, "doc.pdf", distance, embedding, tokens)
+
+
+def test_select_chunks_cutoffs_and_duplicates():
+    """Test distance, relative-gap and near-duplicate cutoffs"""
+    hits = [
+        _hit("best", 0.30, [1.0, 0.0, 0.0]),
+        _hit("copy of best", 0.31, [0.99, 0.05, 0.0]),
+        _hit("other", 0.40, [0.0, 1.0, 0.0]),
+        _hit("weak", 0.50, [0.0, 0.0, 1.0]),
+        _hit("far", 0.90),
+    ]
+
+    kept = select_chunks(hits, max_distance=0.8, relative_gap=0.2, duplicate_similarity=0.95)
+    assert [hit.text for hit in kept] == ["best", "other"]
+
+    kept = select_chunks(hits, max_distance=0, relative_gap=0, duplicate_similarity=0)
+    assert [hit.text for hit in kept] == [hit.text for hit in hits]
+
+
+def test_build_rag_prompt_skips_dropped_chunks(monkeypatch):
+    """Test only selected chunks reach the prompt"""
+    monkeypatch.setattr(rag, "count_tokens", lambda text: len(text.split()))
+    hits = [_hit("relevant passage", 0.2), _hit("unrelated passage", 0.95)]
+
+    _, user_prompt = build_rag_prompt("question?", hits)
+
+    assert "relevant passage" in user_prompt
+    assert "unrelated passage" not in user_prompt
+    assert user_prompt.endswith("question?")
+
+
+def test_build_rag_prompt_packs_stored_token_counts(monkeypatch):
+    """Test packing uses stored chunk counts and tokenizes only the question"""
+    counted = []
+    monkeypatch.setattr(rag, "count_tokens", lambda text: counted.append(text) or 10)
+    hits = [_hit(f"passage {i}", 0.2 + i / 100, tokens=200) for i in range(6)]
+
+    _, user_prompt = build_rag_prompt("question?", hits, max_tokens=1000)
+
+    # 1000 * 0.7 - 10 question tokens leaves room for three 200-token chunks
+    assert [f"passage {i}" in user_prompt for i in range(6)] == [True] * 3 + [False] * 3
+    assert counted == ["question?"]
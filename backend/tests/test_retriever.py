@@ -0,0 +1,114 @@
+"""Tests for vector retrieval"""
+
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+from pgvector.utils import from_db_binary
+
+from app.services import retriever
+from app.services.retriever import encode_vector, retrieve_relevant_chunks
+
+
+class FakeStatement:
+    def __init__(self):
+        self.calls = []
+
+    async def fetch(self, *args):
+        self.calls.append(args)
+        return [("text", 3, "doc.pdf", 0.25, None, 40)]
+
+
+class FakeDriverConnection:
+    """Stand-in for an asyncpg connection"""
+
+    def __init__(self):
+        self.codecs = []
+        self.prepared = []
+        self.log = []  # transaction boundaries and executed SQL
+
+    @asynccontextmanager
+    async def transaction(self):
+        self.log.append("BEGIN")
+        yield
+        self.log.append("COMMIT")
+
+    async def execute(self, query):
+        self.log.append(query)
+
+    async def set_type_codec(self, typename, **kwargs):
+        self.codecs.append(typename)
+
+    async def prepare(self, query):
+        self.prepared.append(FakeStatement())
+        return self.prepared[-1]
+
+
+class FakeSession:
+    def __init__(self, driver_connection):
+        raw = SimpleNamespace(driver_connection=driver_connection)
+
+        async def get_raw_connection():
+            return raw
+
+        self._connection = SimpleNamespace(get_raw_connection=get_raw_connection)
+
+    async def connection(self):
+        return self._connection
+
+
+def test_encode_vector_binary():
+    """Test lists and SQLAlchemy text literals encode to the same binary vector"""
+    encoded = encode_vector([1.0, -2.5, 0.0])
+
+    assert encoded == encode_vector("[1.0,-2.5,0.0]")
+    assert from_db_binary(encoded).tolist() == [1.0, -2.5, 0.0]
+
+
+@pytest.mark.asyncio
+async def test_retrieve_prepares_once_per_connection(monkeypatch):
+    """Test the query vector is bound once to a statement reused across requests"""
+
+    async def fake_query_embedding(query):
+        return [0.5, 0.5]
+
+    monkeypatch.setattr(retriever, "create_query_embedding", fake_query_embedding)
+    monkeypatch.setattr(retriever.settings, "VECTOR_STORE", "pgvector")
+    driver_connection = FakeDriverConnection()
+    session = FakeSession(driver_connection)
+
+    for _ in range(3):
+        rows = await retrieve_relevant_chunks("question", 7, session, top_k=4)
+
+    assert rows == [("text", 3, "doc.pdf", 0.25, None, 40)]
+    assert (rows[0].distance, rows[0].tokens) == (0.25, 40)
+    assert driver_connection.codecs == ["vector"]
+    assert len(driver_connection.prepared) == 1
+    assert driver_connection.prepared[0].calls == [([0.5, 0.5], 7, 4)] * 3
+    # Custom plans are forced for the retrieval query only, even inside a savepoint
+    transaction = [
+        "BEGIN",
+        "SET LOCAL plan_cache_mode = force_custom_plan",
+        "RESET plan_cache_mode",
+        "COMMIT",
+    ]
+    assert driver_connection.log == transaction * 3
+
+
+@pytest.mark.asyncio
+async def test_quantized_search_reranks_candidates(monkeypatch):
+    """Test quantized modes order by the indexed expression and pass the candidate count"""
+    monkeypatch.setattr(retriever.settings, "VECTOR_QUANTIZATION", "binary")
+    monkeypatch.setattr(retriever.settings, "VECTOR_RERANK_FACTOR", 5)
+    driver_connection = FakeDriverConnection()
+
+    await retriever.search_chunks(FakeSession(driver_connection), [0.5, 0.5], 7, 4)
+
+    assert driver_connection.prepared[0].calls == [([0.5, 0.5], 7, 4, 20)]
+    assert "binary_quantize(embedding)::bit(1536)" in retriever.retrieve_sql("binary")
+    with pytest.raises(ValueError):
+        retriever.retrieve_sql("int8")
+    assert (
+        "subvector(embedding, 1, 256)::vector(256) <=> subvector($1::vector, 1, 256)"
+        in retriever.retrieve_sql("none", 256)
+    )
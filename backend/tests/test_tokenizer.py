@@ -0,0 +1,43 @@
+"""Tests for the shared tokenizer"""
+
+import pytest
+
+from app.services import tokenizer
+from app.services.tokenizer import (
+    count_tokens,
+    count_tokens_async,
+    count_tokens_batch,
+    encoding_for_model,
+)
+
+
+def test_count_tokens_memoized(byte_encoding):
+    """Test repeated short strings are counted once and match the encoder"""
+    text = "the theory of the thing"
+
+    assert count_tokens(text) == len(byte_encoding.encode_ordinary(text))
+    count_tokens(text)
+
+    info = tokenizer._memo_count.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+    assert encoding_for_model("not-a-model") is byte_encoding
+
+
+@pytest.mark.asyncio
+async def test_count_tokens_async_offloads_large_inputs(byte_encoding, monkeypatch):
+    """Test large inputs are counted in a worker thread with the batch encoder"""
+    monkeypatch.setattr(tokenizer.settings, "TOKENIZER_OFFLOAD_CHARS", 100)
+    offloaded = []
+
+    async def fake_to_thread(fn, *args):
+        offloaded.append(fn)
+        return fn(*args)
+
+    monkeypatch.setattr(tokenizer.asyncio, "to_thread", fake_to_thread)
+    small, large = "the cat", "the theory of the thing " * 10
+
+    assert await count_tokens_async([small]) == [count_tokens(small)]
+    assert offloaded == []
+
+    assert await count_tokens_async([small, large]) == count_tokens_batch([small, large])
+    assert offloaded == [count_tokens_batch]
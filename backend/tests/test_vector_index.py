@@ -0,0 +1,131 @@
+"""Tests for the vector index manager and admin endpoints"""
+
+import pytest
+from httpx import AsyncClient
+
+from app.db import vector_index
+from app.db.vector_index import (
+    IndexSpec,
+    desired_spec,
+    ivfflat_lists,
+    parse_index_definition,
+    rebuild_reason,
+)
+
+
+def test_ivfflat_lists_sized_to_rows():
+    """Test lists follow rows/1000 up to 1M rows and sqrt(rows) beyond"""
+    assert ivfflat_lists(0) == 1
+    assert ivfflat_lists(250_000) == 250
+    assert ivfflat_lists(4_000_000) == 2000
+
+
+def test_parse_index_definition():
+    """Test method and options are read back from pg_indexes"""
+    spec = parse_index_definition(
+        "CREATE INDEX chunks_embedding_idx ON public.chunks "
+        "USING hnsw (embedding vector_cosine_ops) WITH (m='16', ef_construction='64')"
+    )
+
+    assert spec == IndexSpec("hnsw", {"m": 16, "ef_construction": 64})
+
+    binary = parse_index_definition(
+        "CREATE INDEX chunks_embedding_idx ON public.chunks USING hnsw "
+        "(((binary_quantize(embedding))::bit(1536)) bit_hamming_ops) WITH (m='16')"
+    )
+    assert binary == IndexSpec("hnsw", {"m": 16}, "binary")
+
+    prefix = parse_index_definition(
+        "CREATE INDEX chunks_embedding_idx ON public.chunks USING hnsw "
+        "(((subvector(embedding, 1, 256))::vector(256)) vector_cosine_ops) WITH (m='16')"
+    )
+    assert prefix == IndexSpec("hnsw", {"m": 16}, "none", 256)
+
+
+def test_rebuild_reason(monkeypatch):
+    """Test rebuilds are due on missing index, type change and IVFFlat growth only"""
+    monkeypatch.setattr(vector_index.settings, "VECTOR_INDEX_REBUILD_GROWTH", 2.0)
+    monkeypatch.setattr(vector_index.settings, "VECTOR_INDEX_IVFFLAT_MIN_ROWS", 1000)
+    legacy = IndexSpec("ivfflat", {"lists": 100})
+
+    assert desired_spec(500, "ivfflat") is None
+    assert rebuild_reason(None, desired_spec(0, "hnsw")) == "missing"
+    assert rebuild_reason(legacy, desired_spec(0, "hnsw")).startswith("type")
+    assert rebuild_reason(legacy, desired_spec(150_000, "ivfflat")) is None
+    assert "grew" in rebuild_reason(legacy, desired_spec(200_000, "ivfflat"))
+    assert rebuild_reason(desired_spec(0, "hnsw"), desired_spec(10**7, "hnsw")) is None
+    assert rebuild_reason(desired_spec(0, "hnsw"), desired_spec(0, "hnsw", "halfvec")).startswith(
+        "quantization"
+    )
+    prefixed = desired_spec(0, "hnsw", prefix_dimensions=256)
+    assert rebuild_reason(desired_spec(0, "hnsw"), prefixed).startswith("prefix")
+
+
+@pytest.mark.asyncio
+async def test_admin_vector_index_requires_key(client: AsyncClient, monkeypatch):
+    """Test admin endpoints are closed without the configured key"""
+    from app.api import deps
+    from app.api.routes import admin
+
+    async def fake_status():
+        return {"rows": 5000, "current": None, "desired": None, "rebuild_reason": None}
+
+    monkeypatch.setattr(admin, "get_index_status", fake_status)
+
+    response = await client.get("/v1/admin/vector-index")
+    assert response.status_code == 403
+
+    monkeypatch.setattr(deps.settings, "ADMIN_API_KEY", "secret")
+    response = await client.get("/v1/admin/vector-index", headers={"X-Admin-Key": "wrong"})
+    assert response.status_code == 403
+
+    response = await client.get("/v1/admin/vector-index", headers={"X-Admin-Key": "secret"})
+    assert response.status_code == 200
+    assert response.json()["rows"] == 5000
+    assert response.json()["building"] is False
+
+
+@pytest.mark.asyncio
+async def test_ensure_index_builds_tenant_partial_indexes(monkeypatch):
+    """Test large tenants get their own index and up-to-date ones are left alone"""
+    hnsw = desired_spec(0, "hnsw").as_dict()
+
+    async def fake_status():
+        return {
+            "rows": 300_000,
+            "current": hnsw,
+            "desired": hnsw,
+            "rebuild_reason": None,
+            "tenants": [
+                {
+                    "tenant_id": 4,
+                    "rows": 200_000,
+                    "current": None,
+                    "desired": hnsw,
+                    "rebuild_reason": "missing",
+                },
+                {
+                    "tenant_id": 9,
+                    "rows": 100_000,
+                    "current": hnsw,
+                    "desired": hnsw,
+                    "rebuild_reason": None,
+                },
+            ],
+        }
+
+    built = []
+
+    async def fake_build(spec, tenant_id=None):
+        built.append((spec.type, tenant_id))
+        return True
+
+    monkeypatch.setattr(vector_index, "get_index_status", fake_status)
+    monkeypatch.setattr(vector_index, "build_index", fake_build)
+
+    result = await vector_index.ensure_index()
+
+    assert built == [("hnsw", 4)]
+    assert result["action"] == "none"
+    assert [tenant["action"] for tenant in result["tenants"]] == ["built", "none"]
+    assert vector_index.tenant_index_name(4) == "chunks_embedding_t4_idx"
@@ -0,0 +1,115 @@
+"""Tests for the NumPy vector store"""
+
+import numpy as np
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.document import Document
+from app.models.tenant import Tenant
+from app.services import retriever
+from app.services.chunk_store import store_chunks
+from app.services.chunker import TextChunk
+from app.services.retriever import get_vector_store, retrieve_relevant_chunks
+from app.services.vector_store import NumpyVectorStore, VectorStore, top_k_rows
+
+
+def _unit(index: int) -> list:
+    vector = [0.0] * 1536
+    vector[index] = 1.0
+    return vector
+
+
+def test_vector_store_requires_search():
+    """Test a store must implement search while add and remove_document are optional"""
+
+    class Incomplete(VectorStore):
+        pass
+
+    class SearchOnly(VectorStore):
+        async def search(self, session, embedding, tenant_id, top_k):
+            return []
+
+    with pytest.raises(TypeError):
+        Incomplete()
+    SearchOnly()
+
+
+def test_top_k_rows_matches_full_sort():
+    """Test blockwise argpartition top-k equals a full sort of all scores"""
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((1000, 16), dtype=np.float32)
+    queries = rng.standard_normal((3, 16), dtype=np.float32)
+
+    idx, scores = top_k_rows(vectors, queries, k=5, block_rows=64)
+
+    expected = np.argsort(-(queries @ vectors.T), axis=1)[:, :5]
+    assert idx.tolist() == expected.tolist()
+    assert np.all(np.diff(scores, axis=1) <= 0)
+
+
+@pytest.mark.parametrize(
+    "quantization, prefix_dimensions",
+    [("halfvec", 0), ("int8", 0), ("binary", 0), ("none", 32), ("int8", 32)],
+)
+def test_two_stage_search_reranks_to_exact(tmp_path, quantization, prefix_dimensions):
+    """Test coarse search on quantized or prefix vectors plus rerank returns exact neighbours"""
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((500, 64), dtype=np.float32)
+    store = NumpyVectorStore(
+        str(tmp_path), 64, 128, quantization, rerank_factor=10, prefix_dimensions=prefix_dimensions
+    )
+    store.replace_tenant(1, list(range(100, 400)), [1] * 300, vectors[:300])
+    store.nearest(1, vectors[0], 3)
+    # Appended rows are quantized incrementally
+    with open(tmp_path / "tenant_1.vec", "ab") as f:
+        f.write(store._records(list(range(400, 600)), [2] * 200, vectors[300:]).tobytes())
+
+    query = vectors[450] + 0.1 * rng.standard_normal(64, dtype=np.float32)
+    hits = store.nearest(1, query, 3)
+
+    exact = NumpyVectorStore(str(tmp_path), 64, 128).nearest(1, query, 3)
+    assert hits[0] == pytest.approx(exact[0], abs=1e-5)
+    assert hits[0][0] == 550
+    if quantization != "binary":  # sign bits alone cannot order random near-ties
+        assert [chunk_id for chunk_id, _ in hits] == [chunk_id for chunk_id, _ in exact]
+
+
+@pytest.mark.asyncio
+async def test_numpy_store_retrieval(
+    db_session: AsyncSession, chunk_table, tmp_path, monkeypatch, byte_encoding
+):
+    """Test stored chunks are searchable per tenant, removable and rebuilt when missing"""
+    monkeypatch.setattr(retriever.settings, "VECTOR_STORE", "numpy")
+    monkeypatch.setattr(retriever.settings, "VECTOR_STORE_PATH", str(tmp_path))
+
+    async def fake_query_embedding(query):
+        return _unit(int(query))
+
+    monkeypatch.setattr(retriever, "create_query_embedding", fake_query_embedding)
+
+    db_session.add_all([Tenant(id=1, name="one"), Tenant(id=2, name="two")])
+    mine = Document(tenant_id=1, title="mine.pdf", pages=1)
+    theirs = Document(tenant_id=2, title="theirs.pdf", pages=1)
+    db_session.add_all([mine, theirs])
+    await db_session.commit()
+
+    chunks = [TextChunk(1, f"chunk {i}", 2, 0, 0) for i in range(4)]
+    await store_chunks(db_session, mine.id, 1, chunks, [_unit(i) for i in range(4)], 3)
+    await store_chunks(db_session, theirs.id, 2, chunks[:1], [_unit(2)])
+
+    rows = await retrieve_relevant_chunks("2", 1, db_session, top_k=2)
+    assert rows[0][:3] == ("chunk 2", 1, "mine.pdf")
+    assert rows[0].distance == pytest.approx(0.0, abs=1e-6)
+    assert rows[0].embedding.tolist() == _unit(2)
+    assert rows[0].tokens > 2  # chunk tokens plus header
+    assert len(rows) == 2
+
+    # A missing tenant file is rebuilt from the chunks table
+    (tmp_path / "tenant_1.vec").unlink()
+    rows = await retrieve_relevant_chunks("3", 1, db_session, top_k=1)
+    assert [row[:3] for row in rows] == [("chunk 3", 1, "mine.pdf")]
+
+    await get_vector_store().remove_document(db_session, mine.id, 1)
+    assert await retrieve_relevant_chunks("2", 1, db_session) == []
+    rows = await retrieve_relevant_chunks("2", 2, db_session, top_k=1)
+    assert [row[:3] for row in rows] == [("chunk 0", 1, "theirs.pdf")]
@@ -0,0 +1,327 @@
+"""Tests for the chat WebSocket turn"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi import WebSocketDisconnect
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.chat import Message
+from app.models.quota import Quota
+from app.models.tenant import Tenant
+from app.models.user import User
+from app.services.vector_store import SearchHit
+from app.ws import chat
+from app.ws.stream import StreamWriter
+
+
+def _chunk(content=None, usage=None):
+    choices = [] if content is None else [SimpleNamespace(delta=SimpleNamespace(content=content))]
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+class FakeStream:
+    """Async iterator over chunks, then blocks forever if hang is set"""
+
+    def __init__(self, chunks, hang=False):
+        self.chunks = list(chunks)
+        self.hang = hang
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.chunks:
+            return self.chunks.pop(0)
+        if self.hang:
+            await asyncio.Event().wait()
+        raise StopAsyncIteration
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeCompletions:
+    def __init__(self, chunks, hang=False):
+        self.chunks = chunks
+        self.hang = hang
+        self.kwargs = None
+        self.streams = []
+
+    async def create(self, **kwargs):
+        self.kwargs = kwargs
+        self.streams.append(FakeStream(self.chunks, self.hang))
+        return self.streams[-1]
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def send_text(self, data):
+        self.frames.append(data)
+
+
+class FakeWriter(StreamWriter):
+    def __init__(self):
+        self.deltas = []
+
+    async def delta(self, token):
+        self.deltas.append(token)
+
+
+def _use_completions(monkeypatch, chunks, hang=False) -> FakeCompletions:
+    completions = FakeCompletions(chunks, hang)
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    monkeypatch.setattr(chat, "openai_client", client)
+    return completions
+
+
+@pytest.mark.asyncio
+async def test_stream_answer_uses_reported_usage(monkeypatch):
+    """Test deltas are joined once and reported usage replaces the running counts"""
+    usage = SimpleNamespace(prompt_tokens=120, completion_tokens=3)
+    completions = _use_completions(
+        monkeypatch, [_chunk("سلام"), _chunk(""), _chunk(" دنیا"), _chunk(usage=usage)]
+    )
+    monkeypatch.setattr(chat.settings, "OPENAI_STREAM_USAGE", True)
+
+    async def wrong_counts(texts, model=None):
+        return [999] * len(texts)
+
+    monkeypatch.setattr(chat, "count_tokens_async", wrong_counts)
+    monkeypatch.setattr(chat, "count_tokens", lambda text, model=None: 999)
+    writer = FakeWriter()
+
+    result = await chat.stream_answer(writer, "system", "user")
+
+    assert result == ("سلام دنیا", 120, 3)
+    assert writer.deltas == ["سلام", " دنیا"]
+    assert completions.kwargs["stream_options"] == {"include_usage": True}
+
+
+@pytest.mark.asyncio
+async def test_stream_answer_counts_without_usage(monkeypatch, byte_encoding):
+    """Test the prompt and each delta are counted when usage is not requested"""
+    completions = _use_completions(monkeypatch, [_chunk("the"), _chunk(" theory")])
+    monkeypatch.setattr(chat.settings, "OPENAI_STREAM_USAGE", False)
+
+    text, tokens_in, tokens_out = await chat.stream_answer(FakeWriter(), "the", "thing")
+
+    assert text == "the theory"
+    assert tokens_in == len(byte_encoding.encode_ordinary("the")) + len(
+        byte_encoding.encode_ordinary("thing")
+    )
+    assert tokens_out == len(byte_encoding.encode_ordinary("the")) + len(
+        byte_encoding.encode_ordinary(" theory")
+    )
+    assert "stream_options" not in completions.kwargs
+
+
+@pytest.mark.asyncio
+async def test_stream_answer_counts_while_streaming_when_usage_is_ignored(
+    monkeypatch, byte_encoding
+):
+    """Test a provider ignoring stream_options costs no counting after the stream"""
+    _use_completions(monkeypatch, [_chunk("the"), _chunk(" theory")])
+    monkeypatch.setattr(chat.settings, "OPENAI_STREAM_USAGE", True)
+
+    class Writer(FakeWriter):
+        async def delta(self, token):
+            await super().delta(token)
+            # The prompt count runs concurrently with the stream
+            await asyncio.sleep(0)
+
+    counted = []
+    count_tokens_async = chat.count_tokens_async
+
+    async def recording_count(texts, model=None):
+        counted.append(list(texts))
+        return await count_tokens_async(texts, model)
+
+    monkeypatch.setattr(chat, "count_tokens_async", recording_count)
+
+    text, tokens_in, tokens_out = await chat.stream_answer(Writer(), "the", "thing")
+
+    assert text == "the theory"
+    assert counted == [["the", "thing"]]
+    assert tokens_out == len(byte_encoding.encode_ordinary("the")) + len(
+        byte_encoding.encode_ordinary(" theory")
+    )
+
+
+@pytest.mark.asyncio
+async def test_turn_overlaps_session_and_persists_behind(
+    db_session, chat_tables, monkeypatch, byte_encoding
+):
+    """Test a new turn sends start, deltas and a timed end, then stores everything once"""
+    monkeypatch.setattr(
+        chat, "async_session_maker", lambda: AsyncSession(db_session.bind, expire_on_commit=False)
+    )
+    db_session.add_all([Tenant(id=1, name="t"), User(id=2, tenant_id=1, email="u@example.com")])
+    await db_session.commit()
+
+    usage = SimpleNamespace(prompt_tokens=50, completion_tokens=2)
+    _use_completions(monkeypatch, [_chunk("جواب"), _chunk(usage=usage)])
+    monkeypatch.setattr(chat.settings, "OPENAI_STREAM_USAGE", True)
+    monkeypatch.setattr(chat, "build_rag_prompt", lambda message, hits: ("system", message))
+
+    async def fake_query_embedding(query):
+        return [0.0]
+
+    class FakeStore:
+        async def search(self, session, embedding, tenant_id, top_k):
+            return [SearchHit("text", 1, "doc.pdf", 0.1)]
+
+    monkeypatch.setattr(chat, "create_query_embedding", fake_query_embedding)
+    monkeypatch.setattr(chat, "get_vector_store", lambda: FakeStore())
+    websocket = FakeWebSocket()
+
+    await chat.handle_chat_message(websocket, "پرسش", {"tenant_id": 1, "user_id": 2})
+    await chat.drain_pending_writes()
+
+    start, delta, end = [json.loads(frame) for frame in websocket.frames]
+    assert start["type"] == "start" and start["session_id"]
+    assert delta == {"type": "delta", "token": "جواب"}
+    assert end["usage"] == {"tokens_in": 50, "tokens_out": 2}
+    assert {"session_ms", "embed_ms", "search_ms", "prompt_ms", "total_ms"} <= set(end["timings"])
+
+    messages = (await db_session.execute(select(Message).order_by(Message.id))).scalars().all()
+    assert [(m.role, m.content, m.session_id) for m in messages] == [
+        ("user", "پرسش", start["session_id"]),
+        ("assistant", "جواب", start["session_id"]),
+    ]
+    quota = (await db_session.execute(select(Quota))).scalars().one()
+    assert (quota.tokens_in, quota.tokens_out) == (50, 2)
+
+
+class FakeConnection(FakeWebSocket):
+    """Client side of a chat WebSocket: queued incoming frames, None disconnects"""
+
+    def __init__(self):
+        super().__init__()
+        self.incoming = asyncio.Queue()
+
+    async def accept(self):
+        pass
+
+    async def receive_text(self):
+        data = await self.incoming.get()
+        if data is None:
+            raise WebSocketDisconnect()
+        return data
+
+    async def wait_for(self, predicate):
+        for _ in range(200):
+            for frame in map(json.loads, self.frames):
+                if predicate(frame):
+                    return frame
+            await asyncio.sleep(0.005)
+        raise AssertionError(f"no matching frame in {self.frames}")
+
+
+@pytest.mark.asyncio
+async def test_cancel_aborts_stream_and_caps_inflight_turns(
+    db_session, chat_tables, monkeypatch, byte_encoding
+):
+    """Test request ids, the in-flight cap and cancel recording only streamed tokens"""
+    monkeypatch.setattr(
+        chat, "async_session_maker", lambda: AsyncSession(db_session.bind, expire_on_commit=False)
+    )
+    db_session.add_all([Tenant(id=1, name="t"), User(id=2, tenant_id=1, email="u@example.com")])
+    await db_session.commit()
+
+    completions = _use_completions(monkeypatch, [_chunk("the")], hang=True)
+    monkeypatch.setattr(chat.settings, "WS_MAX_INFLIGHT_TURNS", 1)
+    monkeypatch.setattr(chat, "build_rag_prompt", lambda message, hits: ("system", message))
+
+    async def authenticate(websocket, token, tenant_id):
+        return {"tenant_id": 1, "user_id": 2}
+
+    async def fake_query_embedding(query):
+        return [0.0]
+
+    class FakeStore:
+        async def search(self, session, embedding, tenant_id, top_k):
+            return []
+
+    monkeypatch.setattr(chat, "authenticate_websocket", authenticate)
+    monkeypatch.setattr(chat, "create_query_embedding", fake_query_embedding)
+    monkeypatch.setattr(chat, "get_vector_store", lambda: FakeStore())
+    connection = FakeConnection()
+    handler = asyncio.create_task(chat.websocket_chat_handler(connection, "t", None, "1"))
+
+    await connection.incoming.put(json.dumps({"message": "q", "request_id": "a"}))
+    await connection.wait_for(lambda f: f["type"] == "delta" and f["request_id"] == "a")
+
+    await connection.incoming.put(json.dumps({"message": "q2", "request_id": "b"}))
+    error = await connection.wait_for(lambda f: f.get("request_id") == "b")
+    assert error == {"type": "error", "message": "Too many requests in flight", "request_id": "b"}
+
+    await connection.incoming.put(json.dumps({"type": "cancel", "request_id": "a"}))
+    cancelled = await connection.wait_for(lambda f: f["type"] == "cancelled")
+    assert cancelled["request_id"] == "a"
+    assert cancelled["usage"]["tokens_out"] == len(byte_encoding.encode_ordinary("the"))
+    assert completions.streams[0].closed
+
+    await connection.incoming.put(None)
+    await handler
+    await chat.drain_pending_writes()
+
+    messages = (await db_session.execute(select(Message).order_by(Message.id))).scalars().all()
+    assert [(m.role, m.content) for m in messages] == [("user", "q"), ("assistant", "the")]
+
+
+@pytest.mark.asyncio
+async def test_cancel_before_upstream_accepts_charges_nothing(db_session, chat_tables, monkeypatch):
+    """Test a turn cancelled while the request is being sent records no usage"""
+    monkeypatch.setattr(
+        chat, "async_session_maker", lambda: AsyncSession(db_session.bind, expire_on_commit=False)
+    )
+    db_session.add_all([Tenant(id=1, name="t"), User(id=2, tenant_id=1, email="u@example.com")])
+    await db_session.commit()
+
+    requested = asyncio.Event()
+
+    async def hanging_create(**kwargs):
+        requested.set()
+        await asyncio.Event().wait()
+
+    client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=hanging_create))
+    )
+    monkeypatch.setattr(chat, "openai_client", client)
+    monkeypatch.setattr(chat, "build_rag_prompt", lambda message, hits: ("system", message))
+
+    async def fake_query_embedding(query):
+        return [0.0]
+
+    class FakeStore:
+        async def search(self, session, embedding, tenant_id, top_k):
+            return []
+
+    monkeypatch.setattr(chat, "create_query_embedding", fake_query_embedding)
+    monkeypatch.setattr(chat, "get_vector_store", lambda: FakeStore())
+    websocket = FakeWebSocket()
+
+    turn = asyncio.create_task(
+        chat.handle_chat_message(websocket, "q", {"tenant_id": 1, "user_id": 2}, request_id="a")
+    )
+    await requested.wait()
+    turn.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await turn
+    await chat.drain_pending_writes()
+
+    cancelled = json.loads(websocket.frames[-1])
+    assert cancelled == {
+        "type": "cancelled",
+        "usage": {"tokens_in": 0, "tokens_out": 0},
+        "request_id": "a",
+    }
+    assert (await db_session.execute(select(Message))).scalars().all() == []
+    assert (await db_session.execute(select(Quota))).scalars().all() == []
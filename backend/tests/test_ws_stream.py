@@ -0,0 +1,190 @@
+"""Tests for chat stream framing"""
+
+import asyncio
+import json
+
+import pytest
+
+from app.api.routes.metrics import ws_outbound_queued_bytes
+from app.ws import stream
+from app.ws.stream import Outbox, StreamWriter, negotiate_encoding
+
+
+class FakeWebSocket:
+    """Records frames as ('text' | 'bytes', payload); sends block while gate is clear"""
+
+    def __init__(self):
+        self.frames = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.close_code = None
+
+    async def send_text(self, data):
+        await self.gate.wait()
+        self.frames.append(("text", data))
+
+    async def send_bytes(self, data):
+        await self.gate.wait()
+        self.frames.append(("bytes", data))
+
+    async def close(self, code=1000, reason=None):
+        self.close_code = code
+
+
+@pytest.mark.asyncio
+async def test_deltas_coalesce_after_immediate_first_token():
+    """Test the first delta is sent at once, later ones by size and before control frames"""
+    websocket = FakeWebSocket()
+    writer = StreamWriter(websocket, flush_seconds=60, flush_bytes=8)
+
+    for token in ["Hi", " a", "b", "c", "de", "fgh", "ij"]:
+        await writer.delta(token)
+    await writer.send({"type": "end"})
+    await writer.close()
+
+    messages = [json.loads(payload) for _, payload in websocket.frames]
+    assert messages == [
+        {"type": "delta", "token": "Hi"},
+        {"type": "delta", "token": " abcdefgh"},
+        {"type": "delta", "token": "ij"},
+        {"type": "end"},
+    ]
+    assert writer.frames == 3
+
+
+@pytest.mark.asyncio
+async def test_deferred_flush_after_window():
+    """Test buffered deltas go out once the time window passes with no new token"""
+    websocket = FakeWebSocket()
+    writer = StreamWriter(websocket, flush_seconds=0.01, flush_bytes=1000)
+
+    await writer.delta("a")
+    await writer.delta("b")
+    assert writer.frames == 1
+
+    await asyncio.sleep(0.05)
+    await writer.close()
+    assert json.loads(websocket.frames[1][1]) == {"type": "delta", "token": "b"}
+
+
+@pytest.mark.asyncio
+async def test_binary_encoding_and_negotiation(monkeypatch):
+    """Test binary deltas are id-prefixed UTF-8 frames and msgpack needs the package"""
+    websocket = FakeWebSocket()
+    writer = StreamWriter(websocket, encoding="binary", request_id="r1")
+
+    await writer.delta("سلام")
+    await writer.send({"type": "end"})
+    await writer.close()
+
+    assert websocket.frames == [
+        ("bytes", "r1\x00سلام".encode()),
+        ("text", '{"type":"end","request_id":"r1"}'),
+    ]
+
+    monkeypatch.setattr(stream, "msgpack", None)
+    assert negotiate_encoding("msgpack") == "json"
+    assert negotiate_encoding("binary") == "binary"
+    assert negotiate_encoding(None) == "json"
+
+
+@pytest.mark.asyncio
+async def test_slow_client_gets_coalesced_deltas():
+    """Test deltas are held while a send is blocked and sent as one frame afterwards"""
+    websocket = FakeWebSocket()
+    outbox = Outbox(websocket, max_bytes=1000, send_timeout=0.01, policy="coalesce")
+    writer = StreamWriter(websocket, flush_seconds=0.005, flush_bytes=1, outbox=outbox)
+    baseline = ws_outbound_queued_bytes._value.get()
+
+    websocket.gate.clear()
+    await writer.delta("a")
+    await asyncio.sleep(0.03)
+    assert outbox.congested
+
+    for token in "bcd":
+        await writer.delta(token)
+    assert writer.frames == 1
+
+    websocket.gate.set()
+    await writer.send({"type": "end"})
+    await outbox.close()
+
+    messages = [json.loads(payload) for _, payload in websocket.frames]
+    assert messages == [
+        {"type": "delta", "token": "a"},
+        {"type": "delta", "token": "bcd"},
+        {"type": "end"},
+    ]
+    assert not writer.dropped
+    assert outbox.queued_bytes == 0
+    assert ws_outbound_queued_bytes._value.get() == baseline
+
+
+@pytest.mark.asyncio
+async def test_summary_policy_drops_deltas():
+    """Test a congested outbox makes the writer drop the rest of the turn's deltas"""
+    websocket = FakeWebSocket()
+    outbox = Outbox(websocket, max_bytes=40, send_timeout=10, policy="summary")
+    writer = StreamWriter(websocket, flush_seconds=60, flush_bytes=1, outbox=outbox)
+
+    websocket.gate.clear()
+    await writer.delta("x" * 30)
+    await writer.delta("y")
+    websocket.gate.set()
+    await writer.delta("z")
+    await outbox.close()
+
+    assert writer.dropped
+    assert [json.loads(payload)["token"] for _, payload in websocket.frames] == ["x" * 30]
+
+
+@pytest.mark.asyncio
+async def test_disconnect_policy_evicts_client():
+    """Test overflowing the outbox closes the connection and frees the queue"""
+    websocket = FakeWebSocket()
+    evicted = []
+    outbox = Outbox(
+        websocket,
+        max_bytes=10,
+        send_timeout=10,
+        policy="disconnect",
+        on_disconnect=lambda: evicted.append(True),
+    )
+
+    websocket.gate.clear()
+    outbox.put("a" * 8)
+    outbox.put("b" * 8)
+    outbox.put("c")
+    await outbox.close()
+
+    assert evicted == [True]
+    assert outbox.closed and outbox.evicted
+    assert outbox.queued_bytes == 0
+    assert websocket.close_code == 1013
+    assert websocket.frames == []
+
+
+@pytest.mark.asyncio
+async def test_stalled_client_is_evicted_under_any_policy():
+    """Test a send blocked past the stall limit disconnects a coalescing client"""
+    websocket = FakeWebSocket()
+    evicted = []
+    outbox = Outbox(
+        websocket,
+        send_timeout=0.01,
+        policy="coalesce",
+        on_disconnect=lambda: evicted.append(True),
+        stall_limit=0.03,
+    )
+
+    websocket.gate.clear()
+    outbox.put("a")
+    await asyncio.sleep(0.02)
+    assert outbox.stalled and not evicted
+
+    await asyncio.sleep(0.05)
+    await outbox.close()
+
+    assert evicted == [True]
+    assert websocket.close_code == 1013
+    assert outbox.queued_bytes == 0